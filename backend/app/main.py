@@ -1,10 +1,28 @@
-from fastapi import FastAPI, UploadFile, File
+from contextlib import asynccontextmanager, suppress
+import os
+
+from typing import List
+
+from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from app.routers import analysis, developer, anomaly
+from app.routers import analysis, developer, anomaly, measurements, live
+from app import db
+from app.utils import audio_pool, broadcaster, metrics, train_jobs
 import uvicorn
 
-app = FastAPI(title="AudioSense API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    broadcaster.shutdown()
+    audio_pool.shutdown()
+    train_jobs.shutdown()
+    await db.dispose_engines()
+
+
+app = FastAPI(title="AudioSense API", lifespan=lifespan)
 
 origins = ["http://localhost:3000", "http://127.0.0.1:3000"]
 app.add_middleware(
@@ -13,28 +31,88 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginación por keyset: cursores y totales viajan en cabeceras
+    expose_headers=["X-Next-Cursor", "X-Next-Since-Id", "X-Total-Count"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(analysis.router)
 app.include_router(developer.router)
 app.include_router(anomaly.router)
+app.include_router(measurements.router)
+app.include_router(live.router)
 
 @app.get("/")
 def health():
     return {"status": "ok"}
 
 @app.post("/analyze")
-async def analyze(file: UploadFile = File(...), machine_type: str = "generic"):
+async def analyze(file: UploadFile = File(...), machine_type: str = "generic", streaming: bool | None = None):
+    from app.utils.audio_processing import read_upload
+
+    # Archivos chicos viajan en memoria (sin temporal); los grandes se vuelcan a disco
+    source = await read_upload(file)
     try:
-        from app.utils.audio_processing import analyze_audio
-        result = await analyze_audio(file, machine_type=machine_type)
+        # El cómputo corre en el pool de procesos; el event loop queda libre para otros requests
+        result = await audio_pool.run_analysis(source, file.filename, machine_type=machine_type, streaming=streaming)
         result["filename"] = file.filename
         return result
+    except audio_pool.PoolSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except audio_pool.JobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         print("?? Error en /analyze:", e)
         traceback.print_exc()
         return {"error": str(e)}
 
+@app.post("/analyze/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    machine_type: str = "generic",
+    streaming: bool | None = None,
+    persist: bool = True,
+):
+    """
+    Analiza muchos archivos (o comprimidos zip/tar con audios) en paralelo en el pool
+    y devuelve NDJSON: una línea por archivo al terminar y una línea final de resumen.
+    Los resultados se guardan en analyses con inserciones masivas (persist=false lo evita).
+    """
+    from app.utils.audio_batch import stream_batch
+    from app.utils.audio_processing import spool_upload
+
+    # Se copian los uploads antes de responder: los UploadFile se cierran al salir del handler
+    uploads = []
+    try:
+        for i, f in enumerate(files):
+            uploads.append((f.filename or f"file_{i}", await spool_upload(f)))
+    except BaseException:
+        # Un fallo a mitad no debe dejar en disco los que ya se volcaron
+        for _, path in uploads:
+            with suppress(OSError):
+                os.remove(path)
+        raise
+    return StreamingResponse(
+        stream_batch(uploads, machine_type=machine_type, streaming=streaming, persist=persist),
+        media_type="application/x-ndjson",
+    )
+
+@app.get("/analyze/stats")
+def analyze_stats():
+    """Estado del pool de análisis: cupo, rechazos y tiempos de cola vs. cómputo."""
+    return audio_pool.stats()
+
+@app.get("/db/stats")
+def db_stats():
+    """Uso de los pools de conexiones (escritura, lectura, lectura async) y espera de checkout."""
+    return db.pool_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Histogramas de latencia por ruta y por etapa, y contadores (formato de texto de Prometheus)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
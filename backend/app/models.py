@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Boolean, Column, Computed, Integer, String, Float, DateTime, Index, text
 from datetime import datetime
 from .db import Base
 
@@ -14,23 +14,65 @@ class Analysis(Base):
     mensaje = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# Expresión única de "status anómalo" (columna generada, la mantiene la BD en cada insert)
+ANOMALY_EXPR = "COALESCE(LOWER(status) LIKE 'anom%', false)"
+
+
 class Measurement(Base):
     __tablename__ = "measurements"
+    __table_args__ = (
+        # Orden/rangos por tiempo (con id como desempate) en todas las consultas calientes
+        Index("ix_measurements_timestamp_id", "timestamp", "id"),
+        # Índice parcial: solo filas anómalas (eventos, KPIs, última anomalía)
+        Index(
+            "ix_measurements_anomaly_timestamp",
+            "timestamp",
+            "id",
+            postgresql_where=text("is_anomaly"),
+            sqlite_where=text("is_anomaly"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     value = Column(Float, nullable=False)
     frequency = Column(Float)
     status = Column(String)
+    is_anomaly = Column(Boolean, Computed(ANOMALY_EXPR, persisted=True))
+    # Scoring en línea al ingerir (online_scoring); score_model identifica el modelo que puntuó
+    score = Column(Float)
+    margin = Column(Float)
+    z_score = Column(Float)
+    score_model = Column(String)
 
 class Model(Base):
     __tablename__ = "models"
+    # Dos entrenamientos concurrentes no pueden registrar la misma versión
+    __table_args__ = (Index("ux_models_machine_key_version", "machine_key", "version", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     mean_value = Column(Float)
     mean_freq = Column(Float)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Registro de versiones (model_registry): una activa; machine_key siempre "default"
+    machine_key = Column(String, default="default", index=True)
+    version = Column(Integer)
+    model_id = Column(String)
+    path = Column(String)
+    active = Column(Boolean, default=False)
+    window_size = Column(Integer)
+    threshold = Column(Float)
+    threshold_pct = Column(Float)
+    train_windows = Column(Integer)
+    train_samples = Column(Integer)
+
+class DataEpoch(Base):
+    """Época de los datos de measurements (una fila, id=1): invalida los puntajes cacheados (score_cache)."""
+    __tablename__ = "data_epoch"
+
+    id = Column(Integer, primary_key=True)
+    epoch = Column(Integer, nullable=False, default=0)
 
 class Machine(Base):
     __tablename__ = "machines"
@@ -40,3 +82,24 @@ class Machine(Base):
     location = Column(String)
     status = Column(String, default="active")
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class _RollupColumns:
+    """Agregados por bucket de tiempo (sumas para poder re-agregar a resoluciones mayores)."""
+
+    bucket = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    value_sum = Column(Float, nullable=False, default=0.0)
+    value_min = Column(Float)
+    value_max = Column(Float)
+    frequency_sum = Column(Float, nullable=False, default=0.0)
+    frequency_count = Column(Integer, nullable=False, default=0)
+    anomaly_count = Column(Integer, nullable=False, default=0)
+
+
+class MeasurementRollup1m(_RollupColumns, Base):
+    __tablename__ = "measurements_rollup_1m"
+
+
+class MeasurementRollup1h(_RollupColumns, Base):
+    __tablename__ = "measurements_rollup_1h"
@@ -1,286 +1,443 @@
-from fastapi import APIRouter, Depends
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
-import math
-from app.db import get_db
-from app.utils import model_loader
-from app.utils.features import compute_window_features, ensure_feature_vector
+from typing import Literal
+import numpy as np
+from app.db import get_async_db, run_in_session
+from app.utils import kpi_state, metrics, model_loader, online_scoring, pagination, response_cache, retention, schema, score_cache
+from app.utils.derived import add_derived
+from app.utils.downsample import downsample_rows
 
 router = APIRouter(prefix="/analyses", tags=["Analyses"])
 
+_RAW_SELECT = f"""
+    SELECT
+        id,
+        timestamp,
+        value AS rms_db,
+        frequency AS dominant_freq_hz,
+        status,
+        score AS stored_score,
+        score_model,
+        {score_cache.DATA_EPOCH_COLUMN}
+    FROM measurements
+"""
+# Filas previas a la página que se leen solo como contexto (flatness de 10 filas)
+_FLATNESS_CONTEXT = 10
+
+
+def _where(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def _keyset_conditions(cursor: str | None, since_id: int | None, params: dict) -> list[str]:
+    try:
+        return pagination.keyset_condition(cursor, since_id, params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/")
-def read_measurements(skip: int = 0, limit: int = 10000, minutes: int | None = None, db: Session = Depends(get_db)):
+async def read_measurements(
+    request: Request,
+    skip: int = 0,
+    limit: int = 10000,
+    minutes: int | None = None,
+    points: int | None = None,
+    downsample: Literal["lttb", "minmax"] = "lttb",
+    cursor: str | None = None,
+    since_id: int | None = None,
+    total: Literal["none", "approx", "exact"] = "none",
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Devuelve los datos reales de la tabla measurements para el dashboard.
     Obtiene los ùltimos registros y los reordena cronol¢gicamente.
-    """
-    params = {"skip": skip, "limit": limit}
-    where_clause = ""
-    if minutes and minutes > 0:
-        since = datetime.utcnow() - timedelta(minutes=minutes)
-        params["since"] = since
-        where_clause = "WHERE timestamp >= :since"
+    Para rangos largos (minutes > ROLLUP_RAW_MAX_MINUTES) lee del rollup de 1 minuto
+    o de 1 hora; esas filas traen resolution/count/value_min/value_max y sin score.
+    Con points=N devuelve ~N puntos (LTTB o min/max por bucket) más todas las anomalías;
+    las métricas derivadas y el score se calculan antes, sobre la serie completa.
 
-    query = db.execute(
-        text(
-            f"""
-            SELECT
-                id,
-                timestamp,
-                value AS rms_db,
-                frequency AS dominant_freq_hz,
-                status
-            FROM measurements
-            {where_clause}
-            ORDER BY timestamp DESC
-            OFFSET :skip LIMIT :limit
-            """
-        ),
-        params,
+    Paginación por keyset (siempre sobre datos crudos):
+    - cursor: filas más viejas que el cursor; el siguiente viene en X-Next-Cursor.
+    - since_id: solo filas con id mayor (polling incremental); si quedan más, X-Next-Since-Id.
+    - total=approx|exact agrega X-Total-Count.
+    """
+    return await response_cache.respond_async(
+        request,
+        db,
+        lambda headers: _measurements(headers, db, skip, limit, minutes, points, downsample, cursor, since_id, total),
+        time_window=bool(minutes),
     )
 
-    # Devuelve cronol¢gico ascendente para el chart
-    rows = [dict(row._mapping) for row in query][::-1]
 
-    # Métricas derivadas: snr_db, flatness (ventana de 10), banda dominante y score/margen si hay modelo
-    # Prepara modelo si está cargado
-    model_bundle = model_loader.get_model()
-    have_model = bool(model_bundle and model_bundle.get("model") and model_bundle.get("scaler"))
-    window_size = int(model_bundle.get("window_size", 0)) if have_model else 0
-    feature_names = model_bundle.get("feature_names", []) if have_model else []
-    scaler = model_bundle.get("scaler") if have_model else None
-    model = model_bundle.get("model") if have_model else None
-    threshold = float(model_bundle.get("threshold", 0.0)) if have_model else None
+async def _measurements(
+    headers: dict,
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    minutes: int | None,
+    points: int | None,
+    downsample: str,
+    cursor: str | None,
+    since_id: int | None,
+    total: str,
+) -> list[dict]:
+    keyset = cursor is not None or since_id is not None
+    tier = retention.tier_for_minutes(minutes)
+    if tier != "raw" and not keyset:
+        since = datetime.utcnow() - timedelta(minutes=minutes)
+        with metrics.stage("db_fetch"):
+            rows = await db.run_sync(lambda s: retention.read_rollup(s, tier, since, skip=skip, limit=limit))
+        return await run_in_threadpool(_finish_rows, rows, 0, None, points, downsample, True)
+
+    params: dict = {}
+    conditions = []
+    if minutes and minutes > 0:
+        params["since"] = datetime.utcnow() - timedelta(minutes=minutes)
+        conditions.append("timestamp >= :since")
+    count_where, count_params = _where(conditions), dict(params)
+    conditions += _keyset_conditions(cursor, since_id, params)
+    ascending = since_id is not None if keyset else None
+
+    model_bundle = await run_in_threadpool(model_loader.get_model)
+    context = _context_rows(model_bundle, ascending)
+    fetch = db.run_sync(lambda s: _fetch_raw(s, _where(conditions), params, skip, limit, ascending, context))
+    with metrics.stage("db_fetch"):
+        if total != "none":
+            # El total y la página son independientes: van en paralelo (cada uno con su conexión)
+            count, (rows, skip_context) = await asyncio.gather(
+                run_in_session(lambda s: pagination.count_rows(s, count_where, count_params, total)), fetch
+            )
+            headers["X-Total-Count"] = str(count)
+        else:
+            rows, skip_context = await fetch
 
-    def geom_mean(vals: list[float]) -> float:
-        vals = [v for v in vals if v > 0]
-        if not vals:
-            return 0.0
-        return float(math.exp(sum(math.log(v) for v in vals) / len(vals)))
-
-    values_seen: list[float] = []
-    for idx, row in enumerate(rows):
-        val = float(row.get("rms_db") or 0.0)
-        values_seen.append(max(val, 1e-6))
-        snr = 20 * math.log10(max(val, 1e-6))
-        window_vals = values_seen[max(0, len(values_seen) - 10) :]
-        flat = 0.0
-        if window_vals:
-            amean = sum(window_vals) / len(window_vals)
-            gmean = geom_mean(window_vals)
-            flat = gmean / amean if amean > 0 else 0.0
-        
-        row["snr_db"] = round(snr, 2)
-        row["flatness"] = round(flat, 3)
-
-        # Banda simple (5 bandas)
-        freq = float(row.get("dominant_freq_hz") or 0.0)
-        bands = [0, 500, 1000, 4000, 8000, 12000]
-        levels = []
-        for i in range(len(bands) - 1):
-            if bands[i] <= freq < bands[i + 1]:
-                energy = val + 1e-3
-                levels.append(round(20 * math.log10(energy), 1))
-            else:
-                levels.append(-120.0)
-        row["band_levels"] = levels
-
-        # Score/margen usando IsolationForest si hay datos suficientes
-        if have_model and scaler is not None and model is not None and threshold is not None and idx + 1 >= window_size:
-            window_records = rows[idx + 1 - window_size : idx + 1]
-            feats = compute_window_features(window_records)
-            fv = ensure_feature_vector(feats, feature_names)
-            X = scaler.transform(fv)
-            score = float(model.score_samples(X)[0])
-            row["model_score"] = score
-            row["model_margin"] = score - threshold
-            row["model_threshold"] = threshold
+    page = len(rows) - skip_context
+    if page == limit and rows:
+        if since_id is not None:
+            headers["X-Next-Since-Id"] = str(max(r["id"] for r in rows[skip_context:]))
         else:
-            row["model_score"] = None
-            row["model_margin"] = None
-            row["model_threshold"] = threshold if have_model else None
+            first = rows[skip_context]
+            headers["X-Next-Cursor"] = pagination.encode_cursor(first["timestamp"], first["id"])
+    # Score, métricas derivadas y downsampling son CPU: van a un hilo para no frenar el event loop
+    return await run_in_threadpool(_finish_rows, rows, skip_context, model_bundle, points, downsample)
 
+
+def _usable_model(model_bundle: dict | None) -> bool:
+    return bool(model_bundle and model_bundle.get("model") and model_bundle.get("scaler"))
+
+
+def _context_rows(model_bundle: dict | None, ascending: bool | None) -> int:
+    """Filas previas a la página a leer como contexto (solo en modo keyset)."""
+    if ascending is None:
+        return 0
+    window = int(model_bundle.get("window_size", 0)) if _usable_model(model_bundle) else 0
+    return max(window, _FLATNESS_CONTEXT)
+
+
+def _fetch_raw(
+    db: Session, where_clause: str, params: dict, skip: int, limit: int, ascending: bool | None, context: int
+) -> tuple[list[dict], int]:
+    """
+    Filas crudas en orden cronológico y cuántas de ellas (al inicio) son solo contexto.
+    ascending=None: OFFSET/LIMIT (compatibilidad); False: página por cursor hacia atrás;
+    True: filas nuevas desde since_id. En modo keyset se leen además filas previas como
+    contexto para que flatness y score de las primeras filas usen su ventana completa.
+    """
+    if ascending is None:
+        query = f"{_RAW_SELECT} {where_clause} ORDER BY timestamp DESC, id DESC LIMIT :limit OFFSET :skip"
+        page = [dict(r._mapping) for r in db.execute(text(query), params | {"skip": skip, "limit": limit})]
+        # Devuelve cronol¢gico ascendente para el chart
+        rows = page[::-1]
+    elif ascending:
+        query = f"{_RAW_SELECT} {where_clause} ORDER BY id LIMIT :limit"
+        page = [dict(r._mapping) for r in db.execute(text(query), params | {"limit": limit})]
+        page.sort(key=lambda r: (r["timestamp"], r["id"]))
+        rows = page
+        if page:
+            prior = db.execute(
+                text(
+                    f"""{_RAW_SELECT}
+                    WHERE (timestamp, id) < (:first_ts, :first_id)
+                    ORDER BY timestamp DESC, id DESC LIMIT :n"""
+                ),
+                {"first_ts": page[0]["timestamp"], "first_id": page[0]["id"], "n": context},
+            )
+            rows = [dict(r._mapping) for r in prior][::-1] + page
+    else:
+        query = f"{_RAW_SELECT} {where_clause} ORDER BY timestamp DESC, id DESC LIMIT :limit"
+        fetched = [dict(r._mapping) for r in db.execute(text(query), params | {"limit": limit + context})]
+        page = fetched[:limit]
+        rows = fetched[::-1]
+    return rows, len(rows) - len(page)
+
+
+def _finish_rows(
+    rows: list[dict],
+    skip_context: int,
+    model_bundle: dict | None,
+    points: int | None,
+    downsample: str,
+    rollup: bool = False,
+) -> list[dict]:
+    """Score + métricas derivadas y downsampling opcional (rollups: sin score del modelo)."""
+    if rollup:
+        rows = add_derived(rows, [None] * len(rows), None)
+    else:
+        rows = _score_rows(rows, skip_context, model_bundle)
+    if points and points > 0:
+        rows = downsample_rows(rows, points, downsample)
     return rows
 
 
+def _score_rows(rows: list[dict], skip_context: int, model_bundle: dict | None) -> list[dict]:
+    have_model = _usable_model(model_bundle)
+    threshold = float(model_bundle.get("threshold", 0.0)) if have_model else None
+    # Scores ya guardados al ingerir (mismo modelo) se usan tal cual
+    version = online_scoring.seed_cache(rows)
+
+    # Score/margen con IsolationForest: solo se puntúan filas nuevas (cache por versión de modelo/datos + id)
+    scores = [None] * len(rows)
+    if have_model and rows:
+        scores = model_loader.score_series(
+            ids=[r["id"] for r in rows],
+            timestamps=[r["timestamp"] for r in rows],
+            values=np.asarray([float(r.get("rms_db") or 0.0) for r in rows], dtype=float),
+            freqs=np.asarray([float(r.get("dominant_freq_hz") or 0.0) for r in rows], dtype=float),
+            anom=np.asarray([str(r.get("status") or "").lower().startswith("anom") for r in rows], dtype=bool),
+            model_bundle=model_bundle,
+            version=version,
+        )
+    # Métricas derivadas: snr_db, flatness (ventana de 10), banda dominante y score/margen si hay modelo
+    return add_derived(rows, scores, threshold)[skip_context:]
+
+
 @router.get("/logs")
-def stream_logs(limit: int = 200, db: Session = Depends(get_db)):
+async def stream_logs(
+    request: Request,
+    limit: int = 200,
+    cursor: str | None = None,
+    since_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Devuelve las ùltimas filas de measurements en orden descendente (log en vivo).
+    cursor: filas más viejas que el cursor (siguiente en X-Next-Cursor);
+    since_id: solo filas con id mayor (polling incremental).
     """
-    query = db.execute(
-        text(
-            """
-            SELECT
-                timestamp,
-                value,
-                frequency,
-                status
-            FROM measurements
-            ORDER BY timestamp DESC
-            LIMIT :limit
-            """
-        ),
-        {"limit": limit},
-    )
+    return await response_cache.respond_async(request, db, lambda headers: _logs(headers, db, limit, cursor, since_id))
+
+
+async def _logs(headers: dict, db: AsyncSession, limit: int, cursor: str | None, since_id: int | None) -> list[dict]:
+    params: dict = {"limit": limit}
+    where_clause = _where(_keyset_conditions(cursor, since_id, params))
+    with metrics.stage("db_fetch"):
+        query = await db.execute(
+            text(
+                f"""
+                SELECT
+                    id,
+                    timestamp,
+                    value,
+                    frequency,
+                    status
+                FROM measurements
+                {where_clause}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT :limit
+                """
+            ),
+            params,
+        )
     rows = [dict(row._mapping) for row in query]
+    if len(rows) == limit and rows:
+        headers["X-Next-Cursor"] = pagination.encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
     return rows
 
 
 @router.get("/kpis")
-def kpis(db: Session = Depends(get_db)):
+async def kpis(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     KPIs r pidos para cabecera del dashboard.
     - última medici¢n (value/frequency/status/timestamp)
     - % anomalias en ventana reciente (60 min)
     - total de muestras en BD
     - tasa de ingesta (muestras/min en ventana reciente)
-    """
-    # Obtenemos la hora de referencia (la última medición o ahora si está vacío)
-    ref_query = db.execute(text("SELECT MAX(timestamp) FROM measurements")).scalar()
-    reference_time = ref_query if ref_query else datetime.utcnow()
-    
-    window_minutes = 60
-    t_window = reference_time - timedelta(minutes=window_minutes)
-
-    last_row = db.execute(
-        text(
-            """
-            SELECT timestamp, value, frequency, status
-            FROM measurements
-            ORDER BY timestamp DESC
-            LIMIT 1
-            """
-        )
-    ).mappings().first()
-
-    total_count = db.execute(text("SELECT COUNT(*) FROM measurements")).scalar() or 0
-    count_window = db.execute(
-        text("SELECT COUNT(*) FROM measurements WHERE timestamp >= :t_window"),
-        {"t_window": t_window},
-    ).scalar() or 0
-    anomalies_window = db.execute(
-        text("SELECT COUNT(*) FROM measurements WHERE timestamp >= :t_window AND LOWER(status) LIKE 'anom%'"),
-        {"t_window": t_window},
-    ).scalar() or 0
-
-    last_anomaly = db.execute(
-        text("SELECT timestamp FROM measurements WHERE LOWER(status) LIKE 'anom%' ORDER BY timestamp DESC LIMIT 1")
-    ).scalar()
 
-    anomalies_percent = (anomalies_window / count_window * 100) if count_window else 0.0
-    ingest_rate = count_window / window_minutes if window_minutes else 0.0
-
-    return {
-        "last_timestamp": last_row.get("timestamp") if last_row else None,
-        "last_value": last_row.get("value") if last_row else None,
-        "last_frequency": last_row.get("frequency") if last_row else None,
-        "last_status": last_row.get("status") if last_row else None,
-        "anomalies_percent_window": anomalies_percent,
-        "total_measurements": total_count,
-        "ingest_rate_per_min": ingest_rate,
-        "window_minutes": window_minutes,
-        "last_anomaly_ts": last_anomaly,
-    }
+    La ventana se agrega en buckets por minuto (últimos 60 minutos respecto de la última medición).
+    El estado se mantiene en memoria (kpi_state); cada poll solo lee las filas nuevas.
+    """
+    return await response_cache.respond_async(request, db, lambda headers: kpi_state.snapshot_async(db))
 
 
 @router.get("/events")
-def recent_anomalies(
+async def recent_anomalies(
+    request: Request,
     limit: int | None = None,
     minutes: int = 1440,
     page: int = 1,
     per_page: int = 15,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    since_id: int | None = None,
+    total: Literal["exact", "approx", "none"] = "exact",
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Lista cronol·gica de anomalªas con puntaje del modelo (si existe).
     Por defecto trae las ỳltimas 24h (1440 min). Usa limit opcional para acotar.
+    Con cursor (next_cursor de la respuesta anterior) pagina por keyset en lugar de page;
+    since_id trae solo anomalías nuevas; total=approx usa la estimación del planificador.
     """
-    model_bundle = model_loader.get_model()
+    return await response_cache.respond_async(
+        request,
+        db,
+        lambda headers: _events(db, limit, minutes, page, per_page, cursor, since_id, total),
+        time_window=True,
+    )
 
-    params = {"minutes": minutes, "limit": limit or per_page, "offset": max(page - 1, 0) * per_page}
-    where_clause = "WHERE LOWER(status) LIKE 'anom%' AND timestamp >= (NOW() - (:minutes || ' minutes')::interval)"
-    limit_clause = "LIMIT :limit OFFSET :offset"
 
-    total = db.execute(
-        text(f"SELECT COUNT(*) FROM measurements {where_clause}"),
-        {"minutes": minutes},
-    ).scalar() or 0
+async def _events(
+    db: AsyncSession,
+    limit: int | None,
+    minutes: int,
+    page: int,
+    per_page: int,
+    cursor: str | None,
+    since_id: int | None,
+    total: str,
+) -> dict:
+    model_bundle = await run_in_threadpool(model_loader.get_model)
 
-    raw_rows = (
-        db.execute(
-            text(
-                f"""
-                SELECT timestamp, value, frequency, status
-                FROM measurements
-                {where_clause}
-                ORDER BY timestamp DESC
-                {limit_clause}
-                """
-            ),
-            params,
-        )
-        .mappings()
-        .all()
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    page_size = limit or per_page
+    # is_anomaly es columna generada con índice parcial (timestamp, id) WHERE is_anomaly
+    conditions = [schema.anomaly_sql(), "timestamp >= :since"]
+
+    params = {"since": since, "limit": page_size}
+    keyset = _keyset_conditions(cursor, since_id, params)
+    where_clause = _where(conditions + keyset)
+    if keyset:
+        limit_clause = "LIMIT :limit"
+    else:
+        params["offset"] = max(page - 1, 0) * per_page
+        limit_clause = "LIMIT :limit OFFSET :offset"
+
+    page_query = db.execute(
+        text(
+            f"""
+            SELECT id, timestamp, value, frequency, status, score AS stored_score, score_model,
+                   {score_cache.DATA_EPOCH_COLUMN}
+            FROM measurements
+            {where_clause}
+            ORDER BY timestamp DESC, id DESC
+            {limit_clause}
+            """
+        ),
+        params,
     )
+    # El conteo va en paralelo con la página, en su propia sesión
+    with metrics.stage("db_fetch"):
+        count, result = await asyncio.gather(
+            run_in_session(lambda s: pagination.count_rows(s, _where(conditions), {"since": since}, total)),
+            page_query,
+        )
+    raw_rows = [dict(r) for r in result.mappings()]
+    # Eventos ya puntuados al ingerir no necesitan releer su ventana
+    version = online_scoring.seed_cache(raw_rows)
 
-    # Si no hay modelo cargado, devolvemos lo b sico
-    if not model_bundle:
-        return [dict(r) | {"score": None, "threshold": None, "margin": None} for r in raw_rows]
+    # Sin modelo cargado solo se devuelve lo b sico (score/threshold/margin en None)
+    threshold = float(model_bundle.get("threshold", 0.0)) if model_bundle else None
+    window_size = int(model_bundle.get("window_size", 0)) if model_bundle else 0
 
-    feature_names = model_bundle.get("feature_names", [])
-    scaler = model_bundle.get("scaler")
-    model = model_bundle.get("model")
-    threshold = float(model_bundle.get("threshold", 0.0))
-    window_size = int(model_bundle.get("window_size", 0))
+    # Puntajes ya calculados (por /analyses o polls previos) se reutilizan desde cache
+    cached = score_cache.get_many(version, [(r["id"], r["timestamp"]) for r in raw_rows]) if model_bundle else {}
+    pending = [r for r in raw_rows if r["id"] not in cached]
+    if model_bundle:
+        metrics.inc("score_cache_total", len(cached), result="hit")
+        metrics.inc("score_cache_total", len(pending), result="miss")
 
-    # Preparamos respuesta
-    events = []
-    for r in raw_rows:
-        ts = r["timestamp"]
-        # obtenemos ventana previa a cada timestamp
-        window_rows = (
-            db.execute(
+    scores = dict(cached)
+    if model_bundle and pending and window_size > 0 and model_bundle.get("scaler") is not None and model_bundle.get("model") is not None:
+        # Un solo tramo contiguo cubre las ventanas de todos los eventos pendientes de la página
+        newest = max(r["timestamp"] for r in pending)
+        oldest = min(pending, key=lambda r: (r["timestamp"], r["id"]))
+        with metrics.stage("db_fetch"):
+            result = await db.execute(
                 text(
                     """
-                    SELECT value, frequency, status
+                    SELECT id, timestamp, value, frequency, status
                     FROM measurements
-                    WHERE timestamp <= :ts
-                    ORDER BY timestamp DESC
-                    LIMIT :w
+                    WHERE timestamp <= :newest
+                      AND timestamp >= COALESCE(
+                        (SELECT timestamp FROM measurements
+                         WHERE (timestamp, id) <= (:oldest_ts, :oldest_id)
+                         ORDER BY timestamp DESC, id DESC
+                         LIMIT 1 OFFSET :back),
+                        (SELECT MIN(timestamp) FROM measurements)
+                      )
+                    ORDER BY timestamp, id
                     """
                 ),
-                {"ts": ts, "w": window_size},
+                {
+                    "newest": newest,
+                    "oldest_ts": oldest["timestamp"],
+                    "oldest_id": oldest["id"],
+                    "back": window_size - 1,
+                },
             )
-            .mappings()
-            .all()
-        )
-        window_records = list(reversed([dict(x) for x in window_rows]))
-        score = None
-        margin = None
-        if len(window_records) == window_size and scaler is not None and model is not None:
-            feats = compute_window_features(window_records)
-            fv = ensure_feature_vector(feats, feature_names)
-            X = scaler.transform(fv)
-            score = float(model.score_samples(X)[0])
-            margin = score - threshold
+        span = result.mappings().all()
+        # Features + IsolationForest son CPU: van a un hilo
+        scores.update(await run_in_threadpool(_score_events, span, pending, window_size, model_bundle, version))
 
+    # Preparamos respuesta
+    events = []
+    for r in raw_rows:
+        score = scores.get(r["id"])
         events.append(
             {
-                "timestamp": ts,
+                "timestamp": r["timestamp"],
                 "value": r.get("value"),
                 "frequency": r.get("frequency"),
                 "status": r.get("status"),
                 "score": score,
                 "threshold": threshold if score is not None else None,
-                "margin": margin,
+                "margin": score - threshold if score is not None else None,
             }
         )
 
+    next_cursor = None
+    if len(raw_rows) == page_size and raw_rows:
+        next_cursor = pagination.encode_cursor(raw_rows[-1]["timestamp"], raw_rows[-1]["id"])
     return {
         "items": events,  # ordenadas desc por timestamp
         "page": page,
         "per_page": per_page,
-        "total": total,
+        "total": count,
+        "next_cursor": next_cursor,
+        "last_id": max((r["id"] for r in raw_rows), default=None),
     }
+
+
+def _score_events(span, pending: list[dict], window_size: int, model_bundle: dict, version) -> dict:
+    """Puntúa los eventos pendientes sobre el tramo contiguo `span` y los guarda en cache."""
+    position = {row["id"]: i for i, row in enumerate(span)}
+    values = np.asarray([float(row["value"] or 0.0) for row in span], dtype=float)
+    freqs = np.asarray([float(row["frequency"] or 0.0) for row in span], dtype=float)
+    anom = np.asarray([str(row["status"] or "").lower().startswith("anom") for row in span], dtype=bool)
+
+    # Solo eventos con ventana completa (window_size filas hasta el propio evento)
+    scorable = [r for r in pending if position.get(r["id"], -1) + 1 >= window_size]
+    fresh = {}
+    if scorable:
+        new_scores = model_loader.score_windows_at(
+            values, freqs, anom, [position[r["id"]] for r in scorable], model_bundle
+        )
+        for r, sc in zip(scorable, new_scores.tolist()):
+            fresh[r["id"]] = (r["timestamp"], sc)
+        score_cache.put_many(version, fresh)
+    return {event_id: sc for event_id, (_, sc) in fresh.items()}
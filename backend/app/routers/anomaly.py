@@ -1,47 +1,94 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
-from app.utils import model_loader
-from app.utils.train_if import train_and_save
+from app.db import get_async_db
+from app.utils import model_loader, model_registry, response_cache, train_jobs
 from app.utils.features import DEFAULT_WINDOW_SIZE
 
 router = APIRouter(prefix="/anomaly", tags=["Model"])
 
 
 @router.get("/stream")
-def analyze_stream(db: Session = Depends(get_db)):
+async def analyze_stream(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Evalúa la última ventana de mediciones usando el modelo entrenado (IsolationForest).
-    Devuelve el puntaje de anomalía y estado.
+    Devuelve el puntaje de anomalía y estado (ETag/304 si no hubo datos ni modelo nuevos).
     """
-    result = model_loader.score_recent_window(db)
-    return result
+    return await response_cache.respond_async(
+        request, db, lambda headers: model_loader.score_recent_window_async(db)
+    )
 
 
-@router.post("/train")
-def train_model(window_size: int = None, threshold_pct: float | None = None):
+@router.post("/train", status_code=202)
+def train_model(
+    window_size: int = None,
+    threshold_pct: float | None = None,
+    stride: int | None = Query(None, ge=1),
+    max_windows: int | None = Query(None, ge=0),
+    n_jobs: int | None = None,
+    warm_start: int = Query(0, ge=0),
+):
     """
-    Entrena y guarda el modelo IsolationForest con las muestras actuales.
+    Encola el entrenamiento de IsolationForest con las muestras actuales (segundo plano).
+    Al terminar se registra como nueva versión activa. Consultar con GET /anomaly/train/{job_id}.
+
+    - stride: paso entre ventanas; max_windows: tope de ventanas (muestreo reservoir)
+    - n_jobs: núcleos para construir árboles (-1 = todos)
+    - warm_start: agrega N árboles a la versión activa usando solo las mediciones nuevas
     """
     try:
-        bundle = train_and_save(
+        job = train_jobs.submit(
             window_size=window_size or DEFAULT_WINDOW_SIZE,
             threshold_pct=threshold_pct,
+            stride=stride,
+            max_windows=max_windows,
+            n_jobs=n_jobs,
+            warm_start_trees=warm_start or None,
         )
-        # recarga modelo en cache
-        model_loader.load_model()
-        return {
-            "success": True,
-            "message": "Modelo entrenado y guardado",
-            "window_size": bundle.get("window_size"),
-            "threshold": bundle.get("threshold"),
-            "threshold_pct": bundle.get("threshold_pct"),
-            "score_mean": bundle.get("score_mean"),
-            "score_std": bundle.get("score_std"),
-            "train_windows": bundle.get("train_windows"),
-            "train_samples": bundle.get("train_samples"),
-            "note": bundle.get("note", ""),
-        }
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    except train_jobs.TrainingSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"success": True, "message": "Entrenamiento encolado", **job}
+
+
+@router.get("/train")
+def list_train_jobs():
+    """Trabajos de entrenamiento recientes (más nuevos primero)."""
+    return train_jobs.list_jobs()
+
+
+@router.get("/train/{job_id}")
+def get_train_job(job_id: str):
+    """
+    Estado del trabajo: queued/running/done/failed/cancelled, fase actual
+    (fetch, featurize, fit, register, activate), ventanas y árboles procesados.
+    """
+    job = train_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+@router.delete("/train/{job_id}")
+def cancel_train_job(job_id: str):
+    """Cancela el trabajo; el modelo activo no cambia."""
+    job = train_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+@router.get("/models")
+def list_models():
+    """Versiones registradas y modelo cargado en este proceso."""
+    return {"versions": model_registry.list_versions(), "loaded": model_loader.loaded_model()}
+
+
+@router.post("/models/activate")
+def activate_model(version: int):
+    """Activa una versión registrada (rollback/roll-forward) y la carga en caliente."""
+    try:
+        model_registry.activate_version(version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    bundle = model_loader.load_model()
+    return {"version": version, "model_id": bundle.get("model_id") if bundle else None}
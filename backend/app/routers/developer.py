@@ -1,11 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-import os
-from pathlib import Path
 
 from app.db import get_db
-from app.utils.model_loader import load_model
-from app.utils.train_if import train_and_save
+from app.utils import broadcaster, kpi_state, model_loader, model_registry, score_cache, train_jobs
 from app.utils.features import DEFAULT_WINDOW_SIZE
 
 router = APIRouter(prefix="/v2", tags=["Developer Mode"])
@@ -18,33 +15,28 @@ def generate_data(db: Session = Depends(get_db)):
     from sqlalchemy import text
 
     db.execute(text("DELETE FROM measurements"))
+    score_cache.bump_epoch(db)
     db.commit()
+    score_cache.clear()
 
     populate_measurements(db, n=10_000)
+    kpi_state.reset()
+    broadcaster.reset()
 
     return {"message": "Se generaron 10 000 mediciones"}
 
 
-@router.post("/train")
+@router.post("/train", status_code=202)
 def train_model(window_size: int | None = None, threshold_pct: float | None = None):
     """
-    Entrena y guarda el modelo IsolationForest (fuente única de inferencia).
+    Encola el entrenamiento del modelo IsolationForest (fuente única de inferencia);
+    el avance se consulta en GET /anomaly/train/{job_id}.
     """
-    bundle = train_and_save(
-        window_size=window_size or DEFAULT_WINDOW_SIZE,
-        threshold_pct=threshold_pct,
-    )
-    # recarga en cache por si estaba vacío
-    load_model()
-    return {
-        "message": "Modelo IsolationForest entrenado",
-        "window_size": bundle.get("window_size"),
-        "threshold": bundle.get("threshold"),
-        "threshold_pct": bundle.get("threshold_pct"),
-        "train_windows": bundle.get("train_windows"),
-        "train_samples": bundle.get("train_samples"),
-        "note": bundle.get("note", ""),
-    }
+    try:
+        job = train_jobs.submit(window_size=window_size or DEFAULT_WINDOW_SIZE, threshold_pct=threshold_pct)
+    except train_jobs.TrainingSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"message": "Entrenamiento de IsolationForest encolado", **job}
 
 
 @router.post("/update")
@@ -61,14 +53,19 @@ def update_results():
 
 @router.post("/clear")
 def clear_database(db: Session = Depends(get_db)):
-    """Limpia tablas measurements y models, y borra el archivo del modelo IF."""
+    """Limpia tablas measurements y models, y borra los archivos de los modelos IF."""
     from sqlalchemy import text
     db.execute(text("DELETE FROM measurements"))
     db.execute(text("DELETE FROM models"))
+    score_cache.bump_epoch(db)
     db.commit()
+    score_cache.clear()
+    kpi_state.reset()
+    broadcaster.reset()
 
-    model_path = Path(__file__).resolve().parent.parent / "models_store" / "model_if.pkl"
-    if model_path.exists():
-        os.remove(model_path)
+    model_registry.clear_artifacts()
+    if model_registry.LEGACY_PATH.exists():
+        model_registry.LEGACY_PATH.unlink()
+    model_loader.load_model()
 
     return {"message": "Datos limpiados y modelo IsolationForest eliminado"}
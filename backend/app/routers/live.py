@@ -0,0 +1,43 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.utils import broadcaster
+
+router = APIRouter(prefix="/live", tags=["Live"])
+
+
+@router.get("/stream")
+async def stream():
+    """
+    Server-Sent Events con measurements nuevas, anomalías y deltas de KPIs.
+    Todos los clientes comparten un único flujo de consultas (app.utils.broadcaster).
+    """
+    async def events():
+        # Suscripción dentro del generador: si el cliente se va antes de iterar no queda registrada
+        queue = broadcaster.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=broadcaster.HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para mantener viva la conexión a través de proxies
+                    yield ": ping\n\n"
+                    continue
+                yield broadcaster.format_sse(event, data)
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+def stream_stats():
+    """Suscriptores conectados y eventos publicados/descartados."""
+    return broadcaster.stats()
@@ -0,0 +1,51 @@
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.utils import broadcaster, ingest
+
+router = APIRouter(prefix="/measurements", tags=["Measurements"])
+
+
+@router.post("/bulk")
+async def bulk_ingest(request: Request, format: str | None = None, db: Session = Depends(get_db)):
+    """
+    Ingesta masiva de mediciones (timestamp opcional, value, frequency, status).
+    Formato por Content-Type (application/x-ndjson, text/csv, application/vnd.apache.arrow.stream)
+    o por ?format=ndjson|csv|arrow. Filas inválidas se informan y se omiten;
+    un value/frequency NaN o infinito rechaza el lote con 422.
+    """
+    fmt = (format or ingest.detect_format(request.headers.get("content-type")) or "").lower()
+    if fmt not in ingest.PARSERS:
+        raise HTTPException(status_code=415, detail="Formato no soportado: usa NDJSON, CSV o Arrow")
+
+    t0 = time.perf_counter()
+    body = await request.body()
+    try:
+        rows, errors, rejected = await run_in_threadpool(ingest.PARSERS[fmt], body)
+    except RuntimeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ingest.NonFiniteValue as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Lote ilegible: {e}")
+    t_parsed = time.perf_counter()
+
+    method = await run_in_threadpool(ingest.write_measurements, db, rows)
+    t_done = time.perf_counter()
+    broadcaster.notify()
+
+    elapsed = t_done - t0
+    return {
+        "inserted": len(rows),
+        "rejected": rejected,
+        "errors": errors,
+        "method": method,
+        "parse_s": round(t_parsed - t0, 4),
+        "write_s": round(t_done - t_parsed, 4),
+        "elapsed_s": round(elapsed, 4),
+        "rows_per_s": round(len(rows) / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,203 @@
+"""
+Análisis por lotes para POST /analyze/batch: expande archivos sueltos y
+archivos comprimidos (zip/tar), reparte el análisis en el pool de procesos
+y persiste los resultados en analyses con inserciones masivas.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.db import SessionLocal
+from app.models import Analysis
+from app.utils import audio_pool
+from app.utils.audio_processing import INMEMORY_MAX_BYTES
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".mp3", ".aiff", ".aif", ".au"}
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+# Comprimido corrupto/ilegible: se informa como error de ese archivo y el lote sigue
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, zlib.error, EOFError, OSError)
+# Trabajos del lote en vuelo a la vez (el resto espera cupo en el pool)
+BATCH_CONCURRENCY = int(os.getenv("AUDIO_BATCH_CONCURRENCY", str(max(1, audio_pool.WORKERS))))
+BATCH_INSERT_SIZE = int(os.getenv("AUDIO_BATCH_INSERT_SIZE", "200"))
+
+
+def is_archive(filename: str) -> bool:
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_audio(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+def _extract_to_temp(src) -> str:
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        shutil.copyfileobj(src, tmp, 1024 * 1024)
+        return tmp.name
+
+
+def iter_inputs(uploads: List[Tuple[str, str]]) -> Iterator[Tuple[str, Union[bytes, str, Exception]]]:
+    """
+    Consume (filename, path) ya volcados a disco (se van retirando de la lista).
+    Los comprimidos se expanden miembro a miembro (solo extensiones de audio):
+    en memoria si el miembro es chico, si no a un temporal propio.
+    Si un comprimido no se puede leer se entrega (filename, excepción) y se sigue.
+    """
+    while uploads:
+        filename, path = uploads.pop(0)
+        if not is_archive(filename):
+            yield filename, path
+            continue
+        try:
+            if filename.lower().endswith(".zip"):
+                with zipfile.ZipFile(path) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or not _is_audio(info.filename):
+                            continue
+                        if info.file_size <= INMEMORY_MAX_BYTES:
+                            yield info.filename, zf.read(info)
+                            continue
+                        with zf.open(info) as member:
+                            yield info.filename, _extract_to_temp(member)
+            else:
+                with tarfile.open(path, mode="r:*") as tf:
+                    for info in tf:
+                        if not info.isfile() or not _is_audio(info.name):
+                            continue
+                        member = tf.extractfile(info)
+                        if member is None:
+                            continue
+                        if info.size <= INMEMORY_MAX_BYTES:
+                            yield info.name, member.read()
+                        else:
+                            yield info.name, _extract_to_temp(member)
+        except ARCHIVE_ERRORS as e:
+            yield filename, e
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+
+def _persist(rows: List[Dict]) -> int:
+    if not rows:
+        return 0
+    with SessionLocal() as db:
+        db.bulk_insert_mappings(Analysis, rows)
+        db.commit()
+    return len(rows)
+
+
+def _to_row(filename: str, result: Dict) -> Dict:
+    return {
+        "filename": filename,
+        "rms_db": result.get("rms_db"),
+        "dominant_freq_hz": result.get("dominant_freq_hz"),
+        "confidence_percent": result.get("confidence_percent"),
+        "status": result.get("status"),
+        "mensaje": result.get("mensaje"),
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def _analyze_one(filename: str, source: Union[bytes, str, Exception], machine_type: str, streaming: Optional[bool]) -> Dict:
+    if isinstance(source, Exception):
+        return {"filename": filename, "error": f"comprimido ilegible: {source}"}
+    try:
+        result = await audio_pool.run_analysis(
+            source, filename, machine_type=machine_type, streaming=streaming, wait_for_slot=True
+        )
+        result["filename"] = filename
+        return result
+    except Exception as e:
+        return {"filename": filename, "error": str(e) or type(e).__name__}
+
+
+async def stream_batch(
+    uploads: List[Tuple[str, str]],
+    machine_type: str = "generic",
+    streaming: Optional[bool] = None,
+    persist: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Genera líneas NDJSON a medida que terminan los análisis (orden de finalización)
+    y una línea final {"summary": ...}.
+    """
+    t0 = time.perf_counter()
+    remaining = list(uploads)
+    inputs = iter_inputs(remaining)
+    in_flight = set()
+    pending_rows: List[Dict] = []
+    ok = errors = persisted = 0
+    exhausted = False
+    fetch = None
+
+    try:
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < BATCH_CONCURRENCY:
+                # shield: si cancelan la espera, el next() sigue en su hilo y se espera en el finally
+                fetch = asyncio.ensure_future(asyncio.to_thread(next, inputs, None))
+                item = await asyncio.shield(fetch)
+                fetch = None
+                if item is None:
+                    exhausted = True
+                    break
+                filename, source = item
+                in_flight.add(asyncio.create_task(_analyze_one(filename, source, machine_type, streaming)))
+            if not in_flight:
+                break
+
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if "error" in result:
+                    errors += 1
+                else:
+                    ok += 1
+                    if persist:
+                        pending_rows.append(_to_row(result["filename"], result))
+                yield json.dumps(result, default=str) + "\n"
+
+            if len(pending_rows) >= BATCH_INSERT_SIZE:
+                persisted += await asyncio.to_thread(_persist, pending_rows)
+                pending_rows = []
+
+        persisted += await asyncio.to_thread(_persist, pending_rows)
+    finally:
+        # Cliente desconectado o error: no dejar temporales huérfanos
+        for task in in_flight:
+            task.cancel()
+        # No cerrar el generador mientras un next() corre en otro hilo
+        if fetch is not None:
+            await asyncio.wait({fetch})
+            if not fetch.cancelled() and fetch.exception() is None and fetch.result() is not None:
+                _, source = fetch.result()
+                if isinstance(source, str):
+                    with contextlib.suppress(OSError):
+                        os.remove(source)
+        inputs.close()
+        for _, path in remaining:
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+    elapsed = time.perf_counter() - t0
+    yield json.dumps(
+        {
+            "summary": {
+                "files": ok + errors,
+                "ok": ok,
+                "errors": errors,
+                "persisted": persisted,
+                "elapsed_s": round(elapsed, 3),
+                "files_per_s": round((ok + errors) / elapsed, 2) if elapsed > 0 else None,
+            }
+        }
+    ) + "\n"
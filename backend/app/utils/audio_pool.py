@@ -0,0 +1,205 @@
+"""
+Pool de procesos para el analisis de audio (CPU-bound) fuera del event loop.
+
+- AUDIO_WORKERS: procesos del pool (0 = hilo del executor por defecto, util en desarrollo)
+- AUDIO_MAX_PENDING: trabajos admitidos a la vez (en cola + en cómputo); por encima se rechaza
+- AUDIO_JOB_TIMEOUT_SECONDS: espera maxima por trabajo. El proceso no se puede interrumpir,
+  así que un trabajo vencido sigue ocupando su cupo hasta terminar.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Union
+
+from app.utils import metrics
+from app.utils.audio_processing import analyze_source
+
+WORKERS = int(os.getenv("AUDIO_WORKERS", str(os.cpu_count() or 1)))
+MAX_PENDING = int(os.getenv("AUDIO_MAX_PENDING", str(max(1, 2 * WORKERS))))
+JOB_TIMEOUT_SECONDS = float(os.getenv("AUDIO_JOB_TIMEOUT_SECONDS", "300"))
+START_METHOD = os.getenv("AUDIO_POOL_START_METHOD", "spawn")
+
+
+class PoolSaturated(RuntimeError):
+    """No hay cupo para más trabajos de audio (backpressure)."""
+
+
+class JobTimeout(RuntimeError):
+    """El trabajo no terminó dentro de AUDIO_JOB_TIMEOUT_SECONDS."""
+
+
+_lock = threading.Lock()
+_executor: Optional[Executor] = None
+_pending = 0
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "timed_out": 0,
+    "queue_wait_s_sum": 0.0,
+    "queue_wait_s_max": 0.0,
+    "compute_s_sum": 0.0,
+    "compute_s_max": 0.0,
+}
+
+
+def _get_executor() -> Optional[Executor]:
+    global _executor
+    if WORKERS <= 0:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context(START_METHOD),
+            )
+        return _executor
+
+
+def _timed_analyze(source: Union[bytes, str], filename, machine_type: str, streaming: Optional[bool], submitted_at: float) -> Dict:
+    """Corre en el worker: devuelve resultado, tiempos de espera en cola y de cómputo, y métricas por etapa."""
+    started_at = time.time()
+    with metrics.capture() as observed:
+        result = analyze_source(source, filename, machine_type=machine_type, streaming=streaming)
+    return {
+        "result": result,
+        "queue_wait_s": max(0.0, started_at - submitted_at),
+        "compute_s": time.time() - started_at,
+        "metrics": observed,
+    }
+
+
+def _acquire(count_rejection: bool = True) -> None:
+    global _pending
+    with _lock:
+        if _pending >= MAX_PENDING:
+            if count_rejection:
+                _stats["rejected"] += 1
+            raise PoolSaturated(f"Analizador saturado ({_pending}/{MAX_PENDING} trabajos en curso)")
+        _pending += 1
+        _stats["submitted"] += 1
+
+
+async def _acquire_waiting() -> None:
+    """Espera cupo en lugar de rechazar (trabajos por lotes)."""
+    while True:
+        try:
+            _acquire(count_rejection=False)
+            return
+        except PoolSaturated:
+            await asyncio.sleep(0.05)
+
+
+def _discard(source: Union[bytes, str]) -> None:
+    """Borra el temporal si el origen es una ruta (los bytes en memoria no dejan nada)."""
+    if isinstance(source, str):
+        try:
+            os.remove(source)
+        except OSError:
+            pass
+
+
+def _release(source: Union[bytes, str]) -> None:
+    global _pending
+    _discard(source)
+    with _lock:
+        _pending -= 1
+
+
+def _finish(future, source: Union[bytes, str]) -> None:
+    """Callback al terminar el trabajo (aunque el request ya haya vencido): libera cupo y temporal."""
+    _release(source)
+    with _lock:
+        if future.cancelled() or future.exception() is not None:
+            _stats["failed"] += 1
+            return
+        timing = future.result()
+        metrics.replay(timing["metrics"])
+        _stats["completed"] += 1
+        _stats["queue_wait_s_sum"] += timing["queue_wait_s"]
+        _stats["queue_wait_s_max"] = max(_stats["queue_wait_s_max"], timing["queue_wait_s"])
+        _stats["compute_s_sum"] += timing["compute_s"]
+        _stats["compute_s_max"] = max(_stats["compute_s_max"], timing["compute_s"])
+
+
+async def run_analysis(
+    source: Union[bytes, str],
+    filename,
+    machine_type: str = "generic",
+    streaming: Optional[bool] = None,
+    wait_for_slot: bool = False,
+) -> Dict:
+    """
+    Encola el análisis de un audio en memoria (bytes, viaja al worker por IPC) o ya volcado
+    a disco (ruta; el pool se adueña del archivo y lo borra al terminar).
+    Lanza PoolSaturated (salvo wait_for_slot) o JobTimeout.
+    """
+    if wait_for_slot:
+        try:
+            await _acquire_waiting()
+        except asyncio.CancelledError:
+            _discard(source)
+            raise
+    else:
+        try:
+            _acquire()
+        except PoolSaturated:
+            _discard(source)
+            raise
+
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(
+            _get_executor(), _timed_analyze, source, filename, machine_type, streaming, time.time()
+        )
+    except Exception:
+        _release(source)
+        with _lock:
+            _stats["failed"] += 1
+        raise
+    future.add_done_callback(lambda f: _finish(f, source))
+    try:
+        timing = await asyncio.wait_for(asyncio.shield(future), timeout=JOB_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        with _lock:
+            _stats["timed_out"] += 1
+        raise JobTimeout(f"El análisis superó {JOB_TIMEOUT_SECONDS:.0f}s")
+    except BrokenProcessPool:
+        # Un worker murió (p.ej. OOM): se descarta el pool para recrearlo en el próximo trabajo
+        shutdown()
+        raise
+
+    result = timing["result"]
+    result["timing"] = {
+        "queue_wait_s": round(timing["queue_wait_s"], 4),
+        "compute_s": round(timing["compute_s"], 4),
+    }
+    return result
+
+
+def stats() -> Dict:
+    with _lock:
+        done = _stats["completed"] or 1
+        return {
+            "workers": WORKERS,
+            "max_pending": MAX_PENDING,
+            "pending": _pending,
+            "job_timeout_s": JOB_TIMEOUT_SECONDS,
+            **_stats,
+            "queue_wait_s_avg": _stats["queue_wait_s_sum"] / done,
+            "compute_s_avg": _stats["compute_s_sum"] / done,
+        }
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
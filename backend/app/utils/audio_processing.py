@@ -1,9 +1,31 @@
+import io
 import librosa
 import numpy as np
+import soundfile as sf
 import tempfile
 import os
+from contextlib import nullcontext
 from scipy import signal
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from app.utils import metrics
+
+# Modo streaming (por bloques, memoria acotada) es opt-in: ?streaming=true, o automático
+# para audios de al menos AUDIO_STREAM_MIN_SECONDS si se define (> 0). Sus resultados no
+# coinciden con el análisis en memoria (frecuencia dominante y niveles por banda salen de
+# espectros por bloque), así que por defecto no cambia la respuesta de nadie.
+STREAM_MIN_SECONDS = float(os.getenv("AUDIO_STREAM_MIN_SECONDS", "0"))
+STREAM_BLOCK_SECONDS = float(os.getenv("AUDIO_STREAM_BLOCK_SECONDS", "10"))
+# Largo de segmento (muestras) del espectro promediado tipo Welch
+WELCH_NPERSEG = int(os.getenv("AUDIO_WELCH_NPERSEG", "65536"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Uploads hasta este tamaño se decodifican en memoria (sin archivo temporal)
+INMEMORY_MAX_BYTES = int(os.getenv("AUDIO_INMEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+# Muestras maximas por lote (rfft + STFT de librosa) en el analisis por ventanas
+WINDOW_BATCH_SAMPLES = int(os.getenv("AUDIO_WINDOW_BATCH_SAMPLES", "4000000"))
+
+BANDS = [0, 500, 1000, 4000, 8000, 12000]
+PROFILE_BANDS = {"motor": (50, 2000), "compressor": (2000, 8000)}
 
 def apply_band_filter(y, sr, lowcut, highcut, order=5):
     """Aplica un filtro Butterworth de banda pasante."""
@@ -13,36 +35,191 @@ def apply_band_filter(y, sr, lowcut, highcut, order=5):
     b, a = signal.butter(order, [low, high], btype='band')
     return signal.lfilter(b, a, y)
 
+def analyze_windows(frames: np.ndarray, sr) -> List[Dict[str, Any]]:
+    """
+    Analiza un lote de ventanas (matriz n_ventanas x largo, p.ej. vista de librosa.util.frame).
+    Mismas métricas que el análisis ventana por ventana: frecuencia dominante de la rfft de la
+    ventana, RMS y flatness de librosa (tramas de 2048 / salto 512) promediados por ventana;
+    librosa procesa cada lote de ventanas como canales, con una rfft y un STFT por lote.
+    """
+    n_windows, win_length = frames.shape
+    if n_windows == 0 or win_length == 0:
+        return []
+    freqs = np.fft.rfftfreq(win_length, 1 / sr)
+
+    dominant = np.empty(n_windows)
+    rms = np.empty(n_windows)
+    flatness = np.empty(n_windows)
+    step = max(1, WINDOW_BATCH_SAMPLES // win_length)
+    for start in range(0, n_windows, step):
+        batch = frames[start : start + step]
+        spectrum = np.abs(np.fft.rfft(batch, axis=1))
+        dominant[start : start + step] = freqs[np.argmax(spectrum, axis=1)]
+        rms[start : start + step] = np.mean(librosa.feature.rms(y=batch), axis=(1, 2))
+        flatness[start : start + step] = np.mean(librosa.feature.spectral_flatness(y=batch), axis=(1, 2))
+
+    return [
+        {
+            "rms_db": round(float(r) * 100, 1),
+            "dominant_hz": int(d),
+            "flatness": round(float(f), 3),
+        }
+        for d, r, f in zip(dominant, rms, flatness)
+    ]
+
+
 def analyze_window(y_window, sr):
     """Analiza un segmento corto de audio (ventana)."""
-    # FFT
-    spectrum = np.abs(np.fft.rfft(y_window))
-    freqs = np.fft.rfftfreq(len(y_window), 1 / sr)
-    dominant_freq = float(freqs[np.argmax(spectrum)])
-    
-    # Metricas
-    rms = float(np.mean(librosa.feature.rms(y=y_window)))
-    rms_db = round(rms * 100, 1)
-    
-    # Flatness
-    flatness = float(np.mean(librosa.feature.spectral_flatness(y=y_window)))
-    
+    return analyze_windows(np.asarray(y_window)[np.newaxis, :], sr)[0]
+
+
+class _BlockFramer:
+    """
+    Acumula muestras que llegan por bloques y entrega tramos con marcos completos
+    (frame_length / hop_length), guardando el resto para el siguiente bloque.
+    """
+
+    def __init__(self, frame_length: int, hop_length: int):
+        self.frame_length = frame_length
+        self.hop_length = max(1, hop_length)
+        self._buf = np.empty(0, dtype=np.float32)
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        buf = np.concatenate((self._buf, samples)) if self._buf.size else samples
+        if buf.size < self.frame_length:
+            self._buf = buf
+            return buf[:0]
+        n_frames = 1 + (buf.size - self.frame_length) // self.hop_length
+        span = buf[: self.frame_length + (n_frames - 1) * self.hop_length]
+        self._buf = buf[n_frames * self.hop_length :].copy()
+        return span
+
+
+def _rewind(source) -> None:
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def decode_audio(source) -> Tuple[np.ndarray, int]:
+    """
+    Decodifica con soundfile directamente desde ruta o buffer (BytesIO), sin temporal
+    ni remuestreo: mismo resultado que librosa.load(sr=None) (mono float32).
+    """
+    _rewind(source)
+    y, sr = sf.read(source, dtype="float32", always_2d=True)
+    return (y.mean(axis=1, dtype=np.float32) if y.shape[1] > 1 else y[:, 0]), int(sr)
+
+
+async def read_upload(file) -> Union[bytes, str]:
+    """
+    Devuelve el contenido del upload en memoria si es chico (<= INMEMORY_MAX_BYTES),
+    o la ruta de un temporal para archivos grandes (modo streaming).
+    """
+    size = getattr(file, "size", None)
+    if size is not None and size <= INMEMORY_MAX_BYTES:
+        return await file.read()
+    return await spool_upload(file)
+
+
+async def spool_upload(file) -> str:
+    """Copia el upload a un archivo temporal por trozos (sin cargarlo entero en memoria)."""
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+        return tmp.name
+
+
+def _band_levels(freqs: np.ndarray, spectrum: np.ndarray) -> List[float]:
+    """Energia media por banda (dB) sobre un espectro de magnitud."""
+    band_levels = []
+    for i in range(len(BANDS) - 1):
+        idx = np.where((freqs >= BANDS[i]) & (freqs < BANDS[i + 1]))[0]
+        if len(idx) > 0:
+            energy = float(np.mean(spectrum[idx]))
+            band_levels.append(round(20 * np.log10(energy + 1e-6), 1))
+        else:
+            band_levels.append(-120.0)
+    return band_levels
+
+
+def _build_result(
+    filename,
+    machine_type: str,
+    windows_data: List[Dict],
+    profile_data: Dict,
+    rms_global: float,
+    snr_global: float,
+    flatness_global: float,
+    crest_global: float,
+    dominant_freq_global: float,
+    band_levels: List[float],
+) -> Dict[str, Any]:
+    """Heuristica de anomalia multiventana + perfil y armado de la respuesta."""
+    reasons = []
+
+    # Evaluar ventanas individuales
+    found_transient = False
+    for idx, w in enumerate(windows_data):
+        if w["rms_db"] > 90:
+            reasons.append(f"pico de nivel en ventana {idx}")
+            found_transient = True
+        if w["dominant_hz"] > 8500:
+            reasons.append(f"alta frecuencia en ventana {idx}")
+            found_transient = True
+        if found_transient: break
+
+    # Evaluacion por perfil
+    if profile_data.get("band_rms_db", 0) > 70:
+        reasons.append(f"nivel critico en banda de {machine_type}")
+
+    # Heurísticas globales
+    rms_db = round(rms_global * 100, 1)
+    snr_db = round(snr_global, 2)
+    flatness_r = round(flatness_global, 3)
+    crest_r = round(crest_global, 2)
+    dominant_hz = int(dominant_freq_global)
+
+    if not found_transient:
+        if dominant_hz < 50: reasons.append("frecuencia global demasiado baja")
+        if flatness_r > 0.25: reasons.append("flatness global alta")
+        if snr_db < -3 and rms_db < 10: reasons.append("SNR global muy bajo")
+        if crest_r > 6: reasons.append("crest factor global alto")
+
+    anomaly = len(reasons) > 0
+    estado = "Anomalo" if anomaly else "Normal"
+    mensaje = "; ".join(reasons) if anomaly else "Sin anomalias detectadas"
+    confianza = 80.0 if anomaly else 95.0
+
     return {
         "rms_db": rms_db,
-        "dominant_hz": int(dominant_freq),
-        "flatness": round(flatness, 3)
+        "dominant_freq_hz": dominant_hz,
+        "confidence_percent": float(confianza),
+        "status": estado,
+        "mensaje": mensaje,
+        "snr_db": snr_db,
+        "flatness": flatness_r,
+        "crest_factor": crest_r,
+        "band_levels": [float(x) for x in band_levels],
+        "filename": filename,
+        "machine_profile": profile_data,
+        "windowed_analysis": windows_data
     }
 
-async def analyze_audio(file, machine_type: str = "generic"):
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
 
-    try:
-        # Cargar y normalizar
-        y, sr = librosa.load(tmp_path, sr=None)
-        y = librosa.util.normalize(y)
+def _analyze_signal(y, sr, filename, machine_type: str = "generic") -> Dict[str, Any]:
+    """Analisis en memoria de la señal completa."""
+    y = librosa.util.normalize(y)
+    metrics.inc("audio_seconds_processed_total", len(y) / sr if sr else 0.0)
 
+    with metrics.stage("fft"):
         # 1. Análisis Global
         spectrum_full = np.abs(np.fft.rfft(y))
         freqs_full = np.fft.rfftfreq(len(y), 1 / sr)
@@ -51,97 +228,247 @@ async def analyze_audio(file, machine_type: str = "generic"):
         # 2. Análisis por Ventanas (Segmentación)
         win_length = int(0.5 * sr)
         hop_length = int(win_length / 2)
-        
+
         if len(y) < win_length:
             win_length = len(y)
             hop_length = len(y)
 
-        windows_data = []
-        for i in range(0, len(y) - win_length + 1, hop_length):
-            segment = y[i : i + win_length]
-            w_res = analyze_window(segment, sr)
-            windows_data.append(w_res)
-
-        # 3. Filtrado por bandas específicas según tipo de máquina
-        profile_data = {}
-        if machine_type == "motor":
-            # Motores suelen fallar en bajas-medias (50-2000 Hz)
-            y_filt = apply_band_filter(y, sr, 50, 2000)
-            rms_filt = float(np.mean(librosa.feature.rms(y=y_filt)))
-            profile_data = {"profile": "motor", "band_rms_db": round(rms_filt * 100, 1)}
-        elif machine_type == "compressor":
-            # Compresores operan a altas presiones, bandas altas (2000-8000 Hz)
-            y_filt = apply_band_filter(y, sr, 2000, 8000)
-            rms_filt = float(np.mean(librosa.feature.rms(y=y_filt)))
-            profile_data = {"profile": "compressor", "band_rms_db": round(rms_filt * 100, 1)}
-
-        # 4. Metricas Globales para compatibilidad
-        rms_global = float(np.mean(librosa.feature.rms(y=y)))
-        snr_global = float(10 * np.log10(np.mean(y**2) / (np.mean((y - np.mean(y))**2) + 1e-10)))
-        flatness_global = float(np.mean(librosa.feature.spectral_flatness(y=y)))
-        crest_global = float(np.max(np.abs(y)) / np.sqrt(np.mean(y**2)))
-
-        # 5. Energia por banda (dB)
-        bands = [0, 500, 1000, 4000, 8000, 12000]
-        band_levels = []
-        for i in range(len(bands) - 1):
-            idx = np.where((freqs_full >= bands[i]) & (freqs_full < bands[i + 1]))[0]
-            if len(idx) > 0:
-                energy = float(np.mean(spectrum_full[idx]))
-                band_levels.append(round(20 * np.log10(energy + 1e-6), 1))
-            else:
-                band_levels.append(-120.0)
-
-        # 6. Heurística de anomalía multiventana + perfil
-        reasons = []
-        
-        # Evaluar ventanas individuales
-        found_transient = False
-        for idx, w in enumerate(windows_data):
-            if w["rms_db"] > 90:
-                reasons.append(f"pico de nivel en ventana {idx}")
-                found_transient = True
-            if w["dominant_hz"] > 8500:
-                reasons.append(f"alta frecuencia en ventana {idx}")
-                found_transient = True
-            if found_transient: break
-
-        # Evaluacion por perfil
-        if profile_data.get("band_rms_db", 0) > 70:
-            reasons.append(f"nivel critico en banda de {machine_type}")
-
-        # Heurísticas globales
-        rms_db = round(rms_global * 100, 1)
-        snr_db = round(snr_global, 2)
-        flatness_r = round(flatness_global, 3)
-        crest_r = round(crest_global, 2)
-        dominant_hz = int(dominant_freq_global)
-
-        if not found_transient:
-            if dominant_hz < 50: reasons.append("frecuencia global demasiado baja")
-            if flatness_r > 0.25: reasons.append("flatness global alta")
-            if snr_db < -3 and rms_db < 10: reasons.append("SNR global muy bajo")
-            if crest_r > 6: reasons.append("crest factor global alto")
-
-        anomaly = len(reasons) > 0
-        estado = "Anomalo" if anomaly else "Normal"
-        mensaje = "; ".join(reasons) if anomaly else "Sin anomalias detectadas"
-        confianza = 80.0 if anomaly else 95.0
-
-        return {
-            "rms_db": rms_db,
-            "dominant_freq_hz": dominant_hz,
-            "confidence_percent": float(confianza),
-            "status": estado,
-            "mensaje": mensaje,
-            "snr_db": snr_db,
-            "flatness": flatness_r,
-            "crest_factor": crest_r,
-            "band_levels": [float(x) for x in band_levels],
-            "filename": file.filename,
-            "machine_profile": profile_data,
-            "windowed_analysis": windows_data
-        }
+        frames = librosa.util.frame(y, frame_length=win_length, hop_length=max(1, hop_length), axis=0) if len(y) else y[:0, None]
+        windows_data = analyze_windows(frames, sr)
+
+    # 3. Filtrado por bandas específicas según tipo de máquina
+    # Motores suelen fallar en bajas-medias (50-2000 Hz); compresores en bandas altas (2000-8000 Hz)
+    profile_data = {}
+    if machine_type in PROFILE_BANDS:
+        lowcut, highcut = PROFILE_BANDS[machine_type]
+        y_filt = apply_band_filter(y, sr, lowcut, highcut)
+        rms_filt = float(np.mean(librosa.feature.rms(y=y_filt)))
+        profile_data = {"profile": machine_type, "band_rms_db": round(rms_filt * 100, 1)}
+
+    # 4. Metricas Globales para compatibilidad
+    rms_global = float(np.mean(librosa.feature.rms(y=y)))
+    snr_global = float(10 * np.log10(np.mean(y**2) / (np.mean((y - np.mean(y))**2) + 1e-10)))
+    flatness_global = float(np.mean(librosa.feature.spectral_flatness(y=y)))
+    crest_global = float(np.max(np.abs(y)) / np.sqrt(np.mean(y**2)))
+
+    # 5. Energia por banda (dB)
+    band_levels = _band_levels(freqs_full, spectrum_full)
+
+    # 6. Heurística de anomalía multiventana + perfil
+    return _build_result(
+        filename, machine_type, windows_data, profile_data,
+        rms_global, snr_global, flatness_global, crest_global,
+        dominant_freq_global, band_levels,
+    )
+
+
+def _iter_mono_blocks(path, blocksize: int, timer: Optional[metrics.StageTimer] = None):
+    """
+    Lee el archivo (ruta o buffer) por bloques y devuelve mono float32 (promedio de canales,
+    como librosa); timer acumula el tiempo de decodificación.
+    """
+    _rewind(path)
+    blocks = sf.blocks(path, blocksize=blocksize, dtype="float32", always_2d=True)
+    clock = timer or nullcontext()
+    while True:
+        with clock:
+            block = next(blocks, None)
+            if block is not None:
+                block = block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+        if block is None:
+            return
+        yield block
+
+
+def _analyze_stream(path, filename, machine_type: str = "generic") -> Dict[str, Any]:
+    """
+    Analisis por bloques con memoria acotada (archivos largos).
+    Misma forma de respuesta que _analyze_signal; diferencias:
+    - frecuencia dominante y energia por banda salen de un espectro de magnitud
+      promediado por segmentos (tipo Welch, WELCH_NPERSEG muestras, solape 50%),
+      reescalado a la escala de la FFT completa para contenido de banda ancha
+    - RMS/flatness globales se promedian sobre marcos sin padding de bordes (center=False)
+    """
+    _rewind(path)
+    info = sf.info(path)
+    sr = int(info.samplerate)
+    n_total = int(info.frames)
+    if n_total <= 0:
+        raise ValueError("Archivo de audio vacio")
+    blocksize = max(1, int(STREAM_BLOCK_SECONDS * sr))
+    metrics.inc("audio_seconds_processed_total", n_total / sr)
+    decode = metrics.StageTimer("audio_decode")
+    fft = metrics.StageTimer("fft")
+
+    # Pasada 1: pico para normalizar igual que librosa.util.normalize
+    peak = 0.0
+    for block in _iter_mono_blocks(path, blocksize, decode):
+        if block.size:
+            peak = max(peak, float(np.max(np.abs(block))))
+    gain = 1.0 / peak if peak > 0 else 1.0
+
+    win_length = int(0.5 * sr)
+    hop_length = int(win_length / 2)
+    if n_total < win_length:
+        win_length = n_total
+        hop_length = n_total
+
+    nperseg = min(WELCH_NPERSEG, n_total)
+    welch_window = signal.get_window("hann", nperseg).astype(np.float32) if nperseg < n_total else None
+
+    windows = _BlockFramer(win_length, hop_length)
+    stft_frames = _BlockFramer(2048, 512)
+    segments = _BlockFramer(nperseg, nperseg // 2)
+
+    filt = None
+    if machine_type in PROFILE_BANDS:
+        lowcut, highcut = PROFILE_BANDS[machine_type]
+        nyq = 0.5 * sr
+        b, a = signal.butter(5, [lowcut / nyq, highcut / nyq], btype="band")
+        filt = {"b": b, "a": a, "zi": np.zeros(max(len(a), len(b)) - 1), "framer": _BlockFramer(2048, 512), "sum": 0.0, "n": 0}
+
+    windows_data = []
+    sum_y = sum_y2 = 0.0
+    count = 0
+    rms_sum = flat_sum = 0.0
+    n_frames = 0
+    spec_sum = None
+    n_segments = 0
+
+    # Pasada 2: metricas incrementales por bloque
+    for block in _iter_mono_blocks(path, blocksize, decode):
+        y = block * np.float32(gain)
+        y64 = y.astype(float)
+        sum_y += float(y64.sum())
+        sum_y2 += float(np.dot(y64, y64))
+        count += y.size
+
+        span = windows.push(y)
+        if span.size:
+            frames = librosa.util.frame(span, frame_length=win_length, hop_length=windows.hop_length, axis=0)
+            with fft:
+                windows_data.extend(analyze_windows(frames, sr))
+
+        span = stft_frames.push(y)
+        if span.size:
+            rms = librosa.feature.rms(y=span, center=False)
+            flat = librosa.feature.spectral_flatness(y=span, center=False)
+            rms_sum += float(rms.sum())
+            flat_sum += float(flat.sum())
+            n_frames += rms.shape[-1]
+
+        if welch_window is not None:
+            span = segments.push(y)
+            if span.size:
+                segs = librosa.util.frame(span, frame_length=nperseg, hop_length=segments.hop_length, axis=0)
+                with fft:
+                    mags = np.abs(np.fft.rfft(segs * welch_window, axis=1)).sum(axis=0)
+                spec_sum = mags if spec_sum is None else spec_sum + mags
+                n_segments += segs.shape[0]
+
+        if filt is not None:
+            y_filt, filt["zi"] = signal.lfilter(filt["b"], filt["a"], y64, zi=filt["zi"])
+            span = filt["framer"].push(y_filt.astype(np.float32))
+            if span.size:
+                rms = librosa.feature.rms(y=span, center=False)
+                filt["sum"] += float(rms.sum())
+                filt["n"] += rms.shape[-1]
+
+    if welch_window is None:
+        # Señal más corta que un segmento: el archivo entero cabe en memoria acotada
+        y_all = np.concatenate(list(_iter_mono_blocks(path, blocksize, decode))) * np.float32(gain)
+        with fft:
+            spectrum = np.abs(np.fft.rfft(y_all))
+        freqs = np.fft.rfftfreq(len(y_all), 1 / sr)
+    else:
+        # Magnitud de banda ancha crece con sqrt(N): se lleva a la escala de una FFT de n_total muestras
+        scale = np.sqrt(n_total / float(np.sum(welch_window.astype(float) ** 2)))
+        spectrum = spec_sum / max(n_segments, 1) * scale
+        freqs = np.fft.rfftfreq(nperseg, 1 / sr)
+    dominant_freq_global = float(freqs[np.argmax(spectrum)])
+    decode.record()
+    fft.record()
+
+    profile_data = {}
+    if filt is not None:
+        rms_filt = filt["sum"] / filt["n"] if filt["n"] else 0.0
+        profile_data = {"profile": machine_type, "band_rms_db": round(rms_filt * 100, 1)}
+
+    mean_y = sum_y / count
+    mean_y2 = sum_y2 / count
+    var_y = max(mean_y2 - mean_y * mean_y, 0.0)
+    rms_global = rms_sum / n_frames if n_frames else float(np.sqrt(mean_y2))
+    snr_global = float(10 * np.log10(mean_y2 / (var_y + 1e-10)))
+    flatness_global = flat_sum / n_frames if n_frames else 0.0
+    crest_global = float((peak * gain) / np.sqrt(mean_y2)) if mean_y2 > 0 else float("nan")
+
+    return _build_result(
+        filename, machine_type, windows_data, profile_data,
+        rms_global, snr_global, flatness_global, crest_global,
+        dominant_freq_global, _band_levels(freqs, spectrum),
+    )
+
+
+def _use_streaming(path, streaming: Optional[bool]) -> bool:
+    """Decide el modo: explicito, o automatico si STREAM_MIN_SECONDS > 0 y el archivo lo supera."""
+    if streaming is False or (streaming is None and STREAM_MIN_SECONDS <= 0):
+        return False
+    try:
+        _rewind(path)
+        info = sf.info(path)
+    except Exception:
+        # Formato no soportado por soundfile: queda el camino de librosa.load
+        return False
+    return bool(streaming) or info.duration >= STREAM_MIN_SECONDS
+
+
+def analyze_file(path: str, filename, machine_type: str = "generic", streaming: Optional[bool] = None) -> Dict[str, Any]:
+    """Analisis sincrono de un archivo en disco (punto de entrada de los workers del pool)."""
+    if _use_streaming(path, streaming):
+        return _analyze_stream(path, filename, machine_type=machine_type)
+
+    with metrics.stage("audio_decode"):
+        try:
+            y, sr = decode_audio(path)
+        except Exception:
+            # Formatos que soundfile no decodifica: librosa.load (audioread)
+            y, sr = librosa.load(path, sr=None)
+    return _analyze_signal(y, sr, filename, machine_type=machine_type)
+
+
+def analyze_bytes(data: bytes, filename, machine_type: str = "generic", streaming: Optional[bool] = None) -> Dict[str, Any]:
+    """Analisis de un audio ya en memoria; solo escribe temporal si soundfile no puede decodificarlo."""
+    buffer = io.BytesIO(data)
+    if _use_streaming(buffer, streaming):
+        return _analyze_stream(buffer, filename, machine_type=machine_type)
+
+    with metrics.stage("audio_decode"):
+        try:
+            y, sr = decode_audio(buffer)
+        except Exception:
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                tmp.write(data)
+                tmp_path = tmp.name
+            try:
+                y, sr = librosa.load(tmp_path, sr=None)
+            finally:
+                os.remove(tmp_path)
+    return _analyze_signal(y, sr, filename, machine_type=machine_type)
+
+
+def analyze_source(source: Union[bytes, str], filename, machine_type: str = "generic", streaming: Optional[bool] = None) -> Dict[str, Any]:
+    """Despacha segun el origen: bytes en memoria o ruta en disco."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return analyze_bytes(bytes(source), filename, machine_type=machine_type, streaming=streaming)
+    return analyze_file(source, filename, machine_type=machine_type, streaming=streaming)
+
+
+async def analyze_audio(file, machine_type: str = "generic", streaming: Optional[bool] = None):
+    source = await read_upload(file)
+
+    try:
+        return analyze_source(source, file.filename, machine_type=machine_type, streaming=streaming)
 
     finally:
-        os.remove(tmp_path)
+        if isinstance(source, str):
+            os.remove(source)
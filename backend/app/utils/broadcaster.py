@@ -0,0 +1,283 @@
+"""
+Canal de push para el dashboard (Server-Sent Events).
+
+Un único broadcaster por proceso consulta measurements de forma incremental
+(id > último visto) y reparte a todos los suscriptores:
+- measurements: filas nuevas con la misma forma que GET /analyses (derivadas + score)
+- anomalies: filas nuevas anómalas con la forma de GET /analyses/events
+- kpis: snapshot completo al conectar y luego solo las claves que cambiaron
+- reset: la tabla se regeneró/limpió o llegaron filas más viejas que las ya publicadas
+  (backfill); los clientes deben recargar
+
+La consulta corre cada LIVE_POLL_SECONDS mientras haya suscriptores (o antes si
+notify() avisa de una inserción en este proceso), así N dashboards cuestan un
+solo flujo de consultas.
+
+_poll corre en un hilo y reset()/unsubscribe() en el loop (o en otros hilos): el
+estado del flujo (_last_id, cola, kpis) se lee y se escribe bajo _lock, nunca
+durante la consulta. Cada reinicio sube _generation y un poll que empezó antes
+descarta su resultado en vez de pisar el reinicio.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from app.db import ReadSessionLocal
+from app.utils import kpi_state, model_loader, online_scoring, score_cache
+from app.utils.derived import add_derived
+
+POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "1"))
+HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+MAX_BATCH = int(os.getenv("LIVE_MAX_BATCH", "1000"))
+# La flatness derivada usa las 10 filas previas
+FLATNESS_CONTEXT = 10
+
+_SELECT = f"""
+    SELECT id, timestamp, value AS rms_db, frequency AS dominant_freq_hz, status,
+           score AS stored_score, score_model, {score_cache.DATA_EPOCH_COLUMN}
+    FROM measurements
+"""
+
+Event = Tuple[str, Any]
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def _order(row: Dict) -> Tuple:
+    return row["timestamp"], row["id"]
+
+
+def _is_anomaly(row: Dict) -> bool:
+    return str(row.get("status") or "").lower().startswith("anom")
+
+
+class _Broadcaster:
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._last_id: Optional[int] = None
+        self._tail: deque = deque()
+        self._kpis: Optional[Dict] = None
+        self._reset_pending = False
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    # --- suscriptores ---
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._kpis is not None:
+            queue.put_nowait(("kpis", self._kpis))
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            # Sin suscriptores no se sigue el flujo: al volver se reinicia desde la cola actual
+            with self._lock:
+                self._last_id = None
+                self._generation += 1
+
+    def _publish(self, event: str, data: Any) -> None:
+        for queue in self._subscribers:
+            if queue.full():
+                # Cliente lento: se descarta el evento más viejo
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((event, data))
+        self.published += 1
+
+    def notify(self) -> None:
+        """Despierta al broadcaster (seguro desde hilos)."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    # --- bucle ---
+    async def _run(self) -> None:
+        while True:
+            try:
+                events, more = await asyncio.to_thread(self._poll)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[live] Error consultando measurements: {e}")
+                events, more = [], False
+            for event, data in events:
+                self._publish(event, data)
+            if more:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _poll(self) -> Tuple[List[Event], bool]:
+        model_bundle = model_loader.get_model()
+        have_model = bool(model_bundle and model_bundle.get("model") and model_bundle.get("scaler"))
+        threshold = float(model_bundle.get("threshold", 0.0)) if have_model else None
+        context = max(int(model_bundle.get("window_size", 0)) if have_model else 0, FLATNESS_CONTEXT)
+        with self._lock:
+            generation, last_id = self._generation, self._last_id
+            prev_tail, prev_kpis = list(self._tail), self._kpis
+
+        with ReadSessionLocal() as db:
+            if last_id is None:
+                tail = (
+                    db.execute(text(f"{_SELECT} ORDER BY timestamp DESC, id DESC LIMIT :n"), {"n": context})
+                    .mappings()
+                    .all()
+                )
+                tail = [dict(r) for r in reversed(tail)]
+                online_scoring.seed_cache(tail)
+                # MAX(id) de la tabla, no de la cola: filas con id mayor pero timestamp viejo ya están incluidas
+                max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM measurements")).scalar()
+                kpis = kpi_state.snapshot(db)
+                with self._lock:
+                    if generation != self._generation:
+                        return [], True
+                    self._tail = deque(tail, maxlen=context)
+                    self._last_id = max_id
+                    self._kpis = kpis
+                    events = [("kpis", kpis)]
+                    if self._reset_pending:
+                        self._reset_pending = False
+                        events.insert(0, ("reset", {}))
+                return events, False
+
+            new = [
+                dict(r)
+                for r in db.execute(
+                    text(f"{_SELECT} WHERE id > :last ORDER BY id LIMIT :n"),
+                    {"last": last_id, "n": MAX_BATCH},
+                ).mappings()
+            ]
+            kpis = kpi_state.snapshot(db)
+        # Filas puntuadas al ingerir: el score sale de la columna, no se recalcula
+        version = online_scoring.seed_cache(new)
+
+        events: List[Event] = []
+        tail = prev_tail
+        if new:
+            last_id = new[-1]["id"]
+            # La serie a puntuar va en el mismo orden que las lecturas (timestamp, id)
+            new.sort(key=_order)
+            if prev_tail and _order(new[0]) < _order(prev_tail[-1]):
+                # Filas insertadas antes de la cola (backfill): la serie ya no es contigua;
+                # los clientes recargan y se reinicia desde la cola actual
+                self.reset()
+                return [], True
+            series = prev_tail + new
+            scores = [None] * len(series)
+            if have_model:
+                scores = model_loader.score_series(
+                    ids=[r["id"] for r in series],
+                    timestamps=[r["timestamp"] for r in series],
+                    values=np.asarray([float(r.get("rms_db") or 0.0) for r in series], dtype=float),
+                    freqs=np.asarray([float(r.get("dominant_freq_hz") or 0.0) for r in series], dtype=float),
+                    anom=np.asarray([_is_anomaly(r) for r in series], dtype=bool),
+                    model_bundle=model_bundle,
+                    version=version,
+                )
+            add_derived(series, scores, threshold)
+            tail = series
+            fresh = [dict(r) for r in series[-len(new) :]]
+            events.append(("measurements", fresh))
+            anomalies = [
+                {
+                    "timestamp": r["timestamp"],
+                    "value": r["rms_db"],
+                    "frequency": r["dominant_freq_hz"],
+                    "status": r["status"],
+                    "score": r["model_score"],
+                    "threshold": threshold if r["model_score"] is not None else None,
+                    "margin": r["model_margin"],
+                }
+                for r in fresh
+                if _is_anomaly(r)
+            ]
+            if anomalies:
+                events.append(("anomalies", anomalies))
+
+        delta = {k: v for k, v in kpis.items() if (prev_kpis or {}).get(k) != v}
+        if delta:
+            events.append(("kpis", delta))
+        with self._lock:
+            if generation != self._generation:
+                # Reinicio durante la consulta: el lote se descarta y se relee desde la cola
+                return [], True
+            self._tail = deque(tail, maxlen=context)
+            self._last_id = last_id
+            self._kpis = kpis
+        return events, len(new) >= MAX_BATCH
+
+    def reset(self) -> None:
+        """Resincroniza desde la cola actual de la tabla (tras borrados/regeneración masiva)."""
+        with self._lock:
+            self._last_id = None
+            self._reset_pending = True
+            self._generation += 1
+        self.notify()
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "running": self._task is not None and not self._task.done(),
+            "last_id": self._last_id,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+    def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+_broadcaster = _Broadcaster()
+
+
+def subscribe() -> asyncio.Queue:
+    return _broadcaster.subscribe()
+
+
+def unsubscribe(queue: asyncio.Queue) -> None:
+    _broadcaster.unsubscribe(queue)
+
+
+def notify() -> None:
+    """Avisar tras insertar measurements en este proceso para no esperar al siguiente poll."""
+    _broadcaster.notify()
+
+
+def reset() -> None:
+    _broadcaster.reset()
+
+
+def stats() -> Dict:
+    return _broadcaster.stats()
+
+
+def shutdown() -> None:
+    _broadcaster.shutdown()
@@ -2,7 +2,8 @@ import random
 import json
 from datetime import datetime
 from sqlalchemy.orm import Session
-from app.models import Analysis, Measurement
+from app.models import Analysis
+from app.utils.ingest import write_measurements
 
 NORMAL_RANGES = {"amplitude": (0.2, 0.6), "frequency": (800, 2000)}
 ANOMALY_RANGES = {"amplitude": (0.8, 1.2), "frequency": (2000, 6000)}
@@ -55,13 +56,6 @@ def populate_measurements(db: Session, n: int = 10_000):
         value = max(0.01, random.gauss(mu_amp, sigma_amp))
         freq = max(20, random.gauss(mu_freq, sigma_freq))
 
-        rows.append(
-            {
-                "timestamp": datetime.utcnow(),
-                "value": round(value, 4),
-                "frequency": round(freq, 1),
-                "status": "OK" if is_normal else "Anomalo",
-            }
-        )
-    db.bulk_insert_mappings(Measurement, rows)
-    db.commit()
+        rows.append((datetime.utcnow(), round(value, 4), round(freq, 1), "OK" if is_normal else "Anomalo"))
+    # COPY en Postgres (executemany en otros motores)
+    write_measurements(db, rows)
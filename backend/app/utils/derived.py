@@ -0,0 +1,87 @@
+"""
+Métricas derivadas por fila para las series de measurements del dashboard.
+
+Se calculan por columnas con NumPy (log10 vectorizado, media geométrica móvil con
+sumas acumuladas de logaritmos, np.digitize para las bandas) y dan los mismos valores
+que el cálculo fila a fila con math: los pocos valores que quedan a un pelo de un
+empate de redondeo (donde 1 ulp de diferencia entre NumPy y math cambia el resultado)
+se recalculan con math.
+"""
+
+import math
+from typing import Callable
+
+import numpy as np
+
+FLATNESS_WINDOW = 10
+BANDS = [0, 500, 1000, 4000, 8000, 12000]
+NO_BAND_DB = -120.0
+# Distancia (en unidades del último dígito) a un empate por debajo de la cual se usa math
+_TIE_MARGIN = 1e-6
+
+
+def _geom_mean(vals: list[float]) -> float:
+    vals = [v for v in vals if v > 0]
+    if not vals:
+        return 0.0
+    return float(math.exp(sum(math.log(v) for v in vals) / len(vals)))
+
+
+def _exact_flatness(values: np.ndarray, idx: int) -> float:
+    window_vals = values[max(0, idx + 1 - FLATNESS_WINDOW) : idx + 1].tolist()
+    amean = sum(window_vals) / len(window_vals)
+    return _geom_mean(window_vals) / amean if amean > 0 else 0.0
+
+
+def _round(values: np.ndarray, ndigits: int, exact: Callable[[int], float]) -> np.ndarray:
+    """round(x, ndigits) de Python sobre un array; exact(i) recalcula el valor i con math."""
+    scaled = values * 10.0**ndigits
+    out = np.round(values, ndigits)
+    near_tie = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < _TIE_MARGIN)
+    for i in near_tie.tolist():
+        out[i] = round(exact(i), ndigits)
+    return out
+
+
+def rolling_flatness(values: np.ndarray, window: int = FLATNESS_WINDOW) -> np.ndarray:
+    """Media geométrica / media aritmética de las últimas `window` filas (menos al inicio)."""
+    n = len(values)
+    end = np.arange(1, n + 1)
+    start = np.maximum(0, end - window)
+    counts = end - start
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    log_sums = np.concatenate(([0.0], np.cumsum(np.log(values))))
+    amean = (sums[end] - sums[start]) / counts
+    gmean = np.exp((log_sums[end] - log_sums[start]) / counts)
+    return np.where(amean > 0, gmean / np.where(amean > 0, amean, 1.0), 0.0)
+
+
+def add_derived(rows: list[dict], scores: list, threshold: float | None) -> list[dict]:
+    """Métricas derivadas (snr_db, flatness en ventana de 10, bandas) y score/margen del modelo."""
+    if not rows:
+        return rows
+    vals = np.asarray([r.get("rms_db") or 0.0 for r in rows], dtype=float)
+    freqs = np.asarray([r.get("dominant_freq_hz") or 0.0 for r in rows], dtype=float)
+    clipped = np.maximum(vals, 1e-6)
+
+    snr = _round(20 * np.log10(clipped), 2, lambda i: 20 * math.log10(max(float(vals[i]), 1e-6)))
+    flat = _round(rolling_flatness(clipped), 3, lambda i: _exact_flatness(clipped, i))
+
+    # Banda simple (5 bandas): solo la banda de la frecuencia dominante tiene nivel
+    band = np.digitize(freqs, BANDS) - 1
+    in_range = np.flatnonzero((band >= 0) & (band < len(BANDS) - 1))
+    energy_db = _round(
+        20 * np.log10(vals[in_range] + 1e-3), 1, lambda i: 20 * math.log10(float(vals[in_range[i]]) + 1e-3)
+    )
+    levels = np.full((len(rows), len(BANDS) - 1), NO_BAND_DB)
+    levels[in_range, band[in_range]] = energy_db
+
+    for row, snr_db, flatness, band_levels, score in zip(rows, snr.tolist(), flat.tolist(), levels.tolist(), scores):
+        row["snr_db"] = snr_db
+        row["flatness"] = flatness
+        row["band_levels"] = band_levels
+        row["model_score"] = score
+        row["model_margin"] = score - threshold if score is not None else None
+        row["model_threshold"] = threshold
+
+    return rows
@@ -0,0 +1,91 @@
+"""
+Downsampling de series de tiempo para el dashboard.
+
+- lttb_indices: Largest-Triangle-Three-Buckets (conserva la forma visual).
+- minmax_indices: mínimo y máximo de cada bucket (conserva picos).
+En ambos casos las anomalías se conservan siempre y el primer/último punto también.
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    """Bordes de `buckets` tramos casi iguales sobre los índices 1..n-2 (extremos aparte)."""
+    return np.linspace(1, n - 1, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Índices seleccionados por LTTB (incluye primero y último)."""
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = _bucket_edges(n, points - 2)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Promedio de cada bucket (punto C del triángulo), vectorizado con reduceat;
+    # el "siguiente bucket" del último es el último punto.
+    counts = ends - starts
+    avg_x = np.append(np.add.reduceat(x[1 : n - 1], starts - 1) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[1 : n - 1], starts - 1) / counts, y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b, (s, e) in enumerate(zip(starts, ends)):
+        # Área (x2) del triángulo A-candidato-C para todos los candidatos del bucket
+        area = np.abs(
+            (x[a] - avg_x[b + 1]) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (avg_y[b + 1] - y[a])
+        )
+        a = s + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Índices del mínimo y máximo de cada bucket (points/2 buckets), más primero y último."""
+    n = len(y)
+    buckets = max(1, (points - 2) // 2)
+    if points >= n or buckets * 2 >= n - 2:
+        return np.arange(n)
+    edges = _bucket_edges(n, buckets)
+    inner = np.arange(1, n - 1)
+    bucket_id = np.searchsorted(edges, inner, side="right") - 1
+    # Orden por (bucket, y): el primero de cada bucket es el mínimo y el último el máximo
+    order = inner[np.lexsort((y[1 : n - 1], bucket_id))]
+    first = edges[:-1] - 1
+    last = edges[1:] - 2
+    return np.unique(np.concatenate(([0, n - 1], order[first], order[last])))
+
+
+def select_indices(
+    timestamps: Sequence, values: np.ndarray, anom: np.ndarray, points: int, method: str = "lttb"
+) -> np.ndarray:
+    """Índices ordenados a conservar: los del método más todas las anomalías."""
+    n = len(values)
+    if points <= 0 or n <= points:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(values, dtype=float))
+    if method == "minmax":
+        keep = minmax_indices(y, points)
+    else:
+        x = np.asarray(timestamps, dtype="datetime64[us]").astype(np.int64).astype(float)
+        keep = lttb_indices(x, y, points)
+    return np.union1d(keep, np.flatnonzero(anom))
+
+
+def downsample_rows(rows: List[Dict], points: int, method: str = "lttb", value_key: str = "rms_db") -> List[Dict]:
+    """Aplica select_indices sobre filas ya ordenadas cronológicamente."""
+    if not points or len(rows) <= points:
+        return rows
+    values = np.fromiter(
+        ((r.get(value_key) if r.get(value_key) is not None else np.nan) for r in rows), dtype=float, count=len(rows)
+    )
+    anom = np.fromiter(
+        (str(r.get("status") or "").lower().startswith("anom") for r in rows), dtype=bool, count=len(rows)
+    )
+    keep = select_indices([r["timestamp"] for r in rows], values, anom, points, method)
+    return [rows[i] for i in keep]
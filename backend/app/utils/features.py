@@ -1,12 +1,24 @@
 import math
 import os
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Tuple
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 # Window por defecto (muestras) configurable via entorno
 DEFAULT_WINDOW_SIZE = int(os.getenv("MODEL_WINDOW_SIZE", "300"))
 
+# Orden canonico de features (igual al que produce compute_window_features)
+STAT_NAMES = ["mean", "std", "median", "iqr", "min", "max", "slope"]
+FEATURE_NAMES = (
+    [f"value_{k}" for k in STAT_NAMES]
+    + [f"frequency_{k}" for k in STAT_NAMES]
+    + ["corr_value_frequency", "anom_rate"]
+)
+
+# Elementos maximos por bloque al calcular mediana/percentiles sobre vistas deslizantes
+_ORDER_STAT_CHUNK = int(os.getenv("FEATURES_ORDER_STAT_CHUNK", "1000000"))
+
 
 def _slope(values: np.ndarray) -> float:
     """Pendiente lineal simple; devuelve 0.0 si no hay varianza o puntos suficientes."""
@@ -25,8 +37,8 @@ def compute_window_features(records: List[Dict]) -> Dict[str, float]:
     if not records:
         return {}
 
-    values = np.asarray([float(r.get("value", 0.0)) for r in records], dtype=float)
-    freqs = np.asarray([float(r.get("frequency", 0.0)) for r in records], dtype=float)
+    values = np.asarray([float(r.get("value") or 0.0) for r in records], dtype=float)
+    freqs = np.asarray([float(r.get("frequency") or 0.0) for r in records], dtype=float)
     statuses = [str(r.get("status", "") or "").lower() for r in records]
 
     def stats(arr: np.ndarray, name: str) -> Dict[str, float]:
@@ -61,6 +73,172 @@ def compute_window_features(records: List[Dict]) -> Dict[str, float]:
     return feats
 
 
+def records_to_columns(records: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convierte los registros (dicts) a arrays columnares una sola vez:
+    (values, frequencies, mascara booleana de status anomalo).
+    """
+    values = np.asarray([float(r.get("value") or 0.0) for r in records], dtype=float)
+    freqs = np.asarray([float(r.get("frequency") or 0.0) for r in records], dtype=float)
+    anom = np.asarray(
+        [str(r.get("status", "") or "").lower().startswith("anom") for r in records], dtype=bool
+    )
+    return values, freqs, anom
+
+
+def _rolling_sum(arr: np.ndarray, window_size: int) -> np.ndarray:
+    """Suma de cada ventana deslizante via suma acumulada."""
+    csum = np.concatenate(([0.0], np.cumsum(arr, dtype=float)))
+    return csum[window_size:] - csum[:-window_size]
+
+
+def _rolling_stats(arr: np.ndarray, window_size: int) -> Dict[str, np.ndarray]:
+    """
+    Estadisticas por ventana deslizante en una sola pasada vectorizada.
+    Devuelve arrays de largo n - window_size + 1 con las mismas claves que stats()
+    de compute_window_features, mas auxiliares (_centered, _flat) para la correlacion.
+    """
+    n_win = arr.size - window_size + 1
+    w = float(window_size)
+
+    # Centrar mejora la precision de las sumas acumuladas (mean/std/slope son invariantes)
+    shift = float(arr.mean())
+    centered = arr - shift
+    s1 = _rolling_sum(centered, window_size)
+    s2 = _rolling_sum(centered * centered, window_size)
+    mean_c = s1 / w
+    var = np.maximum(s2 / w - mean_c * mean_c, 0.0)
+
+    view = sliding_window_view(arr, window_size)
+    vmin = view.min(axis=1)
+    vmax = view.max(axis=1)
+
+    # Equivalente vectorizado de np.allclose(window, window[0])
+    first = arr[:n_win]
+    spread = np.maximum(vmax - first, first - vmin)
+    flat = spread <= 1e-8 + 1e-5 * np.abs(first)
+
+    std = np.sqrt(var)
+    std[vmax == vmin] = 0.0
+
+    # Pendiente por regresion cerrada: sum((x - xbar) * y) / sum((x - xbar)^2), x = 0..w-1
+    if window_size >= 2:
+        idx = np.arange(arr.size, dtype=float)
+        s_jy = _rolling_sum(idx * centered, window_size)
+        starts = np.arange(n_win, dtype=float)
+        xbar = (w - 1.0) / 2.0
+        sxx = w * (w * w - 1.0) / 12.0
+        slope = (s_jy - (starts + xbar) * s1) / sxx
+        slope[flat] = 0.0
+    else:
+        slope = np.zeros(n_win, dtype=float)
+
+    # Mediana/IQR: estadisticos de orden por bloques sobre la vista (sin copiar toda la matriz)
+    median = np.empty(n_win, dtype=float)
+    iqr = np.empty(n_win, dtype=float)
+    step = max(1, _ORDER_STAT_CHUNK // window_size)
+    for start in range(0, n_win, step):
+        block = view[start : start + step]
+        median[start : start + step] = np.median(block, axis=1)
+        q75, q25 = np.percentile(block, [75, 25], axis=1)
+        iqr[start : start + step] = q75 - q25
+
+    return {
+        "mean": mean_c + shift,
+        "std": std,
+        "median": median,
+        "iqr": iqr,
+        "min": vmin,
+        "max": vmax,
+        "slope": slope,
+        "_centered": centered,
+        "_mean_c": mean_c,
+        "_flat": flat,
+    }
+
+
+def rolling_feature_matrix(
+    values: np.ndarray,
+    freqs: np.ndarray,
+    anom: np.ndarray,
+    window_size: int = DEFAULT_WINDOW_SIZE,
+) -> np.ndarray:
+    """
+    Calcula las features de todas las ventanas deslizantes a partir de arrays columnares.
+    Devuelve una matriz (n_ventanas, len(FEATURE_NAMES)) con columnas en el orden de FEATURE_NAMES,
+    numericamente equivalente a aplicar compute_window_features ventana por ventana.
+    """
+    n = values.size
+    if window_size <= 0 or n < window_size:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=float)
+
+    v = _rolling_stats(values, window_size)
+    f = _rolling_stats(freqs, window_size)
+
+    # Correlacion value/frequency con sumas acumuladas de productos cruzados
+    w = float(window_size)
+    s_vf = _rolling_sum(v["_centered"] * f["_centered"], window_size)
+    cov = s_vf / w - v["_mean_c"] * f["_mean_c"]
+    denom = v["std"] * f["std"]
+    valid = ~(v["_flat"] | f["_flat"]) & (denom > 0) & (window_size > 1)
+    corr = np.zeros_like(cov)
+    corr[valid] = np.clip(cov[valid] / denom[valid], -1.0, 1.0)
+
+    # Tasa de anomalias via conteos prefijos
+    anom_rate = _rolling_sum(anom.astype(float), window_size) / w
+
+    columns = [v[k] for k in STAT_NAMES] + [f[k] for k in STAT_NAMES] + [corr, anom_rate]
+    return np.column_stack(columns)
+
+
+def window_feature_matrix(values: np.ndarray, freqs: np.ndarray, anom: np.ndarray) -> np.ndarray:
+    """
+    Features para un lote de ventanas independientes (arrays 2D: n_ventanas x window_size),
+    p.ej. vistas de sliding_window_view seleccionadas por posicion.
+    Columnas en el orden de FEATURE_NAMES, equivalentes a compute_window_features por fila.
+    """
+    n_win, window_size = values.shape
+    if n_win == 0 or window_size == 0:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=float)
+
+    x = np.arange(window_size, dtype=float)
+    xc = x - x.mean()
+    sxx = float(np.dot(xc, xc))
+
+    def stats(arr: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray]:
+        first = arr[:, :1]
+        flat = np.all(np.abs(arr - first) <= 1e-8 + 1e-5 * np.abs(first), axis=1)
+        centered = arr - arr.mean(axis=1, keepdims=True)
+        if window_size >= 2:
+            slope = centered @ xc / sxx
+            slope[flat] = 0.0
+        else:
+            slope = np.zeros(n_win, dtype=float)
+        q75, q25 = np.percentile(arr, [75, 25], axis=1)
+        cols = [
+            arr.mean(axis=1),
+            arr.std(axis=1),
+            np.median(arr, axis=1),
+            q75 - q25,
+            arr.min(axis=1),
+            arr.max(axis=1),
+            slope,
+        ]
+        return cols, centered, flat
+
+    v_cols, v_c, v_flat = stats(values)
+    f_cols, f_c, f_flat = stats(freqs)
+
+    cov = np.einsum("ij,ij->i", v_c, f_c) / window_size
+    denom = v_cols[1] * f_cols[1]
+    valid = ~(v_flat | f_flat) & (denom > 0) & (window_size > 1)
+    corr = np.zeros(n_win, dtype=float)
+    corr[valid] = np.clip(cov[valid] / denom[valid], -1.0, 1.0)
+
+    anom_rate = anom.astype(float).mean(axis=1)
+    return np.column_stack(v_cols + f_cols + [corr, anom_rate])
+
+
 def build_feature_matrix(records: List[Dict], window_size: int = DEFAULT_WINDOW_SIZE, include_anom_rate: bool = True) -> List[Dict[str, float]]:
     """
     Genera features para todas las ventanas deslizantes de tamaño window_size.
@@ -68,14 +246,10 @@ def build_feature_matrix(records: List[Dict], window_size: int = DEFAULT_WINDOW_
     if len(records) < window_size:
         return []
 
-    out: List[Dict[str, float]] = []
-    for i in range(0, len(records) - window_size + 1):
-        window = records[i : i + window_size]
-        feats = compute_window_features(window)
-        if not include_anom_rate and "anom_rate" in feats:
-            feats = {k: v for k, v in feats.items() if k != "anom_rate"}
-        out.append(feats)
-    return out
+    matrix = rolling_feature_matrix(*records_to_columns(records), window_size=window_size)
+    names = FEATURE_NAMES if include_anom_rate else [n for n in FEATURE_NAMES if n != "anom_rate"]
+    cols = [FEATURE_NAMES.index(n) for n in names]
+    return [dict(zip(names, row)) for row in matrix[:, cols].tolist()]
 
 
 def ensure_feature_vector(features: Dict[str, float], feature_names: Iterable[str]) -> np.ndarray:
@@ -0,0 +1,184 @@
+"""
+Ingesta masiva de mediciones: parseo de lotes NDJSON / CSV / Arrow y escritura
+con COPY en Postgres (executemany como alternativa para otros motores, p.ej. SQLite).
+"""
+
+import csv
+import io
+import json
+import math
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.models import Measurement
+from app.utils import online_scoring, retention
+
+COLUMNS = ("timestamp", "value", "frequency", "status")
+MAX_REPORTED_ERRORS = 20
+
+Row = Tuple[datetime, float, Optional[float], Optional[str]]
+
+
+class NonFiniteValue(ValueError):
+    """value/frequency NaN o infinito: invalida el lote entero (el router responde 422)."""
+
+
+def _parse_timestamp(raw, now: datetime) -> datetime:
+    if raw in (None, ""):
+        return now
+    if isinstance(raw, datetime):
+        ts = raw
+    elif isinstance(raw, (int, float)):
+        ts = datetime.fromtimestamp(float(raw), tz=timezone.utc)
+    else:
+        ts = datetime.fromisoformat(str(raw).replace("Z", "+00:00"))
+    # La columna es timestamp sin zona: se guarda en UTC
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _coerce(rec: Dict, now: datetime) -> Row:
+    """Valida y normaliza un registro; lanza ValueError si no es utilizable."""
+    if not isinstance(rec, dict):
+        raise ValueError("no es un objeto JSON")
+    value = rec.get("value")
+    if value in (None, ""):
+        raise ValueError("falta value")
+    value = float(value)
+    if not math.isfinite(value):
+        raise NonFiniteValue("value no es finito")
+    frequency = rec.get("frequency")
+    if frequency not in (None, ""):
+        frequency = float(frequency)
+        if not math.isfinite(frequency):
+            raise NonFiniteValue("frequency no es finito")
+    else:
+        frequency = None
+    status = rec.get("status")
+    return (
+        _parse_timestamp(rec.get("timestamp"), now),
+        value,
+        frequency,
+        str(status) if status not in (None, "") else None,
+    )
+
+
+def _collect(records: Iterable[Tuple[int, Dict]]) -> Tuple[List[Row], List[str], int]:
+    now = datetime.utcnow()
+    rows: List[Row] = []
+    errors: List[str] = []
+    rejected = 0
+    for line_no, rec in records:
+        try:
+            rows.append(_coerce(rec, now))
+        except NonFiniteValue as e:
+            raise NonFiniteValue(f"registro {line_no}: {e}") from None
+        except (ValueError, TypeError, AttributeError) as e:
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"registro {line_no}: {e}")
+    return rows, errors, rejected
+
+
+def parse_ndjson(body: bytes) -> Tuple[List[Row], List[str], int]:
+    def records():
+        for line_no, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                rec = None
+            yield line_no, rec
+
+    return _collect(records())
+
+
+def parse_csv(body: bytes) -> Tuple[List[Row], List[str], int]:
+    reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+    # La fila 1 es el encabezado
+    return _collect(enumerate(reader, start=2))
+
+
+def parse_arrow(body: bytes) -> Tuple[List[Row], List[str], int]:
+    """Arrow IPC (stream o file). pyarrow es opcional: solo se importa aquí."""
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError("pyarrow no está instalado; usa NDJSON o CSV") from e
+
+    try:
+        table = pa.ipc.open_stream(pa.BufferReader(body)).read_all()
+    except pa.ArrowInvalid:
+        table = pa.ipc.open_file(pa.BufferReader(body)).read_all()
+    columns = {name: table.column(name).to_pylist() for name in COLUMNS if name in table.column_names}
+    n = table.num_rows
+    return _collect(
+        (i + 1, {name: col[i] for name, col in columns.items()}) for i in range(n)
+    )
+
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv, "arrow": parse_arrow}
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    ct = (content_type or "").split(";")[0].strip().lower()
+    if ct in ("application/x-ndjson", "application/ndjson", "application/jsonlines", "application/json"):
+        return "ndjson"
+    if ct in ("text/csv", "application/csv"):
+        return "csv"
+    if ct in ("application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file"):
+        return "arrow"
+    return None
+
+
+def write_measurements(db: Session, rows: List[Row], score: bool = True) -> str:
+    """
+    Inserta filas (timestamp, value, frequency, status) en una transacción, en orden de
+    timestamp (así los ids siguen el orden temporal dentro del lote).
+    Postgres+psycopg: COPY FROM STDIN. Otros: executemany. Devuelve el método usado.
+    Con score=True y un modelo cargado, cada fila se guarda ya puntuada (online_scoring),
+    salvo en lotes con filas más viejas que la última guardada (backfill); un backfill
+    además se suma a los rollups ya consolidados.
+    """
+    if not rows:
+        return "none"
+    rows = sorted(rows, key=lambda r: r[0])
+    with online_scoring.lock:
+        try:
+            online_scoring.lock_batch(db)
+            columns = COLUMNS
+            if online_scoring.is_backfill(db, rows):
+                online_scoring.invalidate_backfill(db, rows)
+                # Buckets de rollup viejos que el refresh incremental ya no recalcula
+                retention.add_backfill_to_rollups(db, rows)
+            elif score:
+                scored = online_scoring.attach_scores(db, rows)
+                if scored is not None:
+                    rows, columns = scored, COLUMNS + online_scoring.SCORE_COLUMNS
+            method = _insert(db, rows, columns)
+            online_scoring.mark_written(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            online_scoring.discard_tail()
+            raise
+    return method
+
+
+def _insert(db: Session, rows: List[tuple], columns: tuple) -> str:
+    conn = db.connection()
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg":
+        raw = conn.connection.driver_connection
+        with raw.cursor() as cur:
+            with cur.copy(f"COPY measurements ({', '.join(columns)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return "copy"
+
+    db.execute(insert(Measurement), [dict(zip(columns, row)) for row in rows])
+    return "executemany"
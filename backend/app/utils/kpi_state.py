@@ -0,0 +1,254 @@
+"""
+Estado de KPIs mantenido incrementalmente en memoria para GET /analyses/kpis.
+
+- Arranque en frío / recuperación: una consulta agregada (totales, última fila y
+  última anomalía) y otra con los conteos por minuto de la ventana; el inicio de la
+  ventana se calcula en Python, así que funciona en Postgres y SQLite.
+- Polls siguientes: solo se leen las filas con id mayor al último visto (índice PK)
+  y se acumulan en totales y en un buffer de buckets por minuto.
+- Cada KPI_RESYNC_SECONDS se recarga desde la BD para absorber borrados externos
+  (p.ej. el reset del simulador).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.utils import retention, schema
+
+WINDOW_MINUTES = 60
+RESYNC_SECONDS = float(os.getenv("KPI_RESYNC_SECONDS", "60"))
+# Si llegan más filas nuevas que esto entre polls, se recarga con la consulta agregada
+CATCHUP_MAX_ROWS = int(os.getenv("KPI_CATCHUP_MAX_ROWS", "50000"))
+
+_lock = threading.Lock()
+
+# {anomaly}: predicado de schema.anomaly_sql() (columna is_anomaly o expresión)
+LOAD_SQL = """
+    WITH agg AS (
+        SELECT COUNT(*) AS total,
+               MAX(id) AS max_id,
+               MAX(CASE WHEN {anomaly} THEN timestamp END) AS last_anomaly_ts
+        FROM measurements
+    ),
+    last AS (
+        SELECT id, timestamp, value, frequency, status
+        FROM measurements
+        ORDER BY timestamp DESC, id DESC
+        LIMIT 1
+    )
+    SELECT agg.total, agg.max_id, agg.last_anomaly_ts,
+           last.timestamp AS last_timestamp, last.value AS last_value,
+           last.frequency AS last_frequency, last.status AS last_status
+    FROM agg
+    LEFT JOIN last ON 1 = 1
+"""
+# Conteos por minuto desde :start (calculado en Python a partir de la última fila);
+# {minute} es el truncado del dialecto. id <= :max_id deja fuera lo insertado entre
+# ambas consultas (lo incorpora el próximo catch_up)
+BUCKETS_SQL = """
+    SELECT {minute} AS minute,
+           COUNT(*) AS n,
+           SUM(CASE WHEN {anomaly} THEN 1 ELSE 0 END) AS n_anom
+    FROM measurements
+    WHERE timestamp >= :start AND id <= :max_id
+    GROUP BY 1
+    ORDER BY 1
+"""
+CATCHUP_SQL = text(
+    """
+    SELECT id, timestamp, value, frequency, status
+    FROM measurements
+    WHERE id > :last_id
+    ORDER BY id
+    LIMIT :cap
+    """
+).columns(timestamp=DateTime)
+
+
+def _load_sql():
+    return text(LOAD_SQL.format(anomaly=schema.anomaly_sql())).columns(
+        last_anomaly_ts=DateTime, last_timestamp=DateTime
+    )
+
+
+def _buckets_sql(dialect: str):
+    minute = retention._trunc(dialect, "minute", "timestamp")
+    return (
+        text(BUCKETS_SQL.format(anomaly=schema.anomaly_sql(), minute=minute))
+        .bindparams(bindparam("start", type_=DateTime))
+        .columns(minute=DateTime)
+    )
+
+
+def _buckets_params(head) -> Optional[Dict]:
+    """Parámetros de BUCKETS_SQL para la fila de LOAD_SQL (None si la tabla está vacía)."""
+    if not head or head["last_timestamp"] is None:
+        return None
+    start = _minute(head["last_timestamp"]) - timedelta(minutes=WINDOW_MINUTES - 1)
+    return {"start": start, "max_id": head["max_id"]}
+
+
+def _minute(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def _is_anomaly(status) -> bool:
+    return str(status or "").lower().startswith("anom")
+
+
+class _KpiState:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.total = 0
+        self.max_id = 0
+        self.last_row: Optional[Dict] = None
+        self.last_anomaly_ts: Optional[datetime] = None
+        # minuto -> [muestras, anomalías]; solo minutos dentro de la ventana
+        self.buckets: "OrderedDict[datetime, list]" = OrderedDict()
+
+    def _window_start(self) -> Optional[datetime]:
+        if not self.last_row:
+            return None
+        return _minute(self.last_row["timestamp"]) - timedelta(minutes=WINDOW_MINUTES - 1)
+
+    def _prune(self) -> None:
+        start = self._window_start()
+        if start is None:
+            return
+        for minute in [m for m in self.buckets if m < start]:
+            del self.buckets[minute]
+
+    def load(self, db: Session) -> None:
+        """Recarga completa: una consulta agregada y los conteos por minuto de la ventana."""
+        head = db.execute(_load_sql()).mappings().first()
+        params = _buckets_params(head)
+        buckets = db.execute(_buckets_sql(db.get_bind().dialect.name), params).mappings().all() if params else []
+        self.apply_load(head, buckets)
+
+    def apply_load(self, head, buckets) -> None:
+        self.reset()
+        head = head or {}
+        self.total = int(head.get("total") or 0)
+        self.max_id = int(head.get("max_id") or 0)
+        self.last_anomaly_ts = head.get("last_anomaly_ts")
+        if head.get("last_timestamp") is not None:
+            self.last_row = {
+                "timestamp": head["last_timestamp"],
+                "value": head["last_value"],
+                "frequency": head["last_frequency"],
+                "status": head["last_status"],
+            }
+        for r in buckets:
+            self.buckets[r["minute"]] = [int(r["n"]), int(r["n_anom"] or 0)]
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def observe(self, rows: Iterable[Dict]) -> None:
+        """Acumula filas nuevas (id, timestamp, value, frequency, status) en orden de id."""
+        for r in rows:
+            row_id = int(r["id"])
+            if row_id <= self.max_id:
+                continue
+            self.max_id = row_id
+            self.total += 1
+            ts = r["timestamp"]
+            anomalous = _is_anomaly(r.get("status"))
+            if self.last_row is None or ts >= self.last_row["timestamp"]:
+                self.last_row = {k: r.get(k) for k in ("timestamp", "value", "frequency", "status")}
+            if anomalous and (self.last_anomaly_ts is None or ts > self.last_anomaly_ts):
+                self.last_anomaly_ts = ts
+            start = self._window_start()
+            minute = _minute(ts)
+            if start is None or minute >= start:
+                bucket = self.buckets.setdefault(minute, [0, 0])
+                bucket[0] += 1
+                bucket[1] += int(anomalous)
+        self._prune()
+
+    def catch_up(self, db: Session) -> None:
+        """Lee solo las filas insertadas desde el último poll (id > max_id)."""
+        rows = db.execute(CATCHUP_SQL, {"last_id": self.max_id, "cap": CATCHUP_MAX_ROWS + 1}).mappings().all()
+        if len(rows) > CATCHUP_MAX_ROWS:
+            self.load(db)
+        elif rows:
+            self.observe(rows)
+
+    def as_dict(self) -> Dict:
+        count_window = sum(b[0] for b in self.buckets.values())
+        anomalies_window = sum(b[1] for b in self.buckets.values())
+        last = self.last_row or {}
+        return {
+            "last_timestamp": last.get("timestamp"),
+            "last_value": last.get("value"),
+            "last_frequency": last.get("frequency"),
+            "last_status": last.get("status"),
+            "anomalies_percent_window": (anomalies_window / count_window * 100) if count_window else 0.0,
+            "total_measurements": self.total,
+            "ingest_rate_per_min": count_window / WINDOW_MINUTES,
+            "window_minutes": WINDOW_MINUTES,
+            "last_anomaly_ts": self.last_anomaly_ts,
+        }
+
+
+_state = _KpiState()
+
+
+def snapshot(db: Session) -> Dict:
+    """KPIs actuales; recarga en frío/periódicamente y si no, solo incorpora filas nuevas."""
+    with _lock:
+        if not _state.loaded or time.monotonic() - _state.loaded_at > RESYNC_SECONDS:
+            _state.load(db)
+        else:
+            _state.catch_up(db)
+        return _state.as_dict()
+
+
+async def snapshot_async(db: AsyncSession) -> Dict:
+    """
+    Igual que snapshot sobre una sesión async: la consulta corre sin tomar el lock
+    (observe ignora ids ya vistos, así que polls concurrentes no duplican filas).
+    """
+    with _lock:
+        cold = not _state.loaded or time.monotonic() - _state.loaded_at > RESYNC_SECONDS
+        last_id = _state.max_id
+    rows = []
+    if not cold:
+        rows = (await db.execute(CATCHUP_SQL, {"last_id": last_id, "cap": CATCHUP_MAX_ROWS + 1})).mappings().all()
+        cold = len(rows) > CATCHUP_MAX_ROWS
+    if cold:
+        head = (await db.execute(_load_sql())).mappings().first()
+        params = _buckets_params(head)
+        buckets = []
+        if params:
+            buckets = (await db.execute(_buckets_sql(db.get_bind().dialect.name), params)).mappings().all()
+    with _lock:
+        if cold:
+            _state.apply_load(head, buckets)
+        elif rows:
+            _state.observe(rows)
+        return _state.as_dict()
+
+
+def observe(rows: Iterable[Dict]) -> None:
+    """Registra filas recién insertadas por este proceso (si el estado ya está cargado)."""
+    with _lock:
+        if _state.loaded:
+            _state.observe(rows)
+
+
+def reset() -> None:
+    """Fuerza recarga en el próximo snapshot (tras borrados masivos)."""
+    with _lock:
+        _state.reset()
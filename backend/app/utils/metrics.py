@@ -0,0 +1,208 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (GET /metrics), sin dependencias.
+
+- audiosense_request_duration_seconds{method, route, status}: latencia por ruta (plantilla
+  de la ruta, hasta enviar las cabeceras: en respuestas en streaming no incluye el cuerpo)
+- audiosense_stage_duration_seconds{stage}: db_fetch, featurize, scale, score, serialize,
+  audio_decode, fft
+- audiosense_rows_scored_total, audiosense_audio_seconds_processed_total
+- audiosense_model_cache_total{result}: búsquedas del modelo en memoria (hit/miss = carga
+  desde el registro) y audiosense_score_cache_total{result}: puntajes reutilizados por fila
+
+Los workers de audio (procesos aparte) capturan sus observaciones con capture() y las
+devuelven con el resultado; el proceso del API las suma con replay().
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+PREFIX = "audiosense_"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "request_duration_seconds": ("histogram", "Latencia de los requests HTTP por ruta."),
+    "stage_duration_seconds": ("histogram", "Duración de cada etapa del camino caliente."),
+    "rows_scored_total": ("counter", "Filas puntuadas con IsolationForest."),
+    "audio_seconds_processed_total": ("counter", "Segundos de audio analizados."),
+    "model_cache_total": ("counter", "Búsquedas del modelo en memoria (miss = carga desde el registro)."),
+    "score_cache_total": ("counter", "Puntajes por fila reutilizados (hit) o calculados (miss)."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+# (nombre, labels) -> [conteos por bucket..., +Inf], suma
+_histograms: Dict[Tuple[str, Labels], Tuple[List[int], List[float]]] = {}
+_counters: Dict[Tuple[str, Labels], float] = {}
+# Observaciones desviadas a una lista (workers de audio)
+_local = threading.local()
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    if not ENABLED:
+        return
+    captured = getattr(_local, "captured", None)
+    if captured is not None:
+        captured.append(("h", name, seconds, labels))
+        return
+    key = _key(name, labels)
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = ([0] * (len(BUCKETS) + 1), [0.0])
+        entry[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        entry[1][0] += seconds
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    if not ENABLED or not value:
+        return
+    captured = getattr(_local, "captured", None)
+    if captured is not None:
+        captured.append(("c", name, value, labels))
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mide el bloque como una observación de la etapa `name`."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - t0, stage=name)
+
+
+class StageTimer:
+    """Acumula varios tramos de una etapa (p.ej. por bloque) y los registra como una sola observación."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.total = 0.0
+        self._t0 = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.total += time.perf_counter() - self._t0
+
+    def record(self) -> None:
+        observe("stage_duration_seconds", self.total, stage=self.name)
+
+
+@contextmanager
+def capture() -> Iterator[list]:
+    """Desvía las observaciones de este hilo a una lista (para devolverlas desde un worker)."""
+    previous = getattr(_local, "captured", None)
+    _local.captured = []
+    try:
+        yield _local.captured
+    finally:
+        _local.captured = previous
+
+
+def replay(observations: Optional[list]) -> None:
+    """Registra en este proceso observaciones capturadas en otro."""
+    for kind, name, value, labels in observations or ():
+        (observe if kind == "h" else inc)(name, value, **labels)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels: Labels, extra: Labels = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    with _lock:
+        histograms = {k: (list(v[0]), v[1][0]) for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines: List[str] = []
+    for name, (kind, help_text) in HELP.items():
+        full = PREFIX + name
+        lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+        if kind == "histogram":
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full}_bucket{_labels_text(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{full}_sum{_labels_text(labels)} {repr(total)}")
+                lines.append(f"{full}_count{_labels_text(labels)} {cumulative}")
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{full}{_labels_text(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latencia por (método, plantilla de ruta, status)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                _record(scope, status["code"], t0)
+                status["recorded"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not status.get("recorded"):
+                _record(scope, status["code"], t0)
+
+
+def _record(scope, status_code: int, t0: float) -> None:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    observe(
+        "request_duration_seconds",
+        time.perf_counter() - t0,
+        method=scope.get("method", ""),
+        route=path,
+        status=str(status_code),
+    )
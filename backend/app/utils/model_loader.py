@@ -1,35 +1,209 @@
+import os
 import threading
-from pathlib import Path
-from typing import Dict, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 
-import joblib
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.db import SessionLocal
-from app.utils.features import DEFAULT_WINDOW_SIZE, compute_window_features, ensure_feature_vector
+from app.db import ReadSessionLocal
+from app.utils import metrics, model_registry, score_cache
+from app.utils.features import (
+    DEFAULT_WINDOW_SIZE,
+    FEATURE_NAMES,
+    compute_window_features,
+    ensure_feature_vector,
+    rolling_feature_matrix,
+    window_feature_matrix,
+)
+
+MODEL_PATH = model_registry.LEGACY_PATH
+# Cada cuánto se consulta el registro por reentrenos/activaciones hechos en otro proceso
+REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "5"))
 
-MODEL_PATH = Path(__file__).resolve().parent.parent / "models_store" / "model_if.pkl"
 _lock = threading.Lock()
-_cached_model: Optional[Dict] = None
+# Serializa las cargas desde disco; las lecturas de _entry solo toman _lock
+_load_lock = threading.Lock()
+# (bundle o None, model_id activo, monotonic de la última verificación, versión del registro)
+_entry: Optional[Tuple[Optional[Dict], Optional[str], float, Optional[int]]] = None
+# Se incrementa en cada carga/descarga; invalida puntajes cacheados de modelos previos
+_model_version = 0
 
 
-def load_model(path: Path = MODEL_PATH) -> Optional[Dict]:
-    global _cached_model
-    if not path.exists():
-        _cached_model = None
-        return None
+def load_model() -> Optional[Dict]:
+    """Carga la versión activa y la publica de una vez (hot swap)."""
+    global _entry, _model_version
+    with _load_lock:
+        loaded = model_registry.load_active()
+        bundle, meta = loaded if loaded else (None, {})
+        with _lock:
+            if bundle is not None or (_entry is not None and _entry[0] is not None):
+                _model_version += 1
+            _entry = (bundle, meta.get("model_id"), time.monotonic(), meta.get("version"))
+    return bundle
+
+
+def _refresh(entry: Tuple[Optional[Dict], Optional[str], float, Optional[int]]) -> Optional[Dict]:
+    global _entry
+    try:
+        active = model_registry.active_id()
+    except SQLAlchemyError:
+        # Sin BD se sigue sirviendo el modelo en memoria
+        return entry[0]
+    if active != entry[1]:
+        metrics.inc("model_cache_total", result="miss")
+        return load_model()
+    metrics.inc("model_cache_total", result="hit")
     with _lock:
-        _cached_model = joblib.load(path)
-    return _cached_model
+        if _entry is entry:
+            _entry = (entry[0], entry[1], time.monotonic(), entry[3])
+    return entry[0]
 
 
 def get_model() -> Optional[Dict]:
-    global _cached_model
-    if _cached_model is None:
+    """Modelo activo; detecta cada REFRESH_SECONDS los cambios hechos por otros workers."""
+    with _lock:
+        entry = _entry
+    if entry is None:
+        metrics.inc("model_cache_total", result="miss")
         return load_model()
-    return _cached_model
+    if time.monotonic() - entry[2] >= REFRESH_SECONDS:
+        return _refresh(entry)
+    metrics.inc("model_cache_total", result="hit")
+    return entry[0]
+
+
+def loaded_model() -> Dict:
+    with _lock:
+        entry = _entry
+    return {
+        "model_id": entry[1] if entry else None,
+        "version": entry[3] if entry else None,
+        "loaded": bool(entry and entry[0] is not None),
+    }
+
+
+def get_model_version() -> int:
+    return _model_version
+
+
+def served_tag() -> str:
+    """
+    Modelo servido como versión del registro + model_tag: igual en todos los workers
+    que cargaron el mismo modelo y entre reinicios (para ETags).
+    """
+    bundle = get_model()
+    with _lock:
+        entry = _entry
+    if bundle is None or entry is None:
+        return "none"
+    return f"v{entry[3]}-{model_tag(bundle)}"
+
+
+def model_tag(bundle: Optional[Dict]) -> Optional[str]:
+    """Identificador estable del modelo (los bundles viejos no traen model_id)."""
+    if not bundle:
+        return None
+    if bundle.get("model_id"):
+        return str(bundle["model_id"])
+    return f"legacy-{bundle.get('window_size')}-{float(bundle.get('threshold', 0.0)):.10g}"
+
+
+def score_feature_matrix(model_bundle: Dict, matrix: np.ndarray) -> np.ndarray:
+    """
+    Puntua en lote una matriz de features (columnas en orden FEATURE_NAMES):
+    reordena a feature_names del modelo, escala y llama score_samples una sola vez.
+    """
+    if matrix.shape[0] == 0:
+        return np.empty(0, dtype=float)
+    feature_names = model_bundle.get("feature_names", [])
+    X_raw = np.zeros((matrix.shape[0], len(feature_names)), dtype=float)
+    for j, name in enumerate(feature_names):
+        if name in FEATURE_NAMES:
+            X_raw[:, j] = matrix[:, FEATURE_NAMES.index(name)]
+    with metrics.stage("scale"):
+        X = model_bundle["scaler"].transform(X_raw)
+    with metrics.stage("score"):
+        scores = np.asarray(model_bundle["model"].score_samples(X), dtype=float)
+    metrics.inc("rows_scored_total", len(scores))
+    return scores
+
+
+def score_windows_at(
+    values: np.ndarray,
+    freqs: np.ndarray,
+    anom: np.ndarray,
+    positions: list,
+    model_bundle: Dict,
+) -> np.ndarray:
+    """
+    Puntua las ventanas que terminan en cada posicion de una serie cronologica contigua.
+    Las ventanas son vistas (sin copia) de un unico array; se puntuan en un solo lote.
+    """
+    window_size = int(model_bundle.get("window_size", 0))
+    if not positions or window_size <= 0:
+        return np.empty(0, dtype=float)
+    starts = np.asarray(positions) - window_size + 1
+    with metrics.stage("featurize"):
+        matrix = window_feature_matrix(
+            sliding_window_view(values, window_size)[starts],
+            sliding_window_view(freqs, window_size)[starts],
+            sliding_window_view(anom, window_size)[starts],
+        )
+    return score_feature_matrix(model_bundle, matrix)
+
+
+def score_series(
+    ids: list,
+    timestamps: list,
+    values: np.ndarray,
+    freqs: np.ndarray,
+    anom: np.ndarray,
+    model_bundle: Dict,
+    version,
+) -> list:
+    """
+    Puntaje por fila de una serie cronologica contigua (ventana = window_size filas previas).
+    Reutiliza puntajes cacheados por (version, id) y puntua el resto en un solo lote;
+    version es la de online_scoring.seed_cache (modelo + data_epoch de las filas).
+    Devuelve una lista alineada con ids; None donde la ventana no esta completa.
+    """
+    n = len(ids)
+    window_size = int(model_bundle.get("window_size", 0))
+    scores: list = [None] * n
+    if window_size <= 0 or n < window_size:
+        return scores
+
+    positions = range(window_size - 1, n)
+    cached = score_cache.get_many(version, [(ids[i], timestamps[i]) for i in positions])
+    missing = []
+    for i in positions:
+        hit = cached.get(ids[i])
+        if hit is None:
+            missing.append(i)
+        else:
+            scores[i] = hit
+    metrics.inc("score_cache_total", len(cached), result="hit")
+    metrics.inc("score_cache_total", len(missing), result="miss")
+
+    if missing:
+        # Solo se recalculan ventanas desde la primera fila sin puntaje (normalmente la cola nueva)
+        start = missing[0] - window_size + 1
+        with metrics.stage("featurize"):
+            matrix = rolling_feature_matrix(values[start:], freqs[start:], anom[start:], window_size)
+        rows_idx = np.asarray(missing) - missing[0]
+        new_scores = score_feature_matrix(model_bundle, matrix[rows_idx])
+        fresh = {}
+        for i, sc in zip(missing, new_scores.tolist()):
+            scores[i] = sc
+            fresh[ids[i]] = (timestamps[i], sc)
+        score_cache.put_many(version, fresh)
+    return scores
 
 
 def _fetch_recent_measurements(session: Session, window_size: int) -> Optional[list]:
@@ -50,6 +224,18 @@ def _fetch_recent_measurements(session: Session, window_size: int) -> Optional[l
     return list(reversed([dict(r) for r in rows]))
 
 
+def _recent_window_inputs(session: Session, model_bundle: Dict, window_size: int) -> Tuple[Optional[float], Optional[List[Dict]]]:
+    """(score ya guardado o None, ventana reciente a puntuar)."""
+    with metrics.stage("db_fetch"):
+        # Si la última fila ya fue puntuada al ingerirse por este modelo, es una lectura directa
+        latest = session.execute(
+            text("SELECT score, score_model FROM measurements ORDER BY timestamp DESC, id DESC LIMIT 1")
+        ).first()
+        if latest is not None and latest.score is not None and latest.score_model == model_tag(model_bundle):
+            return float(latest.score), None
+        return None, _fetch_recent_measurements(session, window_size)
+
+
 def score_recent_window(session: Optional[Session] = None) -> Dict:
     model_bundle = get_model()
     if not model_bundle:
@@ -59,22 +245,46 @@ def score_recent_window(session: Optional[Session] = None) -> Dict:
     own_session = False
     if session is None:
         own_session = True
-        session = SessionLocal()
+        session = ReadSessionLocal()
 
     try:
-        records = _fetch_recent_measurements(session, window_size)
+        score, records = _recent_window_inputs(session, model_bundle, window_size)
     finally:
         if own_session:
             session.close()
+    return _recent_window_result(model_bundle, window_size, score, records)
+
+
+async def score_recent_window_async(db: AsyncSession) -> Dict:
+    """score_recent_window sobre una sesión async; la carga del modelo y el score van a un hilo."""
+    model_bundle = await run_in_threadpool(get_model)
+    if not model_bundle:
+        return {"detail": "Modelo no cargado. Entrena y guarda model_if.pkl primero."}
+
+    window_size = int(model_bundle.get("window_size", DEFAULT_WINDOW_SIZE))
+    score, records = await db.run_sync(lambda s: _recent_window_inputs(s, model_bundle, window_size))
+    if score is not None:
+        return _recent_window_result(model_bundle, window_size, score, None)
+    return await run_in_threadpool(_recent_window_result, model_bundle, window_size, None, records)
+
+
+def _recent_window_result(
+    model_bundle: Dict, window_size: int, score: Optional[float], records: Optional[List[Dict]]
+) -> Dict:
+    if score is None:
+        if not records:
+            return {"detail": f"Datos insuficientes para ventana de {window_size} muestras."}
 
-    if not records:
-        return {"detail": f"Datos insuficientes para ventana de {window_size} muestras."}
+        with metrics.stage("featurize"):
+            feats = compute_window_features(records)
+            feature_vector = ensure_feature_vector(feats, model_bundle["feature_names"])
+        with metrics.stage("scale"):
+            X = model_bundle["scaler"].transform(feature_vector)
+        with metrics.stage("score"):
+            # score_samples: valores m s pequeños = m s anómalos (consistente con threshold entrenado)
+            score = float(model_bundle["model"].score_samples(X)[0])
+        metrics.inc("rows_scored_total")
 
-    feats = compute_window_features(records)
-    feature_vector = ensure_feature_vector(feats, model_bundle["feature_names"])
-    X = model_bundle["scaler"].transform(feature_vector)
-    # score_samples: valores m s pequeños = m s anómalos (consistente con threshold entrenado)
-    score = float(model_bundle["model"].score_samples(X)[0])
     threshold = float(model_bundle["threshold"])
     is_anomaly = score < threshold
     margin = score - threshold
@@ -0,0 +1,163 @@
+"""
+Registro de modelos IsolationForest sobre la tabla `models`.
+
+Cada entrenamiento guarda un bundle versionado en
+models_store/default/v<version>-<model_id>.joblib (sin compresión: carga más
+rápida) y una fila con sus metadatos. Solo una versión está activa; activar es una
+única transacción. Cada worker carga su propia copia del bosque.
+
+Hay un solo modelo: measurements no tiene columna de máquina, así que entrenar,
+puntuar y leer no pueden separarse por máquina. La columna machine_key de `models`
+queda siempre en "default".
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.db import SessionLocal
+
+MODEL_DIR = Path(os.getenv("MODEL_STORE_DIR", str(Path(__file__).resolve().parent.parent / "models_store")))
+# Bundle previo al registro; se sigue leyendo si el registro está vacío
+LEGACY_PATH = MODEL_DIR / "model_if.pkl"
+DEFAULT_KEY = "default"
+# Reintentos si otro entrenamiento tomó el mismo número de versión (índice único)
+REGISTER_ATTEMPTS = 5
+# Postgres: advisory lock de transacción que serializa la asignación de versión entre procesos
+_ADVISORY_LOCK_KEY = 7_420_115
+
+
+def _load(path: Path) -> Dict:
+    return joblib.load(path)
+
+
+def register(bundle: Dict, activate: bool = True) -> Dict:
+    """
+    Guarda el bundle como nueva versión y (por defecto) la activa. El número es
+    MAX(version)+1 bajo un advisory lock en Postgres; el índice único (machine_key,
+    version) lo garantiza en cualquier motor: si dos registros chocan, el que pierde
+    reintenta con la siguiente.
+    """
+    directory = MODEL_DIR / DEFAULT_KEY
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for attempt in range(REGISTER_ATTEMPTS):
+        with SessionLocal() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _ADVISORY_LOCK_KEY})
+            version = (
+                db.execute(text("SELECT MAX(version) FROM models WHERE machine_key = :k"), {"k": DEFAULT_KEY}).scalar() or 0
+            ) + 1
+            path = directory / f"v{version}-{bundle['model_id']}.joblib"
+            try:
+                row = db.execute(
+                    text(
+                        """
+                        INSERT INTO models (name, machine_key, version, model_id, path, active, window_size,
+                                            threshold, threshold_pct, train_windows, train_samples, created_at)
+                        VALUES (:name, :k, :version, :model_id, :path, false, :window_size,
+                                :threshold, :threshold_pct, :train_windows, :train_samples, CURRENT_TIMESTAMP)
+                        RETURNING id
+                        """
+                    ),
+                    {
+                        "name": "isolation_forest",
+                        "k": DEFAULT_KEY,
+                        "version": version,
+                        "model_id": bundle["model_id"],
+                        "path": str(path),
+                        "window_size": bundle.get("window_size"),
+                        "threshold": bundle.get("threshold"),
+                        "threshold_pct": bundle.get("threshold_pct"),
+                        "train_windows": bundle.get("train_windows"),
+                        "train_samples": bundle.get("train_samples"),
+                    },
+                ).scalar()
+            except IntegrityError:
+                db.rollback()
+                if attempt == REGISTER_ATTEMPTS - 1:
+                    raise
+                continue
+            # Escritura atómica antes del commit: la fila nunca apunta a un archivo a medio escribir
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            os.close(fd)
+            joblib.dump(bundle, tmp)
+            os.replace(tmp, path)
+            db.commit()
+        break
+    if activate:
+        activate_version(version)
+    return {"id": row, "version": version, "model_id": bundle["model_id"], "path": str(path)}
+
+
+def activate_version(version: int) -> None:
+    """Deja activa solo `version` (una transacción)."""
+    with SessionLocal() as db:
+        exists = db.execute(
+            text("SELECT 1 FROM models WHERE machine_key = :k AND version = :v"), {"k": DEFAULT_KEY, "v": version}
+        ).scalar()
+        if not exists:
+            raise LookupError(f"No existe la versión {version}")
+        db.execute(
+            text("UPDATE models SET active = (version = :v) WHERE machine_key = :k"),
+            {"k": DEFAULT_KEY, "v": version},
+        )
+        db.commit()
+
+
+def active_id() -> Optional[str]:
+    """model_id activo (consulta barata para detectar reentrenos de otros procesos)."""
+    with SessionLocal() as db:
+        return db.execute(
+            text("SELECT model_id FROM models WHERE machine_key = :k AND active"), {"k": DEFAULT_KEY}
+        ).scalar()
+
+
+def load_active() -> Optional[Tuple[Dict, Dict]]:
+    """(bundle, metadatos) de la versión activa; sin registro cae al model_if.pkl heredado."""
+    with SessionLocal() as db:
+        row = (
+            db.execute(
+                text("SELECT id, version, model_id, path FROM models WHERE machine_key = :k AND active"),
+                {"k": DEFAULT_KEY},
+            )
+            .mappings()
+            .first()
+        )
+    if row and Path(row["path"]).exists():
+        return _load(Path(row["path"])), dict(row)
+    if LEGACY_PATH.exists():
+        return _load(LEGACY_PATH), {"version": 0, "model_id": None, "path": str(LEGACY_PATH)}
+    return None
+
+
+def list_versions() -> List[Dict]:
+    with SessionLocal() as db:
+        rows = db.execute(
+            text(
+                """
+                SELECT id, version, model_id, active, window_size, threshold,
+                       threshold_pct, train_windows, train_samples, created_at
+                FROM models
+                WHERE machine_key = :k
+                ORDER BY version DESC
+                """
+            ),
+            {"k": DEFAULT_KEY},
+        )
+        return [dict(r._mapping) for r in rows]
+
+
+def clear_artifacts() -> None:
+    """Borra los archivos de todas las versiones (las filas las borra quien limpia la tabla)."""
+    if not MODEL_DIR.exists():
+        return
+    for child in MODEL_DIR.iterdir():
+        if child.is_dir():
+            shutil.rmtree(child, ignore_errors=True)
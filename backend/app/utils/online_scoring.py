@@ -0,0 +1,217 @@
+"""
+Scoring en línea: cada lote de measurements se puntúa al ingerirse y el
+score/margen/z-score se guarda junto a la fila (columnas score, margin,
+z_score y score_model = identificador del modelo que puntuó).
+
+El estado es la cola de las últimas window_size-1 filas (buffer circular en
+arrays). Cada lote (ordenado por timestamp) se concatena a esa cola y las ventanas
+nuevas se calculan con las sumas acumuladas de rolling_feature_matrix, sin releer
+historia. La cola se recarga de la BD solo si otro proceso insertó filas (MAX(id)
+distinto al último visto) o si cambió el modelo.
+
+Un lote con filas más viejas que la última guardada (backfill) no se puntúa: se
+guarda sin score y se borran los scores guardados de las filas cuyas ventanas
+cambian (desde la fila más vieja del lote hasta window_size-1 filas después de la
+más nueva); las lecturas los recalculan.
+
+Comprobar la cola, puntuar e insertar es una sola sección crítica: `lock` dentro del
+proceso y, en Postgres, pg_advisory_xact_lock entre procesos (SQLite queda con el lock
+del proceso).
+
+Las lecturas (GET /analyses, /events, /anomaly/stream, canal en vivo) usan el
+score guardado si score_model coincide con el modelo cargado.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.orm import Session
+
+from app.utils import metrics, model_loader, score_cache
+from app.utils.features import records_to_columns, rolling_feature_matrix
+
+ENABLED = os.getenv("ONLINE_SCORING", "1") != "0"
+SCORE_COLUMNS = ("score", "margin", "z_score", "score_model")
+
+# Serializa puntuar + insertar dentro del proceso para que la cola siga el orden de inserción
+lock = threading.Lock()
+# Entre procesos (simulador, workers de la API) en Postgres: advisory lock de transacción
+_ADVISORY_LOCK_KEY = 7_420_114
+
+
+# Parámetros y resultados tipados: en SQLite los timestamps se comparan como texto
+_NEWEST_SQL = text("SELECT MAX(timestamp) AS newest FROM measurements").columns(newest=DateTime)
+_UNTIL_SQL = (
+    text("SELECT timestamp FROM measurements WHERE timestamp > :newest ORDER BY timestamp, id LIMIT 1 OFFSET :k")
+    .bindparams(bindparam("newest", type_=DateTime))
+    .columns(timestamp=DateTime)
+)
+_INVALIDATE = """
+    UPDATE measurements SET score = NULL, margin = NULL, z_score = NULL, score_model = NULL
+    WHERE score_model IS NOT NULL AND timestamp >= :oldest
+"""
+_INVALIDATE_SQL = text(_INVALIDATE).bindparams(bindparam("oldest", type_=DateTime))
+_INVALIDATE_UNTIL_SQL = text(_INVALIDATE + " AND timestamp <= :until").bindparams(
+    bindparam("oldest", type_=DateTime), bindparam("until", type_=DateTime)
+)
+
+
+def _usable(bundle: Optional[Dict]) -> bool:
+    return bool(bundle and bundle.get("model") is not None and bundle.get("scaler") is not None)
+
+
+class _OnlineScorer:
+    def __init__(self):
+        self._tag: Optional[str] = None
+        self._last_id: Optional[int] = None
+        self._values = np.empty(0)
+        self._freqs = np.empty(0)
+        self._anom = np.empty(0, dtype=bool)
+
+    def _max_id(self, db: Session) -> Optional[int]:
+        return db.execute(text("SELECT MAX(id) FROM measurements")).scalar()
+
+    def is_backfill(self, db: Session, rows: Sequence[Tuple]) -> bool:
+        newest = db.execute(_NEWEST_SQL).scalar()
+        return newest is not None and rows[0][0] < newest
+
+    def invalidate(self, db: Session, rows: Sequence[Tuple]) -> None:
+        bundle = model_loader.get_model()
+        window = int(bundle.get("window_size", 0)) if _usable(bundle) else 0
+        until = None
+        if window > 1:
+            # Las filas posteriores al lote cambian de ventana hasta window_size-1 filas después
+            until = db.execute(_UNTIL_SQL, {"newest": rows[-1][0], "k": window - 2}).scalar()
+        if until is None:
+            db.execute(_INVALIDATE_SQL, {"oldest": rows[0][0]})
+        else:
+            db.execute(_INVALIDATE_UNTIL_SQL, {"oldest": rows[0][0], "until": until})
+        # Los puntajes cacheados de esas filas también cambian (en todos los procesos)
+        score_cache.bump_epoch(db)
+        # La cola en memoria puede haber cambiado: se relee en el próximo lote
+        self._tag = None
+
+    def _reload(self, db: Session, keep: int) -> None:
+        rows = (
+            db.execute(
+                text("SELECT value, frequency, status FROM measurements ORDER BY timestamp DESC, id DESC LIMIT :n"),
+                {"n": keep},
+            )
+            .mappings()
+            .all()
+        )
+        self._values, self._freqs, self._anom = records_to_columns(list(reversed(rows)))
+
+    def attach(self, db: Session, rows: Sequence[Tuple]) -> Optional[List[Tuple]]:
+        """Filas (timestamp, value, frequency, status) + SCORE_COLUMNS; None si no hay modelo."""
+        bundle = model_loader.get_model()
+        if not ENABLED or not _usable(bundle):
+            return None
+        window = int(bundle.get("window_size", 0))
+        if window <= 1:
+            return None
+
+        tag = model_loader.model_tag(bundle)
+        keep = window - 1
+        if tag != self._tag or self._max_id(db) != self._last_id:
+            self._reload(db, keep)
+            self._tag = tag
+
+        batch_values, batch_freqs, batch_anom = records_to_columns(
+            [{"value": r[1], "frequency": r[2], "status": r[3]} for r in rows]
+        )
+        values = np.concatenate([self._values, batch_values])
+        freqs = np.concatenate([self._freqs, batch_freqs])
+        anom = np.concatenate([self._anom, batch_anom])
+        history = len(self._values)
+
+        scores = np.full(len(rows), np.nan)
+        if len(values) >= window:
+            # La cola tiene a lo sumo window-1 filas: la primera ventana completa cierra en la
+            # fila `first` del lote y cada fila siguiente cierra exactamente una ventana más
+            with metrics.stage("featurize"):
+                matrix = rolling_feature_matrix(values, freqs, anom, window)
+            first = window - 1 - history
+            scores[first:] = model_loader.score_feature_matrix(bundle, matrix)
+
+        self._values, self._freqs, self._anom = values[-keep:], freqs[-keep:], anom[-keep:]
+
+        threshold = float(bundle.get("threshold", 0.0))
+        mean = float(bundle.get("score_mean", 0.0))
+        std = float(bundle.get("score_std", 1.0)) or 1.0
+        out = []
+        for row, score in zip(rows, scores.tolist()):
+            if np.isnan(score):
+                out.append(tuple(row) + (None, None, None, None))
+            else:
+                out.append(tuple(row) + (score, score - threshold, (score - mean) / std, tag))
+        return out
+
+    def written(self, db: Session) -> None:
+        self._last_id = self._max_id(db)
+
+    def discard(self) -> None:
+        self._tag = None
+
+
+_scorer = _OnlineScorer()
+
+
+def lock_batch(db: Session) -> None:
+    """
+    Llamar con `lock` tomado, al inicio de la transacción del lote. En Postgres espera el
+    advisory lock (se libera con el commit/rollback) para que otro proceso no inserte
+    entre la lectura de la cola y el insert.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _ADVISORY_LOCK_KEY})
+
+
+def is_backfill(db: Session, rows: Sequence[Tuple]) -> bool:
+    """True si el lote (ordenado por timestamp) tiene filas más viejas que la última guardada."""
+    return _scorer.is_backfill(db, rows)
+
+
+def invalidate_backfill(db: Session, rows: Sequence[Tuple]) -> None:
+    """Borra los scores guardados cuyas ventanas cambia el lote. Llamar con `lock` tomado, sin commit."""
+    _scorer.invalidate(db, rows)
+
+
+def attach_scores(db: Session, rows: Sequence[Tuple]) -> Optional[List[Tuple]]:
+    """Llamar con `lock` tomado, antes de insertar (lote ordenado por timestamp y sin backfill)."""
+    return _scorer.attach(db, rows)
+
+
+def mark_written(db: Session) -> None:
+    """Llamar con `lock` tomado, tras el insert y antes del commit (MAX(id) incluye el lote)."""
+    _scorer.written(db)
+
+
+def discard_tail() -> None:
+    """El lote no se guardó: la cola en memoria se relee en el próximo."""
+    _scorer.discard()
+
+
+def seed_cache(rows: List[Dict]) -> Tuple[int, Optional[int]]:
+    """
+    Pasa los scores guardados (claves stored_score/score_model, que se quitan de cada fila)
+    al cache de scores si fueron calculados por el modelo cargado. Devuelve la versión del
+    cache para puntuar esas filas: (versión del modelo, data_epoch leída con las filas).
+    """
+    bundle = model_loader.get_model()
+    tag = model_loader.model_tag(bundle)
+    epoch = None
+    fresh = {}
+    for r in rows:
+        score = r.pop("stored_score", None)
+        scored_by = r.pop("score_model", None)
+        epoch = r.pop("data_epoch", epoch)
+        if tag is not None and score is not None and scored_by == tag:
+            fresh[r["id"]] = (r["timestamp"], score)
+    version = (model_loader.get_model_version(), epoch)
+    if fresh:
+        score_cache.put_many(version, fresh)
+    return version
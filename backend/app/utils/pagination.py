@@ -0,0 +1,58 @@
+"""
+Paginación por keyset sobre (timestamp, id) para las lecturas de measurements.
+
+Los cursores son opacos (base64 url-safe de la última posición devuelta) y la
+página siguiente se pide con `(timestamp, id) < cursor`, que el índice
+(timestamp, id) resuelve sin recorrer las filas anteriores como hace OFFSET.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def encode_cursor(timestamp, row_id: int) -> str:
+    ts = timestamp.isoformat() if isinstance(timestamp, datetime) else str(timestamp)
+    raw = json.dumps({"t": ts, "i": int(row_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) de un cursor; ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), int(data["i"])
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from e
+
+
+def keyset_condition(cursor: Optional[str], since_id: Optional[int], params: Dict) -> list:
+    """Condiciones SQL para cursor (más viejas que) y since_id (más nuevas que); completa params."""
+    conditions = []
+    if cursor:
+        params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+        conditions.append("(timestamp, id) < (:cursor_ts, :cursor_id)")
+    if since_id is not None:
+        params["since_id"] = since_id
+        conditions.append("id > :since_id")
+    return conditions
+
+
+def count_rows(db: Session, where_clause: str, params: Dict, mode: str = "exact") -> Optional[int]:
+    """
+    Total de filas de measurements que cumplen where_clause.
+    mode: exact (COUNT), approx (estimación del planificador en Postgres) o none.
+    """
+    if mode == "none":
+        return None
+    if mode == "approx" and db.get_bind().dialect.name == "postgresql":
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM measurements {where_clause}"), params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return db.execute(text(f"SELECT COUNT(*) FROM measurements {where_clause}"), params).scalar() or 0
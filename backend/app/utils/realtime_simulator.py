@@ -2,8 +2,9 @@
 Simulador sencillo de ingestión en tiempo (casi) real.
 
 Genera una medición cada INTERVAL_SECONDS (por defecto 5s) con valores
-coherentes con una máquina industrial, guarda en measurements y resetea
-la tabla cuando llega a 10 000 filas.
+coherentes con una máquina industrial y la guarda en measurements.
+Cada SIM_MAINTENANCE_SECONDS refresca los rollups y aplica la retención
+(app.utils.retention) en lugar de vaciar la tabla.
 """
 
 import os
@@ -12,14 +13,14 @@ import time
 from datetime import datetime, timezone
 from typing import Tuple
 
-from sqlalchemy import text
-
 from app.db import SessionLocal
+from app.utils import retention
+from app.utils.ingest import write_measurements
 
-MAX_ROWS = 10_000
 INTERVAL_SECONDS = float(os.getenv("SIM_INTERVAL_SECONDS", "5"))
 ANOMALY_RATE = float(os.getenv("SIM_ANOMALY_RATE", "0.05"))  # 5% anomalías
 LOG_EVERY = int(os.getenv("SIM_LOG_EVERY", "1"))  # imprime cada N filas
+MAINTENANCE_SECONDS = float(os.getenv("SIM_MAINTENANCE_SECONDS", str(retention.INTERVAL_SECONDS)))
 
 
 from app.utils.data_generator import NORMAL_RANGES, ANOMALY_RANGES
@@ -57,45 +58,34 @@ def _sample_measurement() -> Tuple[float, float, str, float, float, list]:
     return value, freq, status, snr, flatness, bands
 
 
-def _ensure_space(db):
-    """Si alcanzamos MAX_ROWS, limpiamos measurements para empezar de nuevo."""
-    current = db.execute(text("SELECT COUNT(*) FROM measurements")).scalar()
-    if current and current >= MAX_ROWS:
-        db.execute(text("DELETE FROM measurements"))
-        db.commit()
-        return True
-    return False
+def _maintenance(db):
+    """Rollups + retención por tramos de tiempo; nunca borra la tabla completa."""
+    result = retention.run_maintenance(db)
+    if result:
+        ret = result["retention"]
+        print(
+            f"[sim] Mantenimiento: rollups {result['rollups']}, crudo borrado {ret['raw_deleted']} "
+            f"(< {ret['raw_cutoff']:%Y-%m-%d %H:%M}), {result['elapsed_s']}s"
+        )
 
 
 def run_forever():
     """Bucle principal: genera y guarda una medición cada INTERVAL_SECONDS."""
     print(
-        f"[sim] Iniciando simulador cada {INTERVAL_SECONDS}s, max filas {MAX_ROWS}, "
+        f"[sim] Iniciando simulador cada {INTERVAL_SECONDS}s, retención {retention.RAW_RETENTION_HOURS}h, "
         f"anomaly rate {ANOMALY_RATE*100:.1f}%"
     )
     total_inserted = 0
+    last_maintenance = 0.0
     try:
         while True:
             with SessionLocal() as db:
-                reset = _ensure_space(db)
-                if reset:
-                    print("[sim] Tabla measurements alcanzó el límite; limpiada y reiniciada.")
+                if time.monotonic() - last_maintenance >= MAINTENANCE_SECONDS:
+                    _maintenance(db)
+                    last_maintenance = time.monotonic()
                 value, freq, status, snr, flatness, bands = _sample_measurement()
-                db.execute(
-                    text(
-                        """
-                        INSERT INTO measurements (timestamp, value, frequency, status)
-                        VALUES (:ts, :value, :freq, :status)
-                        """
-                    ),
-                    {
-                        "ts": datetime.now(timezone.utc),
-                        "value": value,
-                        "freq": freq,
-                        "status": status,
-                    },
-                )
-                db.commit()
+                # write_measurements puntúa la fila con el modelo cargado antes de guardarla
+                write_measurements(db, [(datetime.now(timezone.utc).replace(tzinfo=None), value, freq, status)])
                 total_inserted += 1
                 if total_inserted % LOG_EVERY == 0:
                     print(
@@ -0,0 +1,144 @@
+"""
+Cache de respuestas de lectura con ETag / 304.
+
+La versión de los datos es (MIN(id), MAX(id)) de measurements -dos extremos del
+índice de la PK-, la época de datos de score_cache (cambia con backfills, retención y
+limpiezas aunque se repitan los ids, p.ej. SQLite tras /v2/clear) y el modelo servido
+(versión del registro, igual en todos los workers y entre reinicios). El ETag combina esa versión
+con la ruta y los parámetros (sin `_t`), así un poll sin datos nuevos cuesta una
+consulta al índice y responde 304 o el cuerpo cacheado.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.utils import metrics, model_loader, score_cache
+
+TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "5"))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+# Parámetros que no cambian la respuesta (cache-busters del frontend)
+IGNORED_PARAMS = {"_t"}
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, Tuple[float, bytes, Dict[str, str]]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+_VERSION_SQL = text(f"SELECT MIN(id), MAX(id), {score_cache.DATA_EPOCH_COLUMN} FROM measurements")
+
+
+def _version(low, high, epoch, model: str) -> str:
+    return f"{low}-{high}-e{epoch}-{model}"
+
+
+def data_version(db: Session) -> str:
+    return _version(*db.execute(_VERSION_SQL).one(), model_loader.served_tag())
+
+
+async def data_version_async(db: AsyncSession) -> str:
+    # La (re)carga del modelo hace I/O sync: fuera del event loop
+    model = await run_in_threadpool(model_loader.served_tag)
+    return _version(*(await db.execute(_VERSION_SQL)).one(), model)
+
+
+def _etag(request: Request, version: str, time_window: bool) -> str:
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if k not in IGNORED_PARAMS)
+    # Respuestas con ventana relativa a "ahora" (minutes) se renuevan al menos cada minuto
+    minute = int(time.time() // 60) if time_window else 0
+    key = repr((request.url.path, params, version, minute)).encode()
+    return f'W/"{hashlib.blake2b(key, digest_size=12).hexdigest()}"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip() for tag in header.split(",")}
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+def _cached(request: Request, version: str, time_window: bool) -> Tuple[str, Dict[str, str], Optional[Response]]:
+    """(etag, cabeceras, respuesta 304/cacheada o None si hay que construirla)."""
+    etag = _etag(request, version, time_window)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request, etag):
+        with _lock:
+            _stats["not_modified"] += 1
+        return etag, headers, Response(status_code=304, headers=headers)
+
+    with _lock:
+        entry = _entries.get(etag)
+        if entry and entry[0] > time.monotonic():
+            _entries.move_to_end(etag)
+            _stats["hits"] += 1
+            return etag, headers, Response(entry[1], media_type="application/json", headers=headers | entry[2])
+        _stats["misses"] += 1
+    return etag, headers, None
+
+
+def _encode(content: Any) -> bytes:
+    with metrics.stage("serialize"):
+        return JSONResponse(jsonable_encoder(content)).body
+
+
+def _store(etag: str, headers: Dict[str, str], body: bytes, extra: Dict[str, str]) -> Response:
+    with _lock:
+        _entries[etag] = (time.monotonic() + TTL_SECONDS, body, extra)
+        _entries.move_to_end(etag)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return Response(body, media_type="application/json", headers=headers | extra)
+
+
+def respond(
+    request: Request,
+    db: Session,
+    build: Callable[[Dict[str, str]], Any],
+    time_window: bool = False,
+) -> Response:
+    """
+    Responde con 304 si el cliente ya tiene la versión, con el cuerpo cacheado si sigue
+    vigente, o llama a build(headers) (que puede agregar cabeceras) y guarda el resultado.
+    """
+    etag, headers, cached = _cached(request, data_version(db), time_window)
+    if cached is not None:
+        return cached
+    extra: Dict[str, str] = {}
+    return _store(etag, headers, _encode(build(extra)), extra)
+
+
+async def respond_async(
+    request: Request,
+    db: AsyncSession,
+    build: Callable[[Dict[str, str]], Awaitable[Any]],
+    time_window: bool = False,
+) -> Response:
+    """Igual que respond con sesión async; build es una corrutina y serializar va a un hilo."""
+    etag, headers, cached = _cached(request, await data_version_async(db), time_window)
+    if cached is not None:
+        return cached
+    extra: Dict[str, str] = {}
+    content = await build(extra)
+    return _store(etag, headers, await run_in_threadpool(_encode, content), extra)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def stats() -> Dict:
+    with _lock:
+        return dict(_stats, entries=len(_entries))
@@ -0,0 +1,333 @@
+"""
+Retención y rollups de measurements.
+
+- Rollups 1 minuto / 1 hora (count, suma/min/max de value, media de frequency,
+  anomalías) refrescados incrementalmente desde la última marca de agua.
+- Retención por tramos de tiempo: DROP de particiones completas si la tabla está
+  particionada, o DELETE por lotes en caso contrario. Nunca vacía la tabla entera.
+- read_rollup sirve GET /analyses cuando el rango pedido es largo.
+
+Uso standalone (cron o servicio):
+    python -m app.utils.retention            # una pasada
+    python -m app.utils.retention --loop     # cada RETENTION_INTERVAL_SECONDS
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.utils import schema, score_cache
+
+RAW_RETENTION_HOURS = float(os.getenv("RETENTION_RAW_HOURS", str(24 * 7)))
+ROLLUP_1M_RETENTION_DAYS = float(os.getenv("RETENTION_1M_DAYS", "30"))
+ROLLUP_1H_RETENTION_DAYS = float(os.getenv("RETENTION_1H_DAYS", "365"))
+DELETE_BATCH_SIZE = int(os.getenv("RETENTION_DELETE_BATCH", "5000"))
+INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "300"))
+
+# Rangos (minutos) por encima de los cuales /analyses lee de cada rollup
+RAW_MAX_MINUTES = int(os.getenv("ROLLUP_RAW_MAX_MINUTES", "360"))
+ROLLUP_1M_MAX_MINUTES = int(os.getenv("ROLLUP_1M_MAX_MINUTES", str(7 * 24 * 60)))
+
+TIERS = {
+    "1m": {"table": "measurements_rollup_1m", "unit": "minute", "step": timedelta(minutes=1)},
+    "1h": {"table": "measurements_rollup_1h", "unit": "hour", "step": timedelta(hours=1)},
+}
+# Buckets recientes que se recalculan siempre (datos que llegan tarde)
+REFRESH_LAG_BUCKETS = 2
+# Clave de advisory lock para que una sola instancia haga mantenimiento a la vez
+_ADVISORY_LOCK_KEY = 7_420_113
+
+
+def _trunc(dialect: str, unit: str, column: str) -> str:
+    if dialect == "postgresql":
+        return f"date_trunc('{unit}', {column})"
+    fmt = "%Y-%m-%d %H:%M:00" if unit == "minute" else "%Y-%m-%d %H:00:00"
+    return f"strftime('{fmt}', {column})"
+
+
+def tier_for_minutes(minutes: Optional[int]) -> str:
+    """Nivel de datos para un rango: 'raw', '1m' o '1h'."""
+    if not minutes or minutes <= RAW_MAX_MINUTES:
+        return "raw"
+    if minutes <= ROLLUP_1M_MAX_MINUTES:
+        return "1m"
+    return "1h"
+
+
+def _watermark(db: Session, table: str) -> Optional[datetime]:
+    value = db.execute(text(f"SELECT MAX(bucket) FROM {table}")).scalar()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value
+
+
+def refresh_rollups(db: Session) -> Dict[str, int]:
+    """Recalcula buckets desde la marca de agua (menos un margen) hacia adelante, con upsert."""
+    dialect = db.get_bind().dialect.name
+    upsert = """
+        ON CONFLICT (bucket) DO UPDATE SET
+            count = excluded.count,
+            value_sum = excluded.value_sum,
+            value_min = excluded.value_min,
+            value_max = excluded.value_max,
+            frequency_sum = excluded.frequency_sum,
+            frequency_count = excluded.frequency_count,
+            anomaly_count = excluded.anomaly_count
+    """
+    out = {}
+
+    mark = _watermark(db, TIERS["1m"]["table"])
+    since = mark - REFRESH_LAG_BUCKETS * TIERS["1m"]["step"] if mark else datetime.min
+    bucket = _trunc(dialect, "minute", "timestamp")
+    out["1m"] = db.execute(
+        text(
+            f"""
+            INSERT INTO measurements_rollup_1m
+                (bucket, count, value_sum, value_min, value_max, frequency_sum, frequency_count, anomaly_count)
+            SELECT {bucket}, COUNT(*), SUM(value), MIN(value), MAX(value),
+                   COALESCE(SUM(frequency), 0), COUNT(frequency),
+                   SUM(CASE WHEN {schema.anomaly_sql()} THEN 1 ELSE 0 END)
+            FROM measurements
+            WHERE timestamp >= :since
+            GROUP BY 1
+            {upsert}
+            """
+        ),
+        {"since": since},
+    ).rowcount
+
+    # La hora se re-agrega desde los minutos (mucho más barato que desde crudo)
+    mark = _watermark(db, TIERS["1h"]["table"])
+    since = mark - REFRESH_LAG_BUCKETS * TIERS["1h"]["step"] if mark else datetime.min
+    bucket = _trunc(dialect, "hour", "bucket")
+    out["1h"] = db.execute(
+        text(
+            f"""
+            INSERT INTO measurements_rollup_1h
+                (bucket, count, value_sum, value_min, value_max, frequency_sum, frequency_count, anomaly_count)
+            SELECT {bucket}, SUM(count), SUM(value_sum), MIN(value_min), MAX(value_max),
+                   SUM(frequency_sum), SUM(frequency_count), SUM(anomaly_count)
+            FROM measurements_rollup_1m
+            WHERE bucket >= :since
+            GROUP BY 1
+            {upsert}
+            """
+        ),
+        {"since": since},
+    ).rowcount
+    db.commit()
+    return out
+
+
+def _floor(ts: datetime, unit: str) -> datetime:
+    ts = ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0) if unit == "hour" else ts
+
+
+def add_backfill_to_rollups(db: Session, rows: List[tuple]) -> Dict[str, int]:
+    """
+    Suma filas de un backfill (timestamp, value, frequency, status) a los buckets que
+    refresh_rollups ya no recalcula (anteriores a su marca de agua menos el margen);
+    los recientes los recalcula el próximo refresh desde crudo. Es una suma y no un
+    recálculo desde crudo porque el rollup retiene más que measurements: un bucket
+    viejo ya no tiene sus filas originales. No hace commit (va en la transacción del insert).
+    """
+    dialect = db.get_bind().dialect.name
+    out = {}
+    for tier, cfg in TIERS.items():
+        mark = _watermark(db, cfg["table"])
+        if mark is None:
+            # Sin rollups todavía: el primer refresh agrega todo desde crudo
+            out[tier] = 0
+            continue
+        since = mark - REFRESH_LAG_BUCKETS * cfg["step"]
+        buckets: Dict[datetime, list] = {}
+        for ts, value, frequency, status in rows:
+            bucket = _floor(ts, cfg["unit"])
+            if bucket >= since:
+                continue
+            agg = buckets.setdefault(bucket, [0, 0.0, value, value, 0.0, 0, 0])
+            agg[0] += 1
+            agg[1] += value
+            agg[2] = min(agg[2], value)
+            agg[3] = max(agg[3], value)
+            if frequency is not None:
+                agg[4] += frequency
+                agg[5] += 1
+            agg[6] += int(str(status or "").lower().startswith("anom"))
+        if buckets:
+            table = cfg["table"]
+            db.execute(
+                text(
+                    f"""
+                    INSERT INTO {table}
+                        (bucket, count, value_sum, value_min, value_max, frequency_sum, frequency_count, anomaly_count)
+                    VALUES (:bucket, :count, :value_sum, :value_min, :value_max, :frequency_sum, :frequency_count, :anomaly_count)
+                    ON CONFLICT (bucket) DO UPDATE SET
+                        count = {table}.count + excluded.count,
+                        value_sum = {table}.value_sum + excluded.value_sum,
+                        value_min = CASE WHEN excluded.value_min < {table}.value_min THEN excluded.value_min ELSE {table}.value_min END,
+                        value_max = CASE WHEN excluded.value_max > {table}.value_max THEN excluded.value_max ELSE {table}.value_max END,
+                        frequency_sum = {table}.frequency_sum + excluded.frequency_sum,
+                        frequency_count = {table}.frequency_count + excluded.frequency_count,
+                        anomaly_count = {table}.anomaly_count + excluded.anomaly_count
+                    """
+                ),
+                [
+                    {
+                        # En SQLite el bucket se guarda como el texto de strftime (ver _trunc)
+                        "bucket": bucket if dialect == "postgresql" else f"{bucket:%Y-%m-%d %H:%M:%S}",
+                        "count": agg[0],
+                        "value_sum": agg[1],
+                        "value_min": agg[2],
+                        "value_max": agg[3],
+                        "frequency_sum": agg[4],
+                        "frequency_count": agg[5],
+                        "anomaly_count": agg[6],
+                    }
+                    for bucket, agg in buckets.items()
+                ],
+            )
+        out[tier] = len(buckets)
+    return out
+
+
+def _delete_in_batches(db: Session, table: str, column: str, cutoff: datetime) -> int:
+    """DELETE por lotes acotados (transacciones cortas, sin bloquear la tabla entera)."""
+    key = "id" if table == "measurements" else column
+    total = 0
+    while True:
+        deleted = db.execute(
+            text(
+                f"""
+                DELETE FROM {table} WHERE {key} IN (
+                    SELECT {key} FROM {table} WHERE {column} < :cutoff ORDER BY {column} LIMIT :n
+                )
+                """
+            ),
+            {"cutoff": cutoff, "n": DELETE_BATCH_SIZE},
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < DELETE_BATCH_SIZE:
+            return total
+
+
+def apply_retention(db: Session, now: Optional[datetime] = None) -> Dict:
+    """Elimina datos crudos y rollups más viejos que su retención."""
+    now = now or datetime.utcnow()
+    raw_cutoff = now - timedelta(hours=RAW_RETENTION_HOURS)
+    out: Dict = {"raw_cutoff": raw_cutoff}
+
+    conn = db.connection()
+    if schema.is_partitioned(conn):
+        out["dropped_partitions"] = schema.drop_partitions_before(conn, raw_cutoff)
+        db.commit()
+    out["raw_deleted"] = _delete_in_batches(db, "measurements", "timestamp", raw_cutoff)
+    if out["raw_deleted"] or out.get("dropped_partitions"):
+        # Las primeras filas que quedan pierden parte de su ventana: puntajes cacheados vencidos
+        score_cache.bump_epoch(db)
+        db.commit()
+    out["rollup_1m_deleted"] = _delete_in_batches(
+        db, "measurements_rollup_1m", "bucket", now - timedelta(days=ROLLUP_1M_RETENTION_DAYS)
+    )
+    out["rollup_1h_deleted"] = _delete_in_batches(
+        db, "measurements_rollup_1h", "bucket", now - timedelta(days=ROLLUP_1H_RETENTION_DAYS)
+    )
+    return out
+
+
+def run_maintenance(db: Session) -> Optional[Dict]:
+    """
+    Rollups primero (para no perder datos que se van a borrar) y luego retención.
+    En Postgres solo una instancia a la vez (advisory lock); devuelve None si otra está corriendo.
+    """
+    is_pg = db.get_bind().dialect.name == "postgresql"
+    if is_pg and not db.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _ADVISORY_LOCK_KEY}).scalar():
+        return None
+    try:
+        t0 = time.perf_counter()
+        out = {"rollups": refresh_rollups(db), "retention": apply_retention(db)}
+        if schema.PARTITION_INTERVAL and schema.is_partitioned(db.connection()):
+            schema.ensure_partitions(db.connection(), schema.PARTITION_INTERVAL)
+            db.commit()
+        out["elapsed_s"] = round(time.perf_counter() - t0, 3)
+        return out
+    finally:
+        if is_pg:
+            db.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _ADVISORY_LOCK_KEY})
+            db.commit()
+
+
+def read_rollup(db: Session, tier: str, since: datetime, skip: int = 0, limit: int = 10000) -> List[Dict]:
+    """
+    Filas de un rollup con la misma forma que GET /analyses (rms_db = media de value,
+    dominant_freq_hz = media de frequency, status Anomalo si hubo anomalías en el bucket).
+    """
+    table = TIERS[tier]["table"]
+    rows = (
+        db.execute(
+            text(
+                f"""
+                SELECT bucket, count, value_sum, value_min, value_max,
+                       frequency_sum, frequency_count, anomaly_count
+                FROM {table}
+                WHERE bucket >= :since
+                ORDER BY bucket DESC
+                LIMIT :limit OFFSET :skip
+                """
+            ),
+            {"since": since, "skip": skip, "limit": limit},
+        )
+        .mappings()
+        .all()
+    )
+    out = []
+    for r in reversed(rows):
+        count = int(r["count"] or 0)
+        out.append(
+            {
+                "id": None,
+                "timestamp": r["bucket"],
+                "rms_db": (r["value_sum"] / count) if count else None,
+                "dominant_freq_hz": (r["frequency_sum"] / r["frequency_count"]) if r["frequency_count"] else None,
+                "status": "Anomalo" if r["anomaly_count"] else "OK",
+                "resolution": tier,
+                "count": count,
+                "value_min": r["value_min"],
+                "value_max": r["value_max"],
+                "anomaly_count": int(r["anomaly_count"] or 0),
+            }
+        )
+    return out
+
+
+def run_forever(interval: float = INTERVAL_SECONDS):
+    from app.db import SessionLocal
+
+    print(f"[retention] cada {interval}s | crudo {RAW_RETENTION_HOURS}h, 1m {ROLLUP_1M_RETENTION_DAYS}d, 1h {ROLLUP_1H_RETENTION_DAYS}d")
+    try:
+        while True:
+            with SessionLocal() as db:
+                print(f"[retention] {run_maintenance(db)}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n[retention] Detenido por usuario.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rollups y retención de measurements")
+    parser.add_argument("--loop", action="store_true", help=f"repetir cada {INTERVAL_SECONDS}s")
+    args = parser.parse_args()
+    if args.loop:
+        run_forever()
+    else:
+        from app.db import SessionLocal
+
+        with SessionLocal() as db:
+            print(run_maintenance(db))
@@ -0,0 +1,329 @@
+"""
+Evolución del esquema de measurements (idempotente, se ejecuta al arrancar desde db.py):
+
+- columna generada is_anomaly (reemplaza LOWER(status) LIKE 'anom%' en las consultas);
+  en SQLite se agrega al arrancar (VIRTUAL, sin reescribir la tabla), en Postgres es una
+  migración explícita porque STORED reescribe measurements bajo ACCESS EXCLUSIVE
+- índice (timestamp, id) e índice parcial de anomalías
+- columnas del scoring en línea (score, margin, z_score, score_model)
+- fila única de data_epoch (versión de los datos para el cache de puntajes)
+- particionado opcional por rango de tiempo (Postgres) con creación anticipada de
+  particiones y borrado de particiones viejas para retención.
+
+Migraciones explícitas:
+    python -m app.utils.schema --anomaly-column
+    python -m app.utils.schema --partition month
+"""
+
+import argparse
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import ANOMALY_EXPR
+
+# "", "day", "week" o "month"; vacío = sin particionado
+PARTITION_INTERVAL = os.getenv("MEASUREMENTS_PARTITION_INTERVAL", "").strip().lower()
+PARTITIONS_AHEAD = int(os.getenv("MEASUREMENTS_PARTITIONS_AHEAD", "3"))
+
+INDEX_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_measurements_timestamp_id ON measurements (timestamp, id)",
+]
+ANOMALY_INDEX_DDL = "CREATE INDEX IF NOT EXISTS ix_measurements_anomaly_timestamp ON measurements (timestamp, id) WHERE is_anomaly"
+
+SCORE_COLUMNS_DDL = {
+    "score": "FLOAT",
+    "margin": "FLOAT",
+    "z_score": "FLOAT",
+    "score_model": "VARCHAR",
+}
+
+MODEL_COLUMNS_DDL = {
+    "machine_key": "VARCHAR DEFAULT 'default'",
+    "version": "INTEGER",
+    "model_id": "VARCHAR",
+    "path": "VARCHAR",
+    "active": "BOOLEAN DEFAULT false",
+    "window_size": "INTEGER",
+    "threshold": "FLOAT",
+    "threshold_pct": "FLOAT",
+    "train_windows": "INTEGER",
+    "train_samples": "INTEGER",
+}
+
+# Columnas que se copian al mover filas entre particiones (is_anomaly es generada)
+PARTITION_COPY_COLUMNS = ("id", "timestamp", "value", "frequency", "status") + tuple(SCORE_COLUMNS_DDL)
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# False mientras measurements (Postgres) no tenga is_anomaly: las consultas usan la expresión
+_has_anomaly_column = True
+
+
+def _period_start(ts: datetime, interval: str) -> datetime:
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Intervalo de particion no soportado: {interval!r}")
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def _partition_name(start: datetime) -> str:
+    return f"measurements_p{start:%Y%m%d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(
+        conn.execute(
+            text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'measurements'")
+        ).scalar()
+    )
+
+
+def anomaly_sql() -> str:
+    """Predicado de anomalía para SQL: la columna is_anomaly si existe, si no la expresión equivalente."""
+    return "is_anomaly" if _has_anomaly_column else f"({ANOMALY_EXPR})"
+
+
+def _add_anomaly_column(conn: Connection) -> None:
+    # SQLite solo admite agregar columnas generadas VIRTUAL
+    kind = "STORED" if conn.dialect.name == "postgresql" else "VIRTUAL"
+    conn.execute(
+        text(f"ALTER TABLE measurements ADD COLUMN is_anomaly BOOLEAN GENERATED ALWAYS AS ({ANOMALY_EXPR}) {kind}")
+    )
+    conn.execute(text(ANOMALY_INDEX_DDL))
+
+
+def _ensure_unique_versions(conn: Connection) -> None:
+    """Índice único (machine_key, version); si ya hay versiones repetidas no se crea (no se tumba el arranque)."""
+    duplicated = conn.execute(
+        text("SELECT 1 FROM models WHERE version IS NOT NULL GROUP BY machine_key, version HAVING COUNT(*) > 1 LIMIT 1")
+    ).scalar()
+    if duplicated:
+        print("[schema] models tiene versiones repetidas: no se crea ux_models_machine_key_version")
+        return
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_models_machine_key_version ON models (machine_key, version)"))
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Agrega columnas (scores, registro de modelos), índices y la fila de data_epoch a tablas
+    creadas con versiones anteriores. is_anomaly solo se agrega aquí en SQLite.
+    """
+    global _has_anomaly_column
+    columns = {c["name"] for c in inspect(engine).get_columns("measurements")}
+    model_columns = {c["name"] for c in inspect(engine).get_columns("models")}
+    with engine.begin() as conn:
+        _has_anomaly_column = "is_anomaly" in columns
+        if not _has_anomaly_column and conn.dialect.name != "postgresql":
+            _add_anomaly_column(conn)
+            _has_anomaly_column = True
+        elif not _has_anomaly_column:
+            print("[schema] measurements sin is_anomaly: ejecuta python -m app.utils.schema --anomaly-column")
+        for name, kind in SCORE_COLUMNS_DDL.items():
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE measurements ADD COLUMN {name} {kind}"))
+        for name, kind in MODEL_COLUMNS_DDL.items():
+            if name not in model_columns:
+                conn.execute(text(f"ALTER TABLE models ADD COLUMN {name} {kind}"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_models_machine_key ON models (machine_key)"))
+        _ensure_unique_versions(conn)
+        conn.execute(text("INSERT INTO data_epoch (id, epoch) VALUES (1, 0) ON CONFLICT DO NOTHING"))
+        for ddl in INDEX_DDL:
+            conn.execute(text(ddl))
+        if _has_anomaly_column:
+            conn.execute(text(ANOMALY_INDEX_DDL))
+        if PARTITION_INTERVAL and is_partitioned(conn):
+            ensure_partitions(conn, PARTITION_INTERVAL, PARTITIONS_AHEAD)
+
+
+def add_anomaly_column(engine: Engine) -> dict:
+    """Migración explícita: agrega is_anomaly (STORED en Postgres, reescribe la tabla) y su índice parcial."""
+    global _has_anomaly_column
+    with engine.begin() as conn:
+        if "is_anomaly" in {c["name"] for c in inspect(conn).get_columns("measurements")}:
+            return {"added": False, "detail": "measurements ya tiene is_anomaly"}
+        _add_anomaly_column(conn)
+    _has_anomaly_column = True
+    return {"added": True}
+
+
+def _create_partition(conn: Connection, name: str, start: datetime, end: datetime) -> None:
+    """
+    CREATE ... PARTITION OF para [start, end). Si la default ya tiene filas de ese rango,
+    Postgres rechaza la partición: se desengancha la default, se crea la partición, se
+    mueven las filas y se vuelve a enganchar.
+    """
+    bounds = f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return
+    params = {"start": start, "end": end}
+    stranded = conn.execute(text("SELECT to_regclass('measurements_default')")).scalar() and conn.execute(
+        text("SELECT 1 FROM measurements_default WHERE timestamp >= :start AND timestamp < :end LIMIT 1"), params
+    ).scalar()
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF measurements {bounds}"))
+        return
+    columns = ", ".join(PARTITION_COPY_COLUMNS)
+    conn.execute(text("ALTER TABLE measurements DETACH PARTITION measurements_default"))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF measurements {bounds}"))
+    conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM measurements_default
+                WHERE timestamp >= :start AND timestamp < :end
+                RETURNING {columns}
+            )
+            INSERT INTO measurements ({columns}) SELECT {columns} FROM moved
+            """
+        ),
+        params,
+    )
+    conn.execute(text("ALTER TABLE measurements ATTACH PARTITION measurements_default DEFAULT"))
+
+
+def ensure_partitions(conn: Connection, interval: str, ahead: int = PARTITIONS_AHEAD, since: Optional[datetime] = None) -> List[str]:
+    """Crea (si faltan) las particiones desde `since` (o el periodo actual) hasta `ahead` periodos adelante."""
+    start = _period_start(since or datetime.utcnow(), interval)
+    end = _period_start(datetime.utcnow(), interval)
+    for _ in range(ahead):
+        end = _next_period(end, interval)
+    created = []
+    while start <= end:
+        nxt = _next_period(start, interval)
+        name = _partition_name(start)
+        _create_partition(conn, name, start, nxt)
+        created.append(name)
+        start = nxt
+    return created
+
+
+def list_partitions(conn: Connection) -> List[dict]:
+    """Particiones de rango de measurements con sus límites [desde, hasta)."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'measurements'
+            ORDER BY c.relname
+            """
+        )
+    ).mappings().all()
+    out = []
+    for r in rows:
+        match = _BOUND_RE.search(r["bound"] or "")
+        if match:
+            out.append(
+                {
+                    "name": r["name"],
+                    "start": datetime.fromisoformat(match.group(1)),
+                    "end": datetime.fromisoformat(match.group(2)),
+                }
+            )
+    return out
+
+
+def drop_partitions_before(conn: Connection, cutoff: datetime) -> List[str]:
+    """Elimina particiones completas cuyo límite superior es <= cutoff (retención O(1) por periodo)."""
+    dropped = []
+    for part in list_partitions(conn):
+        if part["end"] <= cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {part['name']}"))
+            dropped.append(part["name"])
+    return dropped
+
+
+def convert_to_partitioned(engine: Engine, interval: str, ahead: int = PARTITIONS_AHEAD) -> dict:
+    """
+    Migra measurements a una tabla particionada por RANGE(timestamp) en una transacción.
+    La PK pasa a (id, timestamp) (requisito de Postgres); la secuencia de id se conserva.
+    """
+    global _has_anomaly_column
+    _period_start(datetime.utcnow(), interval)  # valida el intervalo
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise RuntimeError("El particionado solo está disponible en Postgres")
+        if is_partitioned(conn):
+            return {"converted": False, "detail": "measurements ya está particionada"}
+
+        oldest = conn.execute(text("SELECT MIN(timestamp) FROM measurements")).scalar()
+        seq = conn.execute(text("SELECT pg_get_serial_sequence('measurements', 'id')")).scalar()
+        legacy_columns = {c["name"] for c in inspect(conn).get_columns("measurements")}
+        copied = ["id", "timestamp", "value", "frequency", "status"] + [c for c in SCORE_COLUMNS_DDL if c in legacy_columns]
+        score_columns = ",\n                    ".join(f"{name} {kind}" for name, kind in SCORE_COLUMNS_DDL.items())
+        conn.execute(text("ALTER TABLE measurements RENAME TO measurements_legacy"))
+        conn.execute(
+            text(
+                f"""
+                CREATE TABLE measurements (
+                    id INTEGER NOT NULL DEFAULT nextval('{seq}'),
+                    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+                    value DOUBLE PRECISION NOT NULL,
+                    frequency DOUBLE PRECISION,
+                    status VARCHAR,
+                    is_anomaly BOOLEAN GENERATED ALWAYS AS ({ANOMALY_EXPR}) STORED,
+                    {score_columns},
+                    PRIMARY KEY (id, timestamp)
+                ) PARTITION BY RANGE (timestamp)
+                """
+            )
+        )
+        # Filas fuera de las particiones creadas (p.ej. timestamps futuros) caen en la default
+        conn.execute(text("CREATE TABLE measurements_default PARTITION OF measurements DEFAULT"))
+        created = ensure_partitions(conn, interval, ahead, since=oldest)
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO measurements ({", ".join(copied)})
+                SELECT {", ".join("COALESCE(timestamp, NOW() AT TIME ZONE 'utc')" if c == "timestamp" else c for c in copied)}
+                FROM measurements_legacy
+                """
+            )
+        )
+        conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY measurements.id"))
+        conn.execute(text("DROP TABLE measurements_legacy"))
+        for ddl in INDEX_DDL:
+            conn.execute(text(ddl))
+        conn.execute(text(ANOMALY_INDEX_DDL))
+    _has_anomaly_column = True
+    return {"converted": True, "interval": interval, "partitions": created}
+
+
+if __name__ == "__main__":
+    from app.db import engine
+
+    parser = argparse.ArgumentParser(description="Migraciones de measurements")
+    parser.add_argument("--anomaly-column", action="store_true", help="agrega la columna generada is_anomaly (reescribe la tabla)")
+    parser.add_argument("--partition", choices=["day", "week", "month"], help="convierte measurements a tabla particionada")
+    parser.add_argument("--ahead", type=int, default=PARTITIONS_AHEAD, help="particiones futuras a crear")
+    args = parser.parse_args()
+    upgrade_schema(engine)
+    if args.anomaly_column:
+        print(add_anomaly_column(engine))
+    if args.partition:
+        print(convert_to_partitioned(engine, args.partition, args.ahead))
+    elif not args.anomaly_column:
+        print("[schema] measurements actualizada (columnas + índices)")
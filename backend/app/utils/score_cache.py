@@ -0,0 +1,68 @@
+"""
+Cache en memoria de puntajes del modelo por fila de measurements.
+
+Clave: ((version del modelo, época de los datos), measurement id). El timestamp de la
+fila se guarda junto al puntaje para descartar entradas si un id se reutiliza.
+
+El puntaje de una fila depende de las window_size filas previas, así que todo lo que
+cambia ventanas ya puntuadas (inserciones fuera de orden, retención, limpiezas) incrementa
+la época en la tabla data_epoch con bump_epoch(). Las lecturas traen la época en la misma
+consulta que las filas (DATA_EPOCH_COLUMN) y la usan como versión: así se invalida el cache
+de todos los procesos sin que una lectura vieja guarde puntajes bajo una época nueva.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+MAX_ENTRIES = int(os.getenv("SCORE_CACHE_SIZE", "200000"))
+# Columna extra para las consultas de filas a puntuar (se quita en online_scoring.seed_cache)
+DATA_EPOCH_COLUMN = "(SELECT epoch FROM data_epoch WHERE id = 1) AS data_epoch"
+
+_lock = threading.Lock()
+_version: Optional[Hashable] = None
+_scores: "OrderedDict[int, Tuple[object, float]]" = OrderedDict()
+
+
+def _sync_version(version: Hashable) -> None:
+    """Descarta todo lo cacheado si cambió la versión (modelo o época de los datos)."""
+    global _version
+    if _version != version:
+        _scores.clear()
+        _version = version
+
+
+def get_many(version: Hashable, keys: Iterable[Tuple[int, object]]) -> Dict[int, float]:
+    """Devuelve {id: score} para las claves (id, timestamp) presentes en cache."""
+    out: Dict[int, float] = {}
+    with _lock:
+        _sync_version(version)
+        for row_id, ts in keys:
+            hit = _scores.get(row_id)
+            if hit is not None and hit[0] == ts:
+                out[row_id] = hit[1]
+    return out
+
+
+def put_many(version: Hashable, items: Dict[int, Tuple[object, float]]) -> None:
+    """Guarda {id: (timestamp, score)} respetando MAX_ENTRIES (se descartan los más antiguos)."""
+    with _lock:
+        _sync_version(version)
+        _scores.update(items)
+        overflow = len(_scores) - MAX_ENTRIES
+        for _ in range(max(0, overflow)):
+            _scores.popitem(last=False)
+
+
+def clear() -> None:
+    with _lock:
+        _scores.clear()
+
+
+def bump_epoch(db: Session) -> None:
+    """Invalida los puntajes cacheados en todos los procesos (va en la transacción del llamador)."""
+    db.execute(text("UPDATE data_epoch SET epoch = epoch + 1 WHERE id = 1"))
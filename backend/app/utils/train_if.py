@@ -6,73 +6,190 @@ Requiere: scikit-learn, joblib.
 """
 
 import os
-from pathlib import Path
-from typing import Dict, List
+import uuid
+from typing import Callable, Dict, List, Optional
 
 import numpy as np
-import joblib
 from sqlalchemy import text
 
-from app.db import SessionLocal
-from app.utils.features import DEFAULT_WINDOW_SIZE, build_feature_matrix
+from app.db import ReadSessionLocal
+from app.utils import model_registry
+from app.utils.features import DEFAULT_WINDOW_SIZE, FEATURE_NAMES, records_to_columns, rolling_feature_matrix
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
+# progress(phase, **datos): informa avance; puede lanzar una excepción para cancelar
+Progress = Callable[..., None]
+# Árboles por tanda al ajustar (cada tanda informa avance y permite cancelar)
+FIT_CHUNK_TREES = int(os.getenv("MODEL_FIT_CHUNK_TREES", "25"))
+# Paso entre ventanas (1 = todas; las vecinas comparten window_size-1 muestras)
+WINDOW_STRIDE = int(os.getenv("MODEL_WINDOW_STRIDE", "1"))
+# Tope de ventanas limpias para entrenar (muestreo reservoir); 0 = sin tope
+MAX_WINDOWS = int(os.getenv("MODEL_MAX_WINDOWS", "0"))
+# Procesos/hilos para construir árboles (-1 = todos los núcleos)
+N_JOBS = int(os.getenv("MODEL_N_JOBS", "1"))
+SEED = 42
 
-MODEL_DIR = Path(__file__).resolve().parent.parent / "models_store"
-MODEL_PATH = MODEL_DIR / "model_if.pkl"
+ANOM_RATE = FEATURE_NAMES.index("anom_rate")
 
 
-def fetch_measurements(session) -> List[Dict]:
-    rows = (
+def _noop(phase: str, **info) -> None:
+    pass
+
+
+def fetch_measurements(session, since_id: Optional[int] = None, context: int = 0) -> List[Dict]:
+    """
+    Mediciones en orden temporal. Con since_id: solo las filas nuevas (id > since_id)
+    precedidas por `context` filas anteriores para completar la primera ventana.
+    """
+    columns = "id, timestamp, value, frequency, status"
+    if since_id is None:
+        rows = session.execute(text(f"SELECT {columns} FROM measurements ORDER BY timestamp, id")).mappings().all()
+        return [dict(r) for r in rows]
+    fresh = (
         session.execute(
-            text("SELECT timestamp, value, frequency, status FROM measurements ORDER BY timestamp")
+            text(f"SELECT {columns} FROM measurements WHERE id > :since_id ORDER BY timestamp, id"),
+            {"since_id": since_id},
         )
         .mappings()
         .all()
     )
-    return [dict(r) for r in rows]
+    previous = []
+    if fresh and context > 0:
+        previous = (
+            session.execute(
+                text(
+                    f"""
+                    SELECT {columns} FROM measurements
+                    WHERE id <= :since_id AND (timestamp, id) < (:ts, :id)
+                    ORDER BY timestamp DESC, id DESC LIMIT :n
+                    """
+                ),
+                {"since_id": since_id, "ts": fresh[0]["timestamp"], "id": fresh[0]["id"], "n": context},
+            )
+            .mappings()
+            .all()
+        )
+    return [dict(r) for r in reversed(previous)] + [dict(r) for r in fresh]
 
 
-def train_model(records: List[Dict], window_size: int, threshold_pct: float) -> Dict:
-    feature_rows = build_feature_matrix(records, window_size=window_size, include_anom_rate=True)
-    if not feature_rows:
-        raise RuntimeError(f"No hay suficientes datos para ventana={window_size}")
+def reservoir_sample(indices: np.ndarray, k: int, seed: int = SEED) -> np.ndarray:
+    """
+    Muestreo reservoir (algoritmo R) de k elementos, vectorizado: el elemento i >= k cae en
+    la posición j_i ~ U[0, i] si j_i < k, y cada posición conserva el último que cayó en ella.
+    Devuelve los elementos en su orden original.
+    """
+    n = len(indices)
+    if k <= 0 or n <= k:
+        return indices
+    rng = np.random.default_rng(seed)
+    i = np.arange(k, n)
+    j = rng.integers(0, i + 1)
+    hit = j < k
+    slots = np.arange(k)
+    np.maximum.at(slots, j[hit], i[hit])
+    return indices[np.sort(slots)]
 
-    # Entrena solo con ventanas sin anomalías declaradas (anom_rate == 0)
-    clean_rows = [r for r in feature_rows if r.get("anom_rate", 0.0) == 0.0]
+
+def select_windows(matrix: np.ndarray, stride: int = 1, max_windows: int = 0):
+    """
+    Índices de ventanas para entrenar y nota del criterio usado: solo ventanas sin
+    anomalías declaradas (anom_rate == 0), con paso `stride` y a lo sumo max_windows.
+    """
+    anom_rate = matrix[:, ANOM_RATE]
+    candidates = np.arange(0, len(matrix), max(1, stride))
+    rates = anom_rate[candidates]
+
+    clean = candidates[rates == 0.0]
     note = ""
-    if not clean_rows:
+    if not len(clean):
         # Relaja criterio: usa ventanas con tasa de anomalías <=10%
-        clean_rows = [r for r in feature_rows if r.get("anom_rate", 0.0) <= 0.1]
+        clean = candidates[rates <= 0.1]
         note = "Se usaron ventanas con <=10% anomalías por falta de ventanas 100% normales."
-    if not clean_rows:
+    if not len(clean):
         # Último recurso: usa las 25% ventanas con menor anom_rate
-        sorted_rows = sorted(feature_rows, key=lambda r: r.get("anom_rate", 1.0))
-        cutoff = max(1, int(len(sorted_rows) * 0.25))
-        clean_rows = sorted_rows[:cutoff]
+        order = candidates[np.argsort(rates, kind="stable")]
+        cutoff = max(1, int(len(order) * 0.25))
+        clean = order[:cutoff]
         note = "Se usaron las ventanas con menor tasa de anomalías (fallback)."
-    if not clean_rows:
+    if not len(clean):
         raise RuntimeError("No hay ventanas utilizables para entrenar")
+    return reservoir_sample(clean, max_windows), note
+
+
+def _fit_trees(model: IsolationForest, X: np.ndarray, n_trees: int, progress: Progress) -> None:
+    # Por tandas con warm_start: mismo bosque que un fit único (las semillas salen del mismo
+    # random_state en orden), pero se puede informar avance y cancelar entre tandas
+    model.warm_start = True
+    while model.n_estimators < n_trees:
+        model.n_estimators = min(n_trees, model.n_estimators + max(1, FIT_CHUNK_TREES))
+        model.fit(X)
+        progress("fit", trees=model.n_estimators)
+    model.warm_start = False
 
-    feature_names = [k for k in clean_rows[0].keys() if k != "anom_rate"]
-    X_raw = np.asarray([[float(r.get(k, 0.0)) for k in feature_names] for r in clean_rows], dtype=float)
 
-    scaler = StandardScaler()
-    X = scaler.fit_transform(X_raw)
+def train_model(
+    records: List[Dict],
+    window_size: int,
+    threshold_pct: float,
+    progress: Optional[Progress] = None,
+    stride: Optional[int] = None,
+    max_windows: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+    base: Optional[Dict] = None,
+    warm_start_trees: int = 0,
+) -> Dict:
+    """
+    Entrena IsolationForest sobre las ventanas de `records`. Con `base` (bundle previo) no
+    parte de cero: reutiliza su scaler y le agrega warm_start_trees árboles ajustados a
+    estos datos (reentreno incremental con datos frescos).
+    """
+    progress = progress or _noop
+    stride = WINDOW_STRIDE if stride is None else max(1, int(stride))
+    max_windows = MAX_WINDOWS if max_windows is None else max(0, int(max_windows))
+    n_jobs = N_JOBS if n_jobs is None else int(n_jobs)
 
-    model = IsolationForest(
-        n_estimators=int(os.getenv("MODEL_TREES", "200")),
-        contamination=float(os.getenv("MODEL_CONTAMINATION", "0.05")),
-        random_state=42,
+    progress("featurize", samples=len(records), windows_total=max(0, len(records) - window_size + 1))
+    if len(records) < window_size:
+        raise RuntimeError(f"No hay suficientes datos para ventana={window_size}")
+    matrix = rolling_feature_matrix(*records_to_columns(records), window_size=window_size)
+    selected, note = select_windows(matrix, stride, max_windows)
+
+    feature_names = [n for n in FEATURE_NAMES if n != "anom_rate"]
+    X_raw = np.ascontiguousarray(matrix[selected][:, [FEATURE_NAMES.index(n) for n in feature_names]])
+
+    if base is not None:
+        scaler = base["scaler"]
+        model = base["model"]
+        X = scaler.transform(X_raw)
+        n_trees = len(model.estimators_) + max(1, int(warm_start_trees))
+    else:
+        scaler = StandardScaler()
+        X = scaler.fit_transform(X_raw)
+        n_trees = int(os.getenv("MODEL_TREES", "200"))
+        model = IsolationForest(
+            n_estimators=0,
+            contamination=float(os.getenv("MODEL_CONTAMINATION", "0.05")),
+            random_state=SEED,
+        )
+    model.n_jobs = n_jobs
+
+    progress(
+        "fit",
+        windows=len(matrix),
+        train_windows=len(selected),
+        trees=model.n_estimators if base is not None else 0,
+        trees_total=n_trees,
     )
-    model.fit(X)
+    _fit_trees(model, X, n_trees, progress)
 
     # score_samples: valores más pequeños = más anómalos
     scores = model.score_samples(X)
     threshold = float(np.percentile(scores, threshold_pct))
 
     return {
+        # Identifica el modelo en los scores guardados al ingerir (measurements.score_model)
+        "model_id": uuid.uuid4().hex[:12],
         "model": model,
         "scaler": scaler,
         "threshold": threshold,
@@ -81,28 +198,76 @@ def train_model(records: List[Dict], window_size: int, threshold_pct: float) ->
         "score_std": float(np.std(scores)),
         "feature_names": feature_names,
         "window_size": window_size,
-        "train_windows": len(clean_rows),
+        "train_windows": len(selected),
         "train_samples": len(records),
+        # Última fila vista: el próximo reentreno incremental parte de acá
+        "train_last_id": max((r["id"] for r in records if r.get("id") is not None), default=None),
+        "stride": stride,
+        "max_windows": max_windows,
+        "trees": len(model.estimators_),
+        "warm_started_from": base.get("model_id") if base is not None else None,
         "note": note,
     }
 
 
-def train_and_save(window_size: int = DEFAULT_WINDOW_SIZE, threshold_pct: float = None) -> Dict:
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+def train_and_save(
+    window_size: int = DEFAULT_WINDOW_SIZE,
+    threshold_pct: float = None,
+    progress: Optional[Progress] = None,
+    activate: bool = True,
+    stride: Optional[int] = None,
+    max_windows: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+    warm_start_trees: int = 0,
+) -> Dict:
+    """
+    Entrena y registra una nueva versión (activa salvo activate=False).
+    warm_start_trees > 0 parte de la versión activa y solo usa las mediciones posteriores
+    a su entrenamiento; sin versión activa compatible entrena de cero.
+    """
+    progress = progress or _noop
     pct = float(threshold_pct) if threshold_pct is not None else float(os.getenv("MODEL_THRESHOLD_PCT", "5"))
-    with SessionLocal() as session:
-        records = fetch_measurements(session)
+    base = None
+    if warm_start_trees and warm_start_trees > 0:
+        loaded = model_registry.load_active()
+        if loaded and loaded[0].get("train_last_id") is not None and loaded[0].get("scaler") is not None:
+            base = loaded[0]
+
+    progress("fetch")
+    with ReadSessionLocal() as session:
+        if base is not None:
+            window_size = int(base["window_size"])
+            records = fetch_measurements(session, since_id=base["train_last_id"], context=window_size - 1)
+        else:
+            records = fetch_measurements(session)
     effective_window = min(window_size or DEFAULT_WINDOW_SIZE, len(records))
+    if base is not None and effective_window < window_size:
+        raise RuntimeError(f"Datos nuevos insuficientes: {len(records)} muestras, se necesitan >= {window_size}")
     if effective_window < 10:
         raise RuntimeError(f"Datos insuficientes: {len(records)} muestras, se necesitan >= 10")
-    bundle = train_model(records, window_size=effective_window, threshold_pct=pct)
-    joblib.dump(bundle, MODEL_PATH)
+    bundle = train_model(
+        records,
+        window_size=effective_window,
+        threshold_pct=pct,
+        progress=progress,
+        stride=stride,
+        max_windows=max_windows,
+        n_jobs=n_jobs,
+        base=base,
+        warm_start_trees=warm_start_trees,
+    )
+    if warm_start_trees and base is None:
+        bundle["note"] = (bundle["note"] + " Sin versión activa para reentreno incremental: se entrenó de cero.").strip()
+    progress("register")
+    entry = model_registry.register(bundle, activate=activate)
+    # Solo en memoria (el archivo ya se escribió): datos del registro para la respuesta
+    bundle.update(version=entry["version"], path=entry["path"])
     return bundle
 
 
 def main(window_size: int = DEFAULT_WINDOW_SIZE, threshold_pct: float = None):
     bundle = train_and_save(window_size=window_size, threshold_pct=threshold_pct)
-    print(f"[train_if] Modelo guardado en {MODEL_PATH} | ventanas entrenadas: {bundle['train_windows']}")
+    print(f"[train_if] Modelo v{bundle['version']} guardado en {bundle['path']} | ventanas entrenadas: {bundle['train_windows']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+"""
+Entrenamientos en segundo plano: cada pedido es un trabajo con id que corre en un
+pool de procesos (fuera de los workers HTTP), informa su avance por fases
+(fetch -> featurize -> fit -> register) y se puede cancelar.
+
+- TRAIN_WORKERS: procesos del pool (0 = hilo, útil en desarrollo)
+- TRAIN_MAX_PENDING: trabajos en cola + en curso; por encima se rechaza
+- TRAIN_JOBS_KEPT: trabajos terminados que se siguen pudiendo consultar
+
+El worker registra la versión sin activarla; al terminar, este proceso la activa y
+recarga el modelo (swap atómico). Un trabajo cancelado no cambia el modelo activo.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from app.utils import model_loader, model_registry
+
+WORKERS = int(os.getenv("TRAIN_WORKERS", "1"))
+MAX_PENDING = int(os.getenv("TRAIN_MAX_PENDING", "4"))
+JOBS_KEPT = int(os.getenv("TRAIN_JOBS_KEPT", "50"))
+START_METHOD = os.getenv("TRAIN_POOL_START_METHOD", "spawn")
+
+FINISHED = {"done", "failed", "cancelled"}
+RESULT_KEYS = (
+    "version",
+    "model_id",
+    "window_size",
+    "threshold",
+    "threshold_pct",
+    "score_mean",
+    "score_std",
+    "train_windows",
+    "train_samples",
+    "stride",
+    "max_windows",
+    "trees",
+    "warm_started_from",
+    "note",
+)
+
+
+class TrainingSaturated(RuntimeError):
+    """Hay demasiados entrenamientos en cola (backpressure)."""
+
+
+class TrainingCancelled(RuntimeError):
+    """El trabajo se canceló mientras corría."""
+
+
+_lock = threading.Lock()
+_executor: Optional[Executor] = None
+_manager = None
+# Compartidos con los workers (dicts del Manager si hay procesos): avance y pedidos de cancelación
+_progress: Dict = {}
+_cancelled: Dict = {}
+# job_id -> {"job_id", "params", "status", "submitted_at", ..., "future"}
+_jobs: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def _get_executor() -> Executor:
+    global _executor, _manager, _progress, _cancelled
+    with _lock:
+        if _executor is None:
+            if WORKERS <= 0:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="train")
+                _progress, _cancelled = {}, {}
+            else:
+                ctx = multiprocessing.get_context(START_METHOD)
+                _manager = ctx.Manager()
+                _progress, _cancelled = _manager.dict(), _manager.dict()
+                _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=ctx)
+        return _executor
+
+
+def _discard_executor() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(job_id: str, params: Dict, progress: Dict, cancelled: Dict) -> Dict:
+    """Corre en el worker: entrena, registra (sin activar) y devuelve los metadatos."""
+    from app.utils.train_if import train_and_save
+
+    started_at = time.time()
+
+    def report(phase: str, **info) -> None:
+        if cancelled.get(job_id):
+            raise TrainingCancelled("Entrenamiento cancelado")
+        # Se reemplaza el dict entero: los proxies del Manager no ven mutaciones anidadas
+        state = dict(progress.get(job_id) or {})
+        state.update(info, phase=phase, started_at=started_at, updated_at=time.time())
+        progress[job_id] = state
+
+    bundle = train_and_save(progress=report, activate=False, **params)
+    report("activate")
+    return {key: bundle.get(key) for key in RESULT_KEYS}
+
+
+def _trim() -> None:
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in FINISHED]
+    for job_id in finished[: max(0, len(finished) - JOBS_KEPT)]:
+        _jobs.pop(job_id, None)
+        _progress.pop(job_id, None)
+        _cancelled.pop(job_id, None)
+
+
+def _finish(job_id: str, future: Future) -> None:
+    """Callback al terminar: activa la versión nueva salvo error o cancelación."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return
+    update: Dict = {"finished_at": time.time()}
+    error = None if future.cancelled() else future.exception()
+    if future.cancelled() or isinstance(error, TrainingCancelled) or _cancelled.get(job_id):
+        update["status"] = "cancelled"
+    elif error is not None:
+        update.update(status="failed", error=str(error))
+        if isinstance(error, BrokenProcessPool):
+            # Un worker murió (p.ej. OOM): se descarta el pool para recrearlo en el próximo trabajo
+            _discard_executor()
+    else:
+        result = future.result()
+        try:
+            model_registry.activate_version(result["version"])
+            model_loader.load_model()
+            update.update(status="done", result=result)
+        except Exception as e:
+            update.update(status="failed", error=str(e))
+    with _lock:
+        job.update(update)
+        _trim()
+
+
+def submit(
+    window_size: Optional[int] = None,
+    threshold_pct: Optional[float] = None,
+    **options,
+) -> Dict:
+    """
+    Encola un entrenamiento y devuelve su estado inicial; TrainingSaturated si no hay cupo.
+    options: stride, max_windows, n_jobs, warm_start_trees (ver train_if.train_and_save).
+    """
+    params = {"window_size": window_size, "threshold_pct": threshold_pct}
+    params.update({name: value for name, value in options.items() if value is not None})
+    executor = _get_executor()
+    with _lock:
+        active = sum(1 for job in _jobs.values() if job["status"] not in FINISHED)
+        if active >= MAX_PENDING:
+            raise TrainingSaturated(f"Entrenamientos en curso: {active}/{MAX_PENDING}")
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id,
+            "params": params,
+            "status": "queued",
+            "submitted_at": time.time(),
+        }
+        _jobs[job_id] = job
+    try:
+        future = executor.submit(_run, job_id, params, _progress, _cancelled)
+    except Exception as e:
+        with _lock:
+            job.update(status="failed", error=str(e), finished_at=time.time())
+        raise
+    with _lock:
+        job["future"] = future
+    future.add_done_callback(lambda f: _finish(job_id, f))
+    return get(job_id)
+
+
+def get(job_id: str) -> Optional[Dict]:
+    """Estado público del trabajo (None si no existe o ya se olvidó)."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        state = {k: v for k, v in job.items() if k != "future"}
+    progress = dict(_progress.get(job_id) or {})
+    if state["status"] not in FINISHED and _cancelled.get(job_id):
+        state["status"] = "cancelling"
+    elif state["status"] == "queued" and progress:
+        state["status"] = "running"
+    state["progress"] = progress
+    now = state.get("finished_at") or time.time()
+    state["elapsed_s"] = round(now - state["submitted_at"], 3)
+    return state
+
+
+def list_jobs() -> List[Dict]:
+    with _lock:
+        ids = list(_jobs)
+    return [state for state in (get(job_id) for job_id in reversed(ids)) if state is not None]
+
+
+def cancel(job_id: str) -> Optional[Dict]:
+    """
+    Cancela el trabajo: si sigue en cola no llega a correr; si corre, se detiene en el
+    próximo punto de avance (entre fases o tandas de árboles). None si no existe.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in FINISHED:
+            return get(job_id)
+        future = job.get("future")
+    _cancelled[job_id] = True
+    if future is not None:
+        future.cancel()
+    return get(job_id)
+
+
+def shutdown() -> None:
+    global _executor, _manager
+    with _lock:
+        executor, manager = _executor, _manager
+        _executor, _manager = None, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if manager is not None:
+        manager.shutdown()
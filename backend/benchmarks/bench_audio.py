@@ -0,0 +1,81 @@
+"""
+Benchmark del analisis por ventanas de audio: bucle legado (rfft + librosa rms/flatness
+por ventana) vs. camino por lotes (analyze_windows) sobre clips sintéticos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_audio --minutes 10 --sr 22050 --repeat 3
+"""
+
+import argparse
+import json
+import time
+
+import librosa
+import numpy as np
+
+from app.utils.audio_processing import analyze_windows
+
+
+def _legacy_window(y_window, sr):
+    """Implementación anterior (una rfft + dos STFT de librosa por ventana)."""
+    spectrum = np.abs(np.fft.rfft(y_window))
+    freqs = np.fft.rfftfreq(len(y_window), 1 / sr)
+    dominant_freq = float(freqs[np.argmax(spectrum)])
+    rms = float(np.mean(librosa.feature.rms(y=y_window)))
+    flatness = float(np.mean(librosa.feature.spectral_flatness(y=y_window)))
+    return {"rms_db": round(rms * 100, 1), "dominant_hz": int(dominant_freq), "flatness": round(flatness, 3)}
+
+
+def synthetic_clip(seconds: float, sr: int, seed: int = 0) -> np.ndarray:
+    """Tono de máquina + armónico + ruido, normalizado como en analyze_audio."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.5 * np.sin(2 * np.pi * 120 * t) + 0.2 * np.sin(2 * np.pi * 1840 * t) + 0.05 * rng.standard_normal(t.size)
+    return librosa.util.normalize(y.astype(np.float32))
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(minutes: float = 10.0, sr: int = 22050, repeat: int = 3) -> dict:
+    y = synthetic_clip(minutes * 60, sr)
+    win_length = int(0.5 * sr)
+    hop_length = win_length // 2
+    frames = librosa.util.frame(y, frame_length=win_length, hop_length=hop_length, axis=0)
+
+    # Calentamiento (JIT/caches de librosa)
+    _legacy_window(frames[0], sr)
+    analyze_windows(frames[:2], sr)
+
+    legacy_s = _best_of(lambda: [_legacy_window(f, sr) for f in frames], repeat)
+    batched_s = _best_of(lambda: analyze_windows(frames, sr), repeat)
+
+    legacy = [_legacy_window(f, sr) for f in frames]
+    batched = analyze_windows(frames, sr)
+    return {
+        "bench": "audio_windows",
+        "minutes": minutes,
+        "sr": sr,
+        "windows": int(frames.shape[0]),
+        "legacy_s": round(legacy_s, 4),
+        "batched_s": round(batched_s, 4),
+        "speedup": round(legacy_s / batched_s, 1) if batched_s else None,
+        "dominant_hz_match": float(np.mean([a["dominant_hz"] == b["dominant_hz"] for a, b in zip(legacy, batched)])),
+        "rms_db_max_abs_diff": float(max(abs(a["rms_db"] - b["rms_db"]) for a, b in zip(legacy, batched))),
+        "flatness_max_abs_diff": float(max(abs(a["flatness"] - b["flatness"]) for a, b in zip(legacy, batched))),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--sr", type=int, default=22050)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.minutes, args.sr, args.repeat)))
@@ -0,0 +1,88 @@
+"""
+Benchmark de decodificación de uploads: temporal + librosa.load (camino anterior)
+vs. decodificación en memoria con soundfile (decode_audio sobre BytesIO).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_decode --seconds 5 30 120 --repeat 5
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from app.utils.audio_processing import decode_audio
+
+
+def _encode(fmt: str, seconds: float, sr: int, channels: int = 2) -> bytes:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.4 * np.sin(2 * np.pi * 440 * t) + 0.05 * rng.standard_normal(t.size)
+    data = np.stack([y] * channels, axis=1) if channels > 1 else y
+    buf = io.BytesIO()
+    sf.write(buf, data.astype(np.float32), sr, format=fmt, subtype="PCM_16")
+    return buf.getvalue()
+
+
+def _tempfile_librosa(data: bytes):
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        return librosa.load(tmp_path, sr=None)
+    finally:
+        os.remove(tmp_path)
+
+
+def _in_memory(data: bytes):
+    return decode_audio(io.BytesIO(data))
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(seconds=(5, 30, 120), sr: int = 44100, repeat: int = 5) -> list:
+    results = []
+    for fmt in ("WAV", "FLAC"):
+        for secs in seconds:
+            data = _encode(fmt, secs, sr)
+            y_ref, _ = _tempfile_librosa(data)
+            y_new, _ = _in_memory(data)
+            tmp_s = _best_of(lambda: _tempfile_librosa(data), repeat)
+            mem_s = _best_of(lambda: _in_memory(data), repeat)
+            results.append(
+                {
+                    "bench": "audio_decode",
+                    "format": fmt,
+                    "seconds": secs,
+                    "sr": sr,
+                    "bytes": len(data),
+                    "tempfile_librosa_ms": round(tmp_s * 1000, 2),
+                    "in_memory_ms": round(mem_s * 1000, 2),
+                    "speedup": round(tmp_s / mem_s, 2) if mem_s else None,
+                    "identical": bool(y_ref.shape == y_new.shape and np.array_equal(y_ref, y_new)),
+                }
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[5, 30, 120])
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for row in run(args.seconds, args.sr, args.repeat):
+        print(json.dumps(row))
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark de las métricas derivadas de GET /analyses (snr_db, flatness móvil,
+band_levels): bucle por fila con math (implementación anterior) vs. add_derived por
+columnas con NumPy. Reporta el costo por poll, el de la etapa NumPy sola y si los
+valores son idénticos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_derived --limits 1000 10000 --repeat 20
+"""
+
+import argparse
+import copy
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+from app.utils.derived import _round, rolling_flatness, add_derived
+
+
+def _legacy_add_derived(rows: list, scores: list, threshold) -> list:
+    """Implementación anterior (fila a fila; media geométrica recalculada por ventana)."""
+
+    def geom_mean(vals):
+        vals = [v for v in vals if v > 0]
+        if not vals:
+            return 0.0
+        return float(math.exp(sum(math.log(v) for v in vals) / len(vals)))
+
+    values_seen = []
+    for idx, row in enumerate(rows):
+        val = float(row.get("rms_db") or 0.0)
+        values_seen.append(max(val, 1e-6))
+        snr = 20 * math.log10(max(val, 1e-6))
+        window_vals = values_seen[max(0, len(values_seen) - 10) :]
+        amean = sum(window_vals) / len(window_vals)
+        flat = geom_mean(window_vals) / amean if amean > 0 else 0.0
+        row["snr_db"] = round(snr, 2)
+        row["flatness"] = round(flat, 3)
+        freq = float(row.get("dominant_freq_hz") or 0.0)
+        bands = [0, 500, 1000, 4000, 8000, 12000]
+        row["band_levels"] = [
+            round(20 * math.log10(val + 1e-3), 1) if bands[i] <= freq < bands[i + 1] else -120.0
+            for i in range(len(bands) - 1)
+        ]
+        score = scores[idx]
+        row["model_score"] = score
+        row["model_margin"] = score - threshold if score is not None else None
+        row["model_threshold"] = threshold
+    return rows
+
+
+def synthetic_rows(n: int, seed: int = 0) -> list:
+    """Filas con la forma de _read_raw (value ~ populate_measurements, frecuencias 20-13k Hz)."""
+    rnd = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "timestamp": None,
+            "rms_db": round(max(0.01, rnd.gauss(0.4, 0.07)), 4),
+            "dominant_freq_hz": round(rnd.uniform(20, 13000), 1),
+            "status": "OK",
+        }
+        for i in range(n)
+    ]
+
+
+def _best_of(fn, make_input, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        data = make_input()
+        t0 = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _numpy_stage(rows: list) -> None:
+    vals = np.asarray([r["rms_db"] for r in rows], dtype=float)
+    clipped = np.maximum(vals, 1e-6)
+    _round(20 * np.log10(clipped), 2, lambda i: 0.0)
+    _round(rolling_flatness(clipped), 3, lambda i: 0.0)
+
+
+def run(limits=(1000, 10000), repeat: int = 20) -> list:
+    results = []
+    for limit in limits:
+        rows = synthetic_rows(limit)
+        scores = [-0.45] * limit
+        legacy = _legacy_add_derived(copy.deepcopy(rows), scores, -0.5)
+        columnar = add_derived(copy.deepcopy(rows), scores, -0.5)
+        legacy_s = _best_of(lambda r: _legacy_add_derived(r, scores, -0.5), lambda: copy.deepcopy(rows), repeat)
+        columnar_s = _best_of(lambda r: add_derived(r, scores, -0.5), lambda: copy.deepcopy(rows), repeat)
+        numpy_s = _best_of(_numpy_stage, lambda: rows, repeat)
+        results.append(
+            {
+                "bench": "derived_metrics",
+                "limit": limit,
+                "legacy_ms": round(legacy_s * 1000, 2),
+                "columnar_ms": round(columnar_s * 1000, 2),
+                "numpy_stage_ms": round(numpy_s * 1000, 3),
+                "speedup": round(legacy_s / columnar_s, 2) if columnar_s else None,
+                "identical": legacy == columnar,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    for row in run(args.limits, args.repeat):
+        print(json.dumps(row))
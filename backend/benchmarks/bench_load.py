@@ -0,0 +1,164 @@
+"""
+Prueba de carga de las lecturas del dashboard: camino async (AsyncSession, rutas reales)
+vs. el camino sync anterior (Session en el threadpool) con N clientes concurrentes contra
+uvicorn. Cada request lleva un parámetro distinto (_b) para que el cache de respuestas
+no la resuelva y se mida el acceso a la BD; --cached mide el caso con ETag/cache.
+
+Necesita la BD del backend (DATABASE_URL) con datos y, para el score, un modelo entrenado.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_load --clients 200 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.orm import Session
+
+# (nombre, ruta async real, ruta sync equivalente montada por este módulo)
+ENDPOINTS = [
+    ("kpis", "/analyses/kpis", "/_sync/kpis"),
+    ("stream", "/anomaly/stream", "/_sync/stream"),
+    ("analyses", "/analyses/?limit=1000", "/_sync/analyses?limit=1000"),
+]
+
+
+def _sync_router() -> APIRouter:
+    """Handlers sync con la misma lógica de las rutas async (como eran antes)."""
+    from app.db import get_db
+    from app.routers import analysis
+    from app.utils import kpi_state, model_loader, response_cache
+
+    router = APIRouter(prefix="/_sync")
+
+    @router.get("/kpis")
+    def kpis(request: Request, db: Session = Depends(get_db)):
+        return response_cache.respond(request, db, lambda headers: kpi_state.snapshot(db))
+
+    @router.get("/stream")
+    def stream(request: Request, db: Session = Depends(get_db)):
+        return response_cache.respond(request, db, lambda headers: model_loader.score_recent_window(db))
+
+    @router.get("/analyses")
+    def analyses(request: Request, limit: int = 1000, db: Session = Depends(get_db)):
+        def build(headers):
+            model_bundle = model_loader.get_model()
+            rows, skip_context = analysis._fetch_raw(db, "", {}, 0, limit, None, 0)
+            return analysis._finish_rows(rows, skip_context, model_bundle, None, "lttb")
+
+        return response_cache.respond(request, db, build)
+
+    return router
+
+
+def bench_app():
+    """App del backend + rutas /_sync (factory para uvicorn --factory)."""
+    from app.main import app
+
+    app.include_router(_sync_router())
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_load:bench_app", "--factory",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code < 500:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn no arrancó")
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _load(base_url: str, path: str, clients: int, duration: float, cached: bool) -> dict:
+    latencies, errors, counter = [], 0, 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker() -> None:
+            nonlocal errors, counter
+            while time.monotonic() < deadline:
+                counter += 1
+                url = path if cached else f"{path}{'&' if '?' in path else '?'}_b={counter}"
+                t0 = time.perf_counter()
+                try:
+                    ok = (await client.get(url)).status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def run(clients: int = 200, duration: float = 10.0, cached: bool = False, endpoints=None) -> list:
+    port = _free_port()
+    server = _start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+    results = []
+    try:
+        for name, async_path, sync_path in ENDPOINTS:
+            if endpoints and name not in endpoints:
+                continue
+            row = {"bench": "dashboard_load", "endpoint": name, "clients": clients, "cached": cached}
+            for mode, path in (("sync", sync_path), ("async", async_path)):
+                # Calentamiento: carga del modelo y del estado de KPIs
+                httpx.get(base_url + path, timeout=60)
+                stats = asyncio.run(_load(base_url, path, clients, duration, cached))
+                row.update({f"{mode}_{k}": v for k, v in stats.items()})
+            row["speedup"] = round(row["async_rps"] / row["sync_rps"], 2) if row["sync_rps"] else None
+            results.append(row)
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por endpoint y modo")
+    parser.add_argument("--cached", action="store_true", help="sin _b: mide respuestas desde el cache/304")
+    parser.add_argument("--endpoints", nargs="+", choices=[name for name, _, _ in ENDPOINTS])
+    args = parser.parse_args()
+    for row in run(args.clients, args.duration, args.cached, args.endpoints):
+        print(json.dumps(row))
@@ -0,0 +1,164 @@
+"""
+Benchmark de entrenamiento de IsolationForest: línea base (todas las ventanas, stride 1,
+n_jobs 1) vs. stride, tope de ventanas (reservoir), n_jobs y reentreno incremental con
+warm_start. Reporta tiempo de featurize+fit y deriva de la distribución de scores contra
+la línea base sobre las mismas ventanas (KS, corrimiento de media, umbral y acuerdo de alarmas).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_train --samples 20000 --window 300 --repeat 1
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+# train_if importa app.db; el benchmark no usa la BD (datos sintéticos en memoria)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.utils.train_if import train_model  # noqa: E402
+from app.utils.data_generator import ANOMALY_RANGES, NORMAL_RANGES  # noqa: E402
+from app.utils.features import FEATURE_NAMES, records_to_columns, rolling_feature_matrix  # noqa: E402
+
+VARIANTS = [
+    {"name": "baseline", "stride": 1, "max_windows": 0, "n_jobs": 1},
+    {"name": "stride_5", "stride": 5, "max_windows": 0, "n_jobs": 1},
+    {"name": "stride_10", "stride": 10, "max_windows": 0, "n_jobs": 1},
+    {"name": "max_2000", "stride": 1, "max_windows": 2000, "n_jobs": 1},
+    {"name": "n_jobs_all", "stride": 1, "max_windows": 0, "n_jobs": -1},
+    {"name": "stride_5_max_2000_all", "stride": 5, "max_windows": 2000, "n_jobs": -1},
+]
+
+
+def synthetic_records(n: int, seed: int = 0, start_id: int = 0) -> list:
+    """Misma distribución que populate_measurements (5% de anomalías)."""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        is_normal = rnd.random() > 0.05
+        ranges = NORMAL_RANGES if is_normal else ANOMALY_RANGES
+        amp, freq = ranges["amplitude"], ranges["frequency"]
+        value = max(0.01, rnd.gauss(sum(amp) / 2, (amp[1] - amp[0]) / 6))
+        frequency = max(20, rnd.gauss(sum(freq) / 2, (freq[1] - freq[0]) / 6))
+        rows.append(
+            {
+                "id": start_id + i + 1,
+                "timestamp": datetime.utcnow(),
+                "value": round(value, 4),
+                "frequency": round(frequency, 1),
+                "status": "OK" if is_normal else "Anomalo",
+            }
+        )
+    return rows
+
+
+def _eval_scores(bundle: dict, features: np.ndarray) -> np.ndarray:
+    return bundle["model"].score_samples(bundle["scaler"].transform(features))
+
+
+def _ks(a: np.ndarray, b: np.ndarray) -> float:
+    """Estadístico de Kolmogorov-Smirnov entre dos muestras."""
+    grid = np.sort(np.concatenate([a, b]))
+    cdf_a = np.searchsorted(np.sort(a), grid, side="right") / len(a)
+    cdf_b = np.searchsorted(np.sort(b), grid, side="right") / len(b)
+    return float(np.max(np.abs(cdf_a - cdf_b)))
+
+
+def _drift(reference: dict, ref_scores: np.ndarray, bundle: dict, scores: np.ndarray) -> dict:
+    ref_alarm = ref_scores < reference["threshold"]
+    alarm = scores < bundle["threshold"]
+    return {
+        "ks": round(_ks(ref_scores, scores), 4),
+        "mean_shift": round(float(np.mean(scores) - np.mean(ref_scores)), 5),
+        "threshold_shift": round(float(bundle["threshold"] - reference["threshold"]), 5),
+        "alarm_agreement": round(float(np.mean(ref_alarm == alarm)), 4),
+    }
+
+
+def _timed_train(records, window: int, repeat: int, **options):
+    best, bundle = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        bundle = train_model(records, window_size=window, threshold_pct=5.0, **options)
+        best = min(best, time.perf_counter() - t0)
+    return best, bundle
+
+
+def run(samples: int = 20000, window: int = 300, repeat: int = 1, fresh: int = 5000, warm_trees: int = 50) -> list:
+    records = synthetic_records(samples)
+    matrix = rolling_feature_matrix(*records_to_columns(records), window_size=window)
+    features = matrix[:, [i for i, n in enumerate(FEATURE_NAMES) if n != "anom_rate"]]
+
+    results = []
+    base_s, reference = _timed_train(records, window, repeat, stride=1, max_windows=0, n_jobs=1)
+    ref_scores = _eval_scores(reference, features)
+    for variant in VARIANTS:
+        options = {k: v for k, v in variant.items() if k != "name"}
+        if variant["name"] == "baseline":
+            fit_s, bundle, scores = base_s, reference, ref_scores
+        else:
+            fit_s, bundle = _timed_train(records, window, repeat, **options)
+            scores = _eval_scores(bundle, features)
+        results.append(
+            {
+                "bench": "train_if",
+                "variant": variant["name"],
+                **options,
+                "samples": samples,
+                "window": window,
+                "train_windows": bundle["train_windows"],
+                "fit_s": round(fit_s, 3),
+                "speedup": round(base_s / fit_s, 2) if fit_s else None,
+                **_drift(reference, ref_scores, bundle, scores),
+            }
+        )
+
+    # Reentreno con datos frescos: de cero sobre todo vs. warm_start sobre las filas nuevas
+    new_records = synthetic_records(fresh, seed=1, start_id=samples)
+    all_records = records + new_records
+    all_matrix = rolling_feature_matrix(*records_to_columns(all_records), window_size=window)
+    all_features = all_matrix[:, [i for i, n in enumerate(FEATURE_NAMES) if n != "anom_rate"]]
+    full_s, full = _timed_train(all_records, window, repeat, stride=1, max_windows=0, n_jobs=1)
+    full_scores = _eval_scores(full, all_features)
+    context = records[-(window - 1):]
+    warm_s = float("inf")
+    for _ in range(repeat):
+        # Cada repetición parte del mismo modelo previo (warm_start lo modifica)
+        base = train_model(records, window_size=window, threshold_pct=5.0, stride=1, max_windows=0, n_jobs=1)
+        t0 = time.perf_counter()
+        warm = train_model(
+            context + new_records, window_size=window, threshold_pct=5.0, base=base, warm_start_trees=warm_trees
+        )
+        warm_s = min(warm_s, time.perf_counter() - t0)
+    warm_scores = _eval_scores(warm, all_features)
+    results.append(
+        {
+            "bench": "train_if",
+            "variant": f"warm_start_{warm_trees}",
+            "samples": samples,
+            "fresh_samples": fresh,
+            "window": window,
+            "trees": warm["trees"],
+            "full_retrain_s": round(full_s, 3),
+            "fit_s": round(warm_s, 3),
+            "speedup": round(full_s / warm_s, 2) if warm_s else None,
+            **_drift(full, full_scores, warm, warm_scores),
+        }
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--window", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--fresh", type=int, default=5000, help="filas nuevas para el reentreno incremental")
+    parser.add_argument("--warm-trees", type=int, default=50)
+    args = parser.parse_args()
+    for row in run(args.samples, args.window, args.repeat, args.fresh, args.warm_trees):
+        print(json.dumps(row))
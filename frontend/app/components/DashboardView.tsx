@@ -1,5 +1,5 @@
 "use client";
-import { useEffect, useState, forwardRef, useImperativeHandle } from "react";
+import { useEffect, useRef, useState, forwardRef, useImperativeHandle } from "react";
 import {
   LineChart,
   Line,
@@ -10,6 +10,7 @@ import {
   ResponsiveContainer,
   ReferenceLine,
 } from "recharts";
+import useLiveStream from "./useLiveStream";
 
 type DashboardProps = {
   threshold?: number;
@@ -22,13 +23,18 @@ const DashboardView = forwardRef(({ threshold }: DashboardProps, ref) => {
   const [metricsOpen, setMetricsOpen] = useState(false);
   const api = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
+  const limitRef = useRef(300);
+
   const fetchData = async (limit?: number) => {
     setLoading(true);
     try {
-      const qLimit = typeof limit === "number" ? limit : 300;
+      const qLimit = typeof limit === "number" ? limit : limitRef.current;
+      limitRef.current = qLimit;
+      // Rangos grandes: el backend reduce a ~600 puntos (LTTB) conservando anomalías
+      const qPoints = qLimit > 600 ? "&points=600" : "";
       const res = await fetch(
-        `${api}/analyses?skip=0&limit=${qLimit}&_t=${Date.now()}`,
-        { cache: "no-store" }
+        `${api}/analyses?skip=0&limit=${qLimit}${qPoints}`,
+        { cache: "no-cache" }
       );
       const json = await res.json();
       if (Array.isArray(json)) {
@@ -50,9 +56,23 @@ const DashboardView = forwardRef(({ threshold }: DashboardProps, ref) => {
     }
   };
 
+  // Serie cruda: se agregan las filas que llegan por el canal en vivo.
+  // Serie reducida (points): se sigue recargando cada 5 s para recalcular el downsampling.
+  const live = useLiveStream(api, ["measurements", "reset"], (event, rows) => {
+    if (event === "reset") {
+      fetchData();
+    } else if (limitRef.current <= 600) {
+      setData((prev) => [...prev, ...(rows as any[])].slice(-limitRef.current));
+    }
+  });
+  const liveRef = useRef(live);
+  liveRef.current = live;
+
   useEffect(() => {
     fetchData();
-    const id = setInterval(() => fetchData(), 5000); // auto refresh cada 5s
+    const id = setInterval(() => {
+      if (!liveRef.current || limitRef.current > 600) fetchData();
+    }, 5000); // auto refresh cada 5s (respaldo si no hay canal en vivo)
     return () => clearInterval(id);
   }, []);
 
@@ -1,5 +1,6 @@
 "use client";
 import { useEffect, useRef, useState } from "react";
+import useLiveStream from "./useLiveStream";
 
 type Event = {
   timestamp?: string;
@@ -39,8 +40,8 @@ export default function EventTable({ api }: Props) {
     const nextPage = targetPage ?? pageRef.current;
     try {
       const res = await fetch(
-        `${api}/analyses/events?minutes=1440&page=${nextPage}&per_page=${perPage}&_t=${Date.now()}`,
-        { cache: "no-store" }
+        `${api}/analyses/events?minutes=1440&page=${nextPage}&per_page=${perPage}`,
+        { cache: "no-cache" }
       );
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const json = await res.json();
@@ -67,9 +68,16 @@ export default function EventTable({ api }: Props) {
     fetchEvents(clamped);
   };
 
+  // Las anomalías son poco frecuentes: ante cada aviso se recarga la página actual
+  const live = useLiveStream(api, ["anomalies", "reset"], () => fetchEvents(pageRef.current));
+  const liveRef = useRef(live);
+  liveRef.current = live;
+
   useEffect(() => {
     fetchEvents(pageRef.current);
-    const id = setInterval(() => fetchEvents(pageRef.current), 5000);
+    const id = setInterval(() => {
+      if (!liveRef.current) fetchEvents(pageRef.current);
+    }, 5000);
     return () => clearInterval(id);
   }, []);
 
@@ -1,5 +1,6 @@
 "use client";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
+import useLiveStream from "./useLiveStream";
 
 type Kpis = {
   last_timestamp?: string;
@@ -33,7 +34,7 @@ export default function KpiBar({ api }: Props) {
     setLoading(true);
     setError(null);
     try {
-      const res = await fetch(`${api}/analyses/kpis?_t=${Date.now()}`, { cache: "no-store" });
+      const res = await fetch(`${api}/analyses/kpis`, { cache: "no-cache" });
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const json = await res.json();
       setData(json);
@@ -45,9 +46,18 @@ export default function KpiBar({ api }: Props) {
     }
   };
 
+  // Con el canal en vivo llegan solo las claves que cambiaron; el polling queda de respaldo
+  const live = useLiveStream(api, ["kpis"], (_event, delta) =>
+    setData((prev) => ({ ...(prev ?? {}), ...delta }))
+  );
+  const liveRef = useRef(live);
+  liveRef.current = live;
+
   useEffect(() => {
     fetchKpis();
-    const id = setInterval(fetchKpis, 5000);
+    const id = setInterval(() => {
+      if (!liveRef.current) fetchKpis();
+    }, 5000);
     return () => clearInterval(id);
   }, []);
 
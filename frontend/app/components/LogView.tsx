@@ -1,5 +1,6 @@
 "use client";
 import { useEffect, useRef, useState } from "react";
+import useLiveStream from "./useLiveStream";
 
 type LogEntry = {
   timestamp?: string;
@@ -18,13 +19,15 @@ export default function LogView({ api, pollMs = 5000 }: Props) {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const containerRef = useRef<HTMLDivElement>(null);
-  const endpoint = `${api || "http://localhost:8000"}/analyses/logs`;
+  // Misma base que el resto del dashboard (NEXT_PUBLIC_API_URL) para el fetch y el canal en vivo
+  const base = api || process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+  const endpoint = `${base}/analyses/logs`;
 
   const fetchLogs = async () => {
     setLoading(true);
     setError(null);
     try {
-      const res = await fetch(`${endpoint}?limit=300&_t=${Date.now()}`, { cache: "no-store" });
+      const res = await fetch(`${endpoint}?limit=300`, { cache: "no-cache" });
       if (!res.ok) {
         throw new Error(`HTTP ${res.status}`);
       }
@@ -42,9 +45,25 @@ export default function LogView({ api, pollMs = 5000 }: Props) {
     }
   };
 
+  // Filas nuevas por el canal en vivo (vienen ascendentes; el log es descendente)
+  const live = useLiveStream(base, ["measurements", "reset"], (event, data) => {
+    if (event === "reset") {
+      fetchLogs();
+      return;
+    }
+    const fresh: LogEntry[] = (data as any[])
+      .map((r) => ({ timestamp: r.timestamp, value: r.rms_db, frequency: r.dominant_freq_hz, status: r.status }))
+      .reverse();
+    setLogs((prev) => [...fresh, ...prev].slice(0, 300));
+  });
+  const liveRef = useRef(live);
+  liveRef.current = live;
+
   useEffect(() => {
     fetchLogs();
-    const id = setInterval(fetchLogs, pollMs);
+    const id = setInterval(() => {
+      if (!liveRef.current) fetchLogs();
+    }, pollMs);
     return () => clearInterval(id);
   }, [pollMs]);
 
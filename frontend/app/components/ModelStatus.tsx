@@ -30,7 +30,7 @@ export default function ModelStatus({ api, refreshSignal, onThreshold }: ModelSt
     setLoading(true);
     setError(null);
     try {
-      const res = await fetch(`${api}/anomaly/stream?_t=${Date.now()}`, { cache: "no-store" });
+      const res = await fetch(`${api}/anomaly/stream`, { cache: "no-cache" });
       if (!res.ok) {
         throw new Error(`HTTP ${res.status}`);
       }
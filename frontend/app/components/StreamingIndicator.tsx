@@ -1,5 +1,6 @@
 "use client";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
+import useLiveStream from "./useLiveStream";
 
 type Props = {
   api: string;
@@ -9,28 +10,44 @@ type Props = {
 export default function StreamingIndicator({ api, staleAfterSeconds = 15 }: Props) {
   const [status, setStatus] = useState<"live" | "stale" | "unknown">("unknown");
   const [lastTs, setLastTs] = useState<string | null>(null);
+  const lastTsRef = useRef<string | null>(null);
+
+  const evaluate = (ts?: string | null) => {
+    if (ts) {
+      const diff = (Date.now() - new Date(ts).getTime()) / 1000;
+      setStatus(diff <= staleAfterSeconds ? "live" : "stale");
+    } else {
+      setStatus("stale");
+    }
+  };
+
+  const updateTs = (ts?: string | null) => {
+    lastTsRef.current = ts ?? null;
+    setLastTs(ts ?? null);
+    evaluate(ts);
+  };
 
   const fetchKpis = async () => {
     try {
-      const res = await fetch(`${api}/analyses/kpis?_t=${Date.now()}`, { cache: "no-store" });
+      const res = await fetch(`${api}/analyses/kpis`, { cache: "no-cache" });
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const json = await res.json();
-      const ts = json?.last_timestamp as string | undefined;
-      setLastTs(ts ?? null);
-      if (ts) {
-        const diff = (Date.now() - new Date(ts).getTime()) / 1000;
-        setStatus(diff <= staleAfterSeconds ? "live" : "stale");
-      } else {
-        setStatus("stale");
-      }
+      updateTs(json?.last_timestamp as string | undefined);
     } catch {
       setStatus("unknown");
     }
   };
 
+  const live = useLiveStream(api, ["kpis"], (_event, delta) => {
+    if (delta?.last_timestamp !== undefined) updateTs(delta.last_timestamp);
+  });
+  const liveRef = useRef(live);
+  liveRef.current = live;
+
   useEffect(() => {
     fetchKpis();
-    const id = setInterval(fetchKpis, 5000);
+    // En vivo solo se reevalúa la antigüedad del último dato; sin canal, polling
+    const id = setInterval(() => (liveRef.current ? evaluate(lastTsRef.current) : fetchKpis()), 5000);
     return () => clearInterval(id);
   }, []);
 
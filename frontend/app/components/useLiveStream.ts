@@ -0,0 +1,76 @@
+"use client";
+import { useEffect, useRef, useState } from "react";
+
+// Una sola conexión SSE (/live/stream) compartida por todos los componentes.
+type Handler = (data: any) => void;
+
+const EVENTS = ["measurements", "anomalies", "kpis", "reset"];
+const handlers: Record<string, Set<Handler>> = {};
+const connectionListeners = new Set<(connected: boolean) => void>();
+let source: EventSource | null = null;
+let sourceApi = "";
+let users = 0;
+let connected = false;
+
+const setConnected = (value: boolean) => {
+  connected = value;
+  connectionListeners.forEach((fn) => fn(value));
+};
+
+const open = (api: string) => {
+  if (source && sourceApi === api) return;
+  source?.close();
+  sourceApi = api;
+  source = new EventSource(`${api}/live/stream`);
+  source.onopen = () => setConnected(true);
+  // EventSource reintenta solo; mientras tanto los componentes vuelven a hacer polling
+  source.onerror = () => setConnected(false);
+  EVENTS.forEach((event) =>
+    source?.addEventListener(event, (e) => {
+      const data = JSON.parse((e as MessageEvent).data);
+      handlers[event]?.forEach((fn) => fn(data));
+    })
+  );
+};
+
+const close = () => {
+  source?.close();
+  source = null;
+  setConnected(false);
+};
+
+/**
+ * Suscribe `onEvent(event, data)` a los eventos indicados del canal en vivo.
+ * Devuelve si la conexión está activa (para pausar el polling de respaldo).
+ */
+export default function useLiveStream(
+  api: string,
+  events: string[],
+  onEvent: (event: string, data: any) => void
+): boolean {
+  const [isConnected, setIsConnected] = useState(connected);
+  const callback = useRef(onEvent);
+  callback.current = onEvent;
+
+  useEffect(() => {
+    if (typeof window === "undefined" || typeof EventSource === "undefined") return;
+    const subscribed = events.map((event) => {
+      const fn: Handler = (data) => callback.current(event, data);
+      (handlers[event] ??= new Set()).add(fn);
+      return [event, fn] as const;
+    });
+    connectionListeners.add(setIsConnected);
+    users += 1;
+    open(api);
+    setIsConnected(connected);
+
+    return () => {
+      subscribed.forEach(([event, fn]) => handlers[event]?.delete(fn));
+      connectionListeners.delete(setIsConnected);
+      users -= 1;
+      if (users === 0) close();
+    };
+  }, [api, events.join(",")]);
+
+  return isConnected;
+}
@@ -43,10 +43,23 @@ export default function HomePage() {
     } catch (_) {
       // cuerpo no JSON
     }
-    const success = data?.success !== false;
+    if (!res.ok || !data?.job_id) {
+      showToast(data?.detail || data?.error || "Error al entrenar", "error");
+      return;
+    }
+    showToast("Entrenando modelo...", "info");
+    // El entrenamiento corre en segundo plano: se consulta el trabajo hasta que termine
+    let job = data;
+    while (!["done", "failed", "cancelled"].includes(job?.status)) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const poll = await fetch(`${api}/anomaly/train/${data.job_id}`, { cache: "no-cache" });
+      if (!poll.ok) break;
+      job = await poll.json();
+    }
+    const success = job?.status === "done";
     const msg = success
-      ? `Modelo entrenado y guardado`
-      : data?.error || "Error al entrenar";
+      ? `Modelo entrenado y guardado (v${job.result?.version})`
+      : job?.error || "Error al entrenar";
     showToast(msg, success ? "info" : "error");
     if (success) {
       setModelRefresh((v) => v + 1);